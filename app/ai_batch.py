@@ -0,0 +1,352 @@
+"""
+Offline bulk AI for the nightly job: every candidate thread is scored (and,
+when it may need a follow-up, drafted) through a batch job file instead of
+one live request per call.
+
+A run writes the requests to a JSONL job file in the OpenAI Batch API
+format, submits it through a BatchBackend, polls until the batch finishes
+and maps the results back to thread IDs. Nothing holds a connection open
+between polls, and the job's state (with a hash of the job file) is kept
+next to the file, so a run that is interrupted picks up the batch it
+submitted for the same requests instead of submitting it again.
+"""
+from __future__ import annotations
+
+import abc
+import datetime
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+from app.ai_service import AIService, cluster_partition, parse_urgency_analysis, recipient_name_for
+from app.config import (
+    AI_BATCH_BACKEND, AI_BATCH_DIR, AI_BATCH_POLL_SECONDS, AI_BATCH_TIMEOUT_SECONDS, AI_CLUSTER_THREADS
+)
+from app.preclassifier import preclassify
+from app.thread_clusters import cluster_threads, personalize
+from app.thread_groups import normalize_subject
+
+logger = logging.getLogger(__name__)
+
+BATCH_ENDPOINT = '/v1/chat/completions'
+# Terminal batch statuses (as reported by the OpenAI Batch API)
+FINISHED = ('completed', 'failed', 'expired', 'cancelled')
+
+
+def _custom_id(thread_id: str, kind: str) -> str:
+    return f"{thread_id}:{kind}"
+
+
+def _shares_draft(representative: Dict, member: Dict) -> bool:
+    """A near-duplicate reuses its representative's draft only under the same subject (role, company)."""
+    return normalize_subject(representative.get('subject')) == normalize_subject(member.get('subject'))
+
+
+class BatchBackend(abc.ABC):
+    """Where batch job files are run: submit a file, poll its status, read its result lines."""
+
+    name = ''
+
+    @abc.abstractmethod
+    def submit(self, job_path: str) -> str:
+        """Submit the job file; returns the batch ID."""
+
+    @abc.abstractmethod
+    def status(self, batch_id: str) -> str:
+        """The batch's status, one of FINISHED once it is done."""
+
+    @abc.abstractmethod
+    def results(self, batch_id: str) -> Iterator[Dict]:
+        """Yield result lines: {custom_id, response: {status_code, body}, error}."""
+
+
+class OpenAIBatchBackend(BatchBackend):
+    """The OpenAI Batch API: requests run within 24 hours at the batch price."""
+
+    name = 'openai'
+
+    def __init__(self, client=None):
+        if client is None:
+            from openai import OpenAI
+            client = OpenAI()
+        self.client = client
+
+    def submit(self, job_path: str) -> str:
+        with open(job_path, 'rb') as f:
+            uploaded = self.client.files.create(file=f, purpose='batch')
+        batch = self.client.batches.create(input_file_id=uploaded.id, endpoint=BATCH_ENDPOINT,
+                                           completion_window='24h')
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        return self.client.batches.retrieve(batch_id).status
+
+    def results(self, batch_id: str) -> Iterator[Dict]:
+        batch = self.client.batches.retrieve(batch_id)
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                for line in self.client.files.content(file_id).text.splitlines():
+                    if line.strip():
+                        yield json.loads(line)
+
+
+class LocalBatchBackend(BatchBackend):
+    """
+    File-based stand-in for a batch service, for tests and local runs.
+
+    submit copies the job file into directory/<batch id>/; the first status
+    poll runs every request through responder (a function from request body
+    to completion text; by default the synchronous OpenAI client) and writes
+    output.jsonl in the Batch API's result format.
+    """
+
+    name = 'local'
+
+    def __init__(self, directory: str = None, responder: Callable[[Dict], str] = None):
+        self.directory = Path(directory or os.path.join(AI_BATCH_DIR, 'local'))
+        self.responder = responder
+
+    def _respond(self, body: Dict) -> str:
+        if self.responder is None:
+            from openai import OpenAI
+            client = OpenAI()
+            self.responder = lambda request: client.chat.completions.create(**request).choices[0].message.content
+        return self.responder(body)
+
+    def submit(self, job_path: str) -> str:
+        batch_id = f"local_{uuid.uuid4().hex}"
+        batch_dir = self.directory / batch_id
+        batch_dir.mkdir(parents=True)
+        (batch_dir / 'input.jsonl').write_bytes(Path(job_path).read_bytes())
+        return batch_id
+
+    def status(self, batch_id: str) -> str:
+        batch_dir = self.directory / batch_id
+        output = batch_dir / 'output.jsonl'
+        if not output.exists():
+            partial = batch_dir / 'output.jsonl.part'
+            with open(batch_dir / 'input.jsonl', encoding='utf-8') as requests, \
+                    open(partial, 'w', encoding='utf-8') as results:
+                for line in requests:
+                    if line.strip():
+                        results.write(json.dumps(self._run(json.loads(line))) + "\n")
+            partial.replace(output)
+        return 'completed'
+
+    def _run(self, request: Dict) -> Dict:
+        try:
+            content = self._respond(request['body'])
+        except Exception as e:
+            return {'custom_id': request['custom_id'], 'response': None,
+                    'error': {'code': type(e).__name__, 'message': str(e)}}
+        body = {'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}}]}
+        return {'custom_id': request['custom_id'], 'response': {'status_code': 200, 'body': body}, 'error': None}
+
+    def results(self, batch_id: str) -> Iterator[Dict]:
+        with open(self.directory / batch_id / 'output.jsonl', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+BACKENDS = {'openai': OpenAIBatchBackend, 'local': LocalBatchBackend}
+
+
+def get_batch_backend(name: str = None) -> BatchBackend:
+    name = name or AI_BATCH_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown AI batch backend: {name}")
+    return BACKENDS[name]()
+
+
+def _response_content(result: Dict) -> str:
+    """Completion text of a result line; raises ValueError with the reason when the request failed."""
+    response = result.get('response') or {}
+    if result.get('error') or response.get('status_code') != 200:
+        error = result.get('error') or (response.get('body') or {}).get('error') or {}
+        raise ValueError(error.get('message') or f"status {response.get('status_code')}")
+    return response['body']['choices'][0]['message']['content']
+
+
+class AIBatchJob:
+    """
+    One batch run over a list of candidate threads.
+
+    Results are {thread_id: {analysis, draft, source, errors}}: analysis as
+    validated by parse_urgency_analysis, draft the follow-up text (None when
+    the thread was not drafted), source where the analysis came from
+    ('local', 'cache', 'batch', or 'cluster' when it was answered with a
+    near-duplicate, named by cluster_of), and errors the reasons any request
+    failed.
+    """
+
+    def __init__(self, service: AIService, backend: BatchBackend, name: str = None, directory: str = None,
+                 drafts: bool = True, cluster: bool = None):
+        self.service = service
+        self.backend = backend
+        self.name = name or f"ai_batch_{datetime.date.today().isoformat()}"
+        self.directory = Path(directory or AI_BATCH_DIR)
+        self.drafts = drafts
+        self.cluster = AI_CLUSTER_THREADS if cluster is None else cluster
+        self.job_path = self.directory / f"{self.name}.jsonl"
+        self.state_path = self.directory / f"{self.name}.state.json"
+        self.results: Dict[str, Dict] = {}
+        self._keys: Dict[str, str | None] = {}
+        # Representative thread ID -> (representative, the near-duplicates answered with it)
+        self._clusters: Dict[str, Tuple[Dict, List[Dict]]] = {}
+
+    def _load_state(self) -> Dict | None:
+        if not self.state_path.exists():
+            return None
+        return json.loads(self.state_path.read_text(encoding='utf-8'))
+
+    def _save_state(self, state: Dict) -> None:
+        tmp = self.state_path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(state), encoding='utf-8')
+        tmp.replace(self.state_path)
+
+    def _job_hash(self) -> str:
+        """SHA-256 of the job file: the same custom_ids with the same request bodies."""
+        digest = hashlib.sha256()
+        with open(self.job_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 16), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _entry(self, thread_id: str) -> Dict:
+        return self.results.setdefault(thread_id, {'analysis': None, 'draft': None, 'source': None, 'errors': []})
+
+    def write_job(self, threads: Sequence[Dict]) -> int:
+        """
+        Write the job file, streaming one request per line; returns the
+        number of requests. Threads the preclassifier decides, and answers
+        already cached, are resolved here and never enter the job. With
+        clustering, near-duplicate threads share their representative's
+        requests.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for thread in threads:
+            self._entry(thread['thread_id'])
+        decisions = [preclassify(thread) for thread in threads]
+        covered: Dict[int, Dict] = {}  # Index of a near-duplicate -> its cluster's representative
+        if self.cluster:
+            ambiguous = [i for i, decision in enumerate(decisions) if decision is None]
+            for group in cluster_threads([threads[i] for i in ambiguous], partition=cluster_partition):
+                if len(group) > 1:
+                    representative = threads[ambiguous[group[0]]]
+                    members = [threads[ambiguous[j]] for j in group[1:]]
+                    self._clusters[representative['thread_id']] = (representative, members)
+                    covered.update((ambiguous[j], representative) for j in group[1:])
+
+        count = 0
+        with open(self.job_path, 'w', encoding='utf-8') as job:
+            for index, (thread, local) in enumerate(zip(threads, decisions)):
+                thread_id = thread['thread_id']
+                if index in covered:
+                    # Answered with its representative, unless a shared draft would not fit it
+                    kinds = [] if not self.drafts or _shares_draft(covered[index], thread) else ['followup']
+                else:
+                    if local is not None:
+                        self._entry(thread_id).update(analysis=local, source='local')
+                    kinds = [] if local is not None else ['urgency']
+                    if self.drafts and (local is None or local['needs_followup']):
+                        kinds.append('followup')
+                for kind in kinds:
+                    prepared = self.service.prepare_request(kind, thread)
+                    if prepared['cached'] is not None:
+                        try:
+                            self._apply(thread_id, kind, prepared['cached'], cached=True)
+                            continue
+                        except ValueError:
+                            pass  # An unusable cached answer is asked for again
+                    custom_id = _custom_id(thread_id, kind)
+                    self._keys[custom_id] = prepared['key']
+                    job.write(json.dumps({'custom_id': custom_id, 'method': 'POST', 'url': BATCH_ENDPOINT,
+                                          'body': prepared['body']}) + "\n")
+                    count += 1
+        return count
+
+    def _apply(self, thread_id: str, kind: str, content: str, cached: bool = False) -> None:
+        """Record an answer for a thread and, personalized, for the rest of its cluster."""
+        analysis = parse_urgency_analysis(content) if kind == 'urgency' else None
+        if kind == 'urgency':
+            self._entry(thread_id).update(analysis=analysis, source='cache' if cached else 'batch')
+        else:
+            self._entry(thread_id)['draft'] = content
+        representative, members = self._clusters.get(thread_id, (None, ()))
+        for member in members:
+            entry = self._entry(member['thread_id'])
+            entry['cluster_of'] = thread_id
+            if kind == 'urgency':
+                entry.update(analysis=dict(analysis), source='cluster')
+            elif _shares_draft(representative, member):
+                entry['draft'] = personalize(content, recipient_name_for(representative), recipient_name_for(member))
+
+    def _fail(self, thread_id: str, kind: str, error: Exception) -> None:
+        representative, members = self._clusters.get(thread_id, (None, ()))
+        members = [member for member in members if kind == 'urgency' or _shares_draft(representative, member)]
+        for failed_id in [thread_id] + [member['thread_id'] for member in members]:
+            self._entry(failed_id)['errors'].append(f"{kind}: {error}")
+
+    def run(self, threads: List[Dict], poll_seconds: float = None, timeout_seconds: float = None,
+            sleep: Callable[[float], None] = time.sleep) -> Dict[str, Dict]:
+        """Write, submit (or resume) and wait for the batch, then collect its results."""
+        poll_seconds = AI_BATCH_POLL_SECONDS if poll_seconds is None else poll_seconds
+        timeout_seconds = AI_BATCH_TIMEOUT_SECONDS if timeout_seconds is None else timeout_seconds
+
+        requests = self.write_job(threads)
+        if not requests:
+            return self.results
+        job_hash = self._job_hash()
+        state = self._load_state()
+        # Resume only the batch submitted for exactly this job file; any other batch's results would not fit it
+        if state is None or state.get('backend') != self.backend.name or state.get('job_hash') != job_hash:
+            state = {'backend': self.backend.name, 'batch_id': self.backend.submit(str(self.job_path)),
+                     'requests': requests, 'job_hash': job_hash, 'submitted_at': time.time()}
+            self._save_state(state)
+            logger.info(f"Submitted AI batch {state['batch_id']} with {requests} requests")
+        else:
+            logger.info(f"Resuming AI batch {state['batch_id']}")
+
+        deadline = time.monotonic() + timeout_seconds
+        status = self.backend.status(state['batch_id'])
+        while status not in FINISHED:
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"AI batch {state['batch_id']} still {status} after {timeout_seconds}s")
+            sleep(poll_seconds)
+            status = self.backend.status(state['batch_id'])
+        if status != 'completed':
+            logger.warning(f"AI batch {state['batch_id']} ended as {status}; collecting partial results")
+
+        for result in self.backend.results(state['batch_id']):
+            thread_id, _, kind = result['custom_id'].rpartition(':')
+            try:
+                content = _response_content(result)
+                self._apply(thread_id, kind, content)
+                self.service.store_response(kind, self._keys.get(result['custom_id']), content)
+            except (ValueError, KeyError, IndexError, TypeError) as e:
+                self._fail(thread_id, kind, e)
+        if self.service.cache is not None:
+            self.service.cache.evict()
+        self.state_path.unlink(missing_ok=True)
+        return self.results
+
+
+def run_ai_batch(threads: List[Dict], service: AIService = None, backend: BatchBackend = None,
+                 **kwargs) -> AIBatchJob:
+    """
+    Score and draft every thread through a batch job and save the results
+    as JSONL next to the job file (<name>.results.jsonl), one thread per
+    line. Returns the finished job; its results are keyed by thread ID.
+    """
+    job = AIBatchJob(service or AIService(), backend or get_batch_backend(), **kwargs)
+    results = job.run(threads)
+    with open(job.directory / f"{job.name}.results.jsonl", 'w', encoding='utf-8') as f:
+        for thread_id, entry in results.items():
+            f.write(json.dumps({'thread_id': thread_id, **entry}) + "\n")
+    return job
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from typing import Dict
+
+from app.config import AI_CACHE_MAX_ENTRIES, AI_CACHE_PATH, AI_CACHE_TTL_SECONDS
+from app.sqlite_store import EVICT_EVERY_PUTS, TOUCH_INTERVAL_SECONDS, LRUStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_accessed_at ON responses (accessed_at);
+CREATE INDEX IF NOT EXISTS idx_responses_created_at ON responses (created_at);
+"""
+
+
+def cache_key(model: str, kind: str, prompt_version: int, inputs: Dict) -> str:
+    """Content address of a model call: SHA-256 of the model, prompt kind and version, and the normalized inputs."""
+    payload = json.dumps({'model': model, 'kind': kind, 'prompt_version': prompt_version, 'inputs': inputs},
+                         sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AIResponseCache(LRUStore):
+    """
+    SQLite cache of model responses, keyed by cache_key.
+
+    Responses older than ttl_seconds are ignored and purged; beyond
+    max_entries the least recently used go first (see sqlite_store.LRUStore;
+    a batch run also evicts once when it finishes). stats counts hits and
+    misses for this process.
+    """
+
+    table = 'responses'
+    key_column = 'key'
+    age_column = 'created_at'
+
+    def __init__(self, path: str, ttl_seconds: int = AI_CACHE_TTL_SECONDS,
+                 max_entries: int = AI_CACHE_MAX_ENTRIES, touch_interval: float = TOUCH_INTERVAL_SECONDS,
+                 evict_every: int = EVICT_EVERY_PUTS):
+        super().__init__(path, max_entries, ttl_seconds, touch_interval, evict_every)
+        self.stats = {'hits': 0, 'misses': 0}
+        self._stats_lock = threading.Lock()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _count(self, stat: str) -> None:
+        with self._stats_lock:
+            self.stats[stat] += 1
+
+    def get(self, key: str) -> str | None:
+        """Return the cached response for a key, or None when missing or expired."""
+        now = time.time()
+        conn = self._connection()
+        row = conn.execute(
+            'SELECT response, accessed_at FROM responses WHERE key = ? AND created_at >= ?',
+            (key, now - self.max_age_seconds)
+        ).fetchone()
+        if row is not None:
+            self._touch(conn, key, row['accessed_at'], now)
+        self._count('misses' if row is None else 'hits')
+        return None if row is None else row['response']
+
+    def put(self, key: str, response: str, kind: str = '', model: str = '') -> None:
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO responses (key, kind, model, response, created_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (key, kind, model, response, now, now)
+            )
+        self._put_done()
+
+    def clear(self) -> None:
+        with self._connection() as conn:
+            conn.execute('DELETE FROM responses')
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_ai_cache() -> AIResponseCache | None:
+    """Return the process-wide AI response cache, or None when AI_CACHE_PATH is empty."""
+    global _cache
+    if not AI_CACHE_PATH:
+        return None
+    with _cache_lock:
+        if _cache is None or _cache.path != AI_CACHE_PATH:
+            _cache = AIResponseCache(AI_CACHE_PATH)
+        return _cache
@@ -1,25 +1,41 @@
+import asyncio
+import bisect
 import os
+import json
 import logging
-from openai import OpenAI
+import re
+import threading
+import time
+from email.utils import parseaddr
+from typing import Dict, Iterable, Iterator, List
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+from app.ai_cache import cache_key, get_ai_cache
+from app.config import (
+    AI_BATCH_CONCURRENCY, AI_CLUSTER_THREADS, AI_MODEL, AI_PRECLASSIFY, AI_PROMPT_TOKEN_BUDGET,
+    AI_REQUESTS_PER_MINUTE
+)
+from app.preclassifier import preclassify as preclassify_thread
+from app.prompt_builder import build_thread_content
+from app.rate_limiter import TokenBucket
+from app.thread_clusters import cluster_threads
 
 logger = logging.getLogger(__name__)
 
-class AIService:
-    def __init__(self):
-        """Initialize OpenAI client with API key from environment."""
-        logger.debug("Initializing AIService")
-        api_key = os.getenv('OPENAI_API_KEY')
-        if not api_key:
-            logger.error("OPENAI_API_KEY environment variable not set")
-            raise ValueError("OPENAI_API_KEY environment variable not set")
-        self.client = OpenAI(api_key=api_key)
-        logger.debug("AIService initialized successfully")
+# Bump a prompt's version whenever its template changes, so cached responses to the old prompt are not reused
+URGENCY_PROMPT_VERSION = 2
+FOLLOWUP_PROMPT_VERSION = 2
 
-    def analyze_thread_urgency(self, thread_content, days_since_sent):
-        """Analyze if a job-related email thread needs follow-up."""
-        logger.debug(f"Analyzing thread urgency for content from {days_since_sent} days ago")
-        
-        prompt = f"""
+# Allowed values in an urgency analysis (see URGENCY_PROMPT)
+URGENCY_LEVELS = ('low', 'medium', 'high')
+URGENCY_CONTEXTS = ('job_application', 'interview', 'networking', 'other')
+
+# Lower bounds of the days-since-sent buckets, matching the timing rules in URGENCY_PROMPT
+DAYS_BUCKETS = (3, 6, 7, 11, 14)
+
+URGENCY_PROMPT = """
         Analyze this email thread for job-seeking context and determine if it needs a follow-up.
         Thread Content: {thread_content}
         Days Since Sent: {days_since_sent}
@@ -49,25 +65,8 @@ class AIService:
         2. Already received a definitive response
         3. Company explicitly asked not to follow up
         """
-        
-        try:
-            logger.debug("Sending request to OpenAI API for thread analysis")
-            response = self.client.chat.completions.create(
-                model="gpt-5-nano",
-                messages=[{"role": "user", "content": prompt}]
-            )
-            result = response.choices[0].message.content
-            logger.debug(f"Received analysis from OpenAI: {result}")
-            return result
-        except Exception as e:
-            logger.error(f"Error analyzing thread urgency: {str(e)}")
-            raise
 
-    def generate_followup_email(self, original_thread, recipient_name, last_email_content, days_since_sent):
-        """Generate a job-seeking follow-up email."""
-        logger.debug(f"Generating follow-up email for recipient: {recipient_name}, days since sent: {days_since_sent}")
-        
-        prompt = f"""
+FOLLOWUP_PROMPT = """
         Generate a concise, professional follow-up email for a job seeker.
 
         Context:
@@ -102,16 +101,432 @@ class AIService:
         Best regards,
         [Name]
         """
-        
+
+
+def days_bucket(days_since_sent) -> str:
+    """Cache bucket for a days-since-sent value, e.g. '3-5' or '14+'."""
+    days = int(days_since_sent)
+    index = bisect.bisect_right(DAYS_BUCKETS, days)
+    low = DAYS_BUCKETS[index - 1] if index else 0
+    if index == len(DAYS_BUCKETS):
+        return f"{low}+"
+    return f"{low}-{DAYS_BUCKETS[index] - 1}"
+
+
+def days_since_sent_of(thread: Dict):
+    """Days since the last message of a scan candidate (days_since_last) or analysis input (days_since_sent)."""
+    return thread.get('days_since_sent', thread.get('days_since_last', 0))
+
+
+def cluster_partition(thread: Dict) -> str:
+    """Threads share an analysis or draft only within one days bucket, as their cache keys do."""
+    return days_bucket(days_since_sent_of(thread))
+
+
+def normalize_input(value) -> str:
+    """Cache form of a prompt input: structured values as sorted JSON, whitespace collapsed."""
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True, default=str)
+    return ' '.join(value.split())
+
+
+_JSON_OBJECT = re.compile(r'\{.*\}', re.DOTALL)
+
+
+def parse_urgency_analysis(result: str) -> Dict:
+    """
+    Parse and validate an urgency analysis returned by the model.
+
+    Tolerates a Markdown code fence or prose around the JSON object; raises
+    ValueError when there is no object or its fields are missing or invalid.
+    """
+    match = _JSON_OBJECT.search(result or '')
+    if match is None:
+        raise ValueError("No JSON object in analysis")
+    try:
+        analysis = json.loads(match.group(0))
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid analysis JSON: {e}") from e
+    if not isinstance(analysis, dict) or not isinstance(analysis.get('needs_followup'), bool):
+        raise ValueError("Analysis needs a boolean needs_followup")
+    urgency = str(analysis.get('urgency', '')).strip().lower()
+    if urgency not in URGENCY_LEVELS:
+        raise ValueError(f"Invalid urgency: {analysis.get('urgency')!r}")
+    context = str(analysis.get('context', 'other')).strip().lower()
+    if context not in URGENCY_CONTEXTS:
+        raise ValueError(f"Invalid context: {analysis.get('context')!r}")
+    return {
+        'needs_followup': analysis['needs_followup'],
+        'reason': str(analysis.get('reason') or ''),
+        'urgency': urgency,
+        'context': context,
+        'original_role': str(analysis.get('original_role') or ''),
+    }
+
+
+def thread_content_for(thread: Dict) -> str:
+    """Prompt content for a candidate thread: its thread_content, else subject, recipient and snippet."""
+    if thread.get('thread_content'):
+        return thread['thread_content']
+    return f"Subject: {thread.get('subject', '')}\nTo: {thread.get('to', '')}\n\n{thread.get('snippet', '')}"
+
+
+def recipient_name_for(thread: Dict) -> str:
+    """Name to greet in a draft: the To header's display name, else its mailbox."""
+    name, address = parseaddr(thread.get('to') or '')
+    return name or address.split('@')[0]
+
+
+def _api_key() -> str:
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key:
+        logger.error("OPENAI_API_KEY environment variable not set")
+        raise ValueError("OPENAI_API_KEY environment variable not set")
+    return api_key
+
+
+class AIService:
+    def __init__(self, client=None, cache=None, model: str = None, async_client=None, token_budget: int = None):
+        """
+        Initialize OpenAI client with API key from environment.
+
+        Responses are cached in cache (get_ai_cache() by default; pass
+        False to disable caching), so an unchanged thread costs one call.
+        async_client (an AsyncOpenAI) is used by the batch API; without one,
+        each batch opens its own. Thread text is trimmed to token_budget
+        tokens (AI_PROMPT_TOKEN_BUDGET) per input; token_stats sums the
+        tokens sent and saved.
+        """
+        logger.debug("Initializing AIService")
+        if client is None:
+            client = OpenAI(api_key=_api_key())
+        self.client = client
+        self.async_client = async_client
+        self.cache = get_ai_cache() if cache is None else (None if cache is False else cache)
+        self.model = model or AI_MODEL
+        self.token_budget = token_budget or AI_PROMPT_TOKEN_BUDGET
+        self.token_stats = {'calls': 0, 'tokens': 0, 'tokens_saved': 0}
+        # Batch analyses by where the answer came from
+        self.source_stats = {'local': 0, 'cache': 0, 'model': 0, 'cluster': 0}
+        self.stream_stats = {'streams': 0, 'cached': 0, 'completed': 0, 'cancelled': 0, 'failed': 0,
+                             'first_tokens': 0, 'ttft_seconds_total': 0.0, 'ttft_seconds_max': 0.0,
+                             'ttft_seconds_last': None}
+        self._stats_lock = threading.Lock()
+        logger.debug("AIService initialized successfully")
+
+    def _cached(self, kind: str, prompt_version: int, key_inputs: dict, use_cache: bool):
+        """Return (cache key, cached response); both None when there is no cache, the response None on a miss."""
+        if self.cache is None:
+            return None, None
+        key = cache_key(self.model, kind, prompt_version, key_inputs)
+        cached = self.cache.get(key) if use_cache else None
+        if cached is not None:
+            logger.debug(f"AI cache hit for {kind}")
+        return key, cached
+
+    def _complete(self, kind: str, prompt_version: int, key_inputs: dict, prompt: str, use_cache: bool) -> str:
+        """
+        Run a prompt through the model, answering from the cache when an
+        identical call (same model, prompt version and normalized inputs) was
+        made within the cache TTL. use_cache=False skips the lookup but still
+        stores the fresh response.
+        """
+        key, cached = self._cached(kind, prompt_version, key_inputs, use_cache)
+        if cached is not None:
+            return cached
+
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}]
+        )
+        result = response.choices[0].message.content
+        if key is not None and result is not None:
+            self.cache.put(key, result, kind=kind, model=self.model)
+        return result
+
+    def _trim(self, kind: str, *contents) -> tuple:
+        """Fit each thread text to the token budget, and count the tokens saved by this call."""
+        built = [build_thread_content(content, self.token_budget) for content in contents]
+        saved = sum(b.tokens_saved for b in built)
+        with self._stats_lock:
+            self.token_stats['calls'] += 1
+            self.token_stats['tokens'] += sum(b.tokens for b in built)
+            self.token_stats['tokens_saved'] += saved
+        logger.debug(f"{kind} prompt: {sum(b.tokens for b in built)} thread tokens, {saved} saved by trimming")
+        return tuple(b.text for b in built) + (saved,)
+
+    def _urgency_prompt(self, thread_content, days_since_sent):
+        """Return (prompt, cache key inputs, tokens saved); the key covers the trimmed content."""
+        thread_content, saved = self._trim('urgency', thread_content)
+        prompt = URGENCY_PROMPT.format(thread_content=thread_content, days_since_sent=days_since_sent)
+        key_inputs = {'thread_content': normalize_input(thread_content), 'days': days_bucket(days_since_sent)}
+        return prompt, key_inputs, saved
+
+    def analyze_thread_urgency(self, thread_content, days_since_sent, use_cache: bool = True):
+        """Analyze if a job-related email thread needs follow-up."""
+        logger.debug(f"Analyzing thread urgency for content from {days_since_sent} days ago")
+
+        prompt, key_inputs, _ = self._urgency_prompt(thread_content, days_since_sent)
+
+        try:
+            logger.debug("Sending request to OpenAI API for thread analysis")
+            result = self._complete('urgency', URGENCY_PROMPT_VERSION, key_inputs, prompt, use_cache)
+            logger.debug(f"Received analysis from OpenAI: {result}")
+            return result
+        except Exception as e:
+            logger.error(f"Error analyzing thread urgency: {str(e)}")
+            raise
+
+    def _followup_prompt(self, original_thread, recipient_name, last_email_content, days_since_sent):
+        """Return (prompt, cache key inputs); the key covers the trimmed thread text."""
+        original_thread, last_email_content, _ = self._trim('followup', original_thread, last_email_content)
+        prompt = FOLLOWUP_PROMPT.format(original_thread=original_thread, recipient_name=recipient_name,
+                                        last_email_content=last_email_content, days_since_sent=days_since_sent)
+        key_inputs = {
+            'original_thread': normalize_input(original_thread),
+            'recipient_name': normalize_input(recipient_name),
+            'last_email_content': normalize_input(last_email_content),
+            'days': days_bucket(days_since_sent),
+        }
+        return prompt, key_inputs
+
+    def generate_followup_email(self, original_thread, recipient_name, last_email_content, days_since_sent,
+                                use_cache: bool = True):
+        """Generate a job-seeking follow-up email."""
+        logger.debug(f"Generating follow-up email for recipient: {recipient_name}, days since sent: {days_since_sent}")
+
+        prompt, key_inputs = self._followup_prompt(original_thread, recipient_name, last_email_content,
+                                                   days_since_sent)
+
         try:
             logger.debug("Sending request to OpenAI API for email generation")
-            response = self.client.chat.completions.create(
-                model="gpt-5-nano",
-                messages=[{"role": "user", "content": prompt}]
-            )
-            result = response.choices[0].message.content
+            result = self._complete('followup', FOLLOWUP_PROMPT_VERSION, key_inputs, prompt, use_cache)
             logger.debug(f"Generated follow-up email: {result}")
             return result
         except Exception as e:
             logger.error(f"Error generating follow-up email: {str(e)}")
             raise
+
+    def stream_followup_email(self, original_thread, recipient_name, last_email_content, days_since_sent,
+                              use_cache: bool = True) -> Iterator[str]:
+        """
+        Generate a follow-up email, yielding text as the model produces it.
+
+        A cached draft is yielded whole. Closing the generator early (the
+        client went away) closes the model stream, so no more tokens are
+        generated or billed; only drafts that finish are cached. stream_stats
+        counts outcomes and time to first token.
+        """
+        prompt, key_inputs = self._followup_prompt(original_thread, recipient_name, last_email_content,
+                                                   days_since_sent)
+        key, cached = self._cached('followup', FOLLOWUP_PROMPT_VERSION, key_inputs, use_cache)
+        if cached is not None:
+            self._count_stream('cached')
+            yield cached
+            return
+
+        started = time.monotonic()
+        self._count_stream('streams')
+        stream = None
+        parts: List[str] = []
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                stream=True
+            )
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                if not parts:
+                    self._record_first_token(time.monotonic() - started)
+                parts.append(delta)
+                yield delta
+        except GeneratorExit:
+            self._count_stream('cancelled')
+            logger.debug(f"Follow-up draft cancelled after {len(parts)} chunks")
+            raise
+        except Exception as e:
+            self._count_stream('failed')
+            logger.error(f"Error streaming follow-up email: {str(e)}")
+            raise
+        finally:
+            if stream is not None:
+                stream.close()
+        self._count_stream('completed')
+        if key is not None and parts:
+            self.cache.put(key, ''.join(parts), kind='followup', model=self.model)
+
+    def _count_stream(self, outcome: str) -> None:
+        with self._stats_lock:
+            self.stream_stats[outcome] += 1
+
+    def _record_first_token(self, seconds: float) -> None:
+        logger.info(f"Follow-up draft: first token after {seconds * 1000:.0f} ms")
+        with self._stats_lock:
+            stats = self.stream_stats
+            stats['first_tokens'] += 1
+            stats['ttft_seconds_total'] += seconds
+            stats['ttft_seconds_last'] = seconds
+            stats['ttft_seconds_max'] = max(stats['ttft_seconds_max'], seconds)
+
+    def metrics(self) -> Dict:
+        """Token, source, streaming and cache counters, with the mean time to first token."""
+        with self._stats_lock:
+            stream = dict(self.stream_stats)
+            result = {'tokens': dict(self.token_stats), 'sources': dict(self.source_stats), 'streams': stream}
+        stream['ttft_seconds_avg'] = (stream['ttft_seconds_total'] / stream['first_tokens']
+                                      if stream['first_tokens'] else None)
+        result['cache'] = dict(self.cache.stats) if self.cache is not None else None
+        return result
+
+    def prepare_request(self, kind: str, thread: Dict, use_cache: bool = True) -> Dict:
+        """
+        Build the chat completions request for a candidate thread without
+        sending it, for callers that submit requests themselves (the batch
+        job). kind is 'urgency' or 'followup'. Returns {body, key, cached}:
+        the request body, the cache key for store_response, and the cached
+        answer when there is one.
+        """
+        days_since_sent = days_since_sent_of(thread)
+        if kind == 'urgency':
+            prompt, key_inputs, _ = self._urgency_prompt(thread_content_for(thread), days_since_sent)
+            version = URGENCY_PROMPT_VERSION
+        elif kind == 'followup':
+            prompt, key_inputs = self._followup_prompt(thread_content_for(thread), recipient_name_for(thread),
+                                                       thread.get('snippet', ''), days_since_sent)
+            version = FOLLOWUP_PROMPT_VERSION
+        else:
+            raise ValueError(f"Unknown request kind: {kind}")
+        key, cached = self._cached(kind, version, key_inputs, use_cache)
+        body = {'model': self.model, 'messages': [{"role": "user", "content": prompt}]}
+        return {'body': body, 'key': key, 'cached': cached}
+
+    def store_response(self, kind: str, key: str | None, content: str) -> None:
+        """Cache an answer to a request built by prepare_request."""
+        if key is not None and content is not None and self.cache is not None:
+            self.cache.put(key, content, kind=kind, model=self.model)
+
+    def _count_source(self, source: str) -> None:
+        with self._stats_lock:
+            self.source_stats[source] += 1
+
+    async def _aanalyze(self, client: AsyncOpenAI, limiter: TokenBucket, semaphore: asyncio.Semaphore,
+                        thread: Dict, use_cache: bool, local: Dict | None) -> Dict:
+        """Analyze one thread; local is its preclassifier decision, or None when the model (or cache) must."""
+        entry = {'thread_id': thread.get('thread_id'), 'analysis': None, 'error': None, 'cached': False,
+                 'tokens_saved': 0, 'source': None}
+        if local is not None:
+            self._count_source('local')
+            entry.update(analysis=local, source='local')
+            return entry
+
+        days_since_sent = days_since_sent_of(thread)
+        prompt, key_inputs, entry['tokens_saved'] = self._urgency_prompt(thread_content_for(thread), days_since_sent)
+        try:
+            key, cached = self._cached('urgency', URGENCY_PROMPT_VERSION, key_inputs, use_cache)
+            if cached is not None:
+                self._count_source('cache')
+                entry.update(analysis=parse_urgency_analysis(cached), cached=True, source='cache')
+                return entry
+            self._count_source('model')
+            entry['source'] = 'model'
+            async with semaphore:
+                await limiter.acquire_async(1)
+                response = await client.chat.completions.create(
+                    model=self.model,
+                    messages=[{"role": "user", "content": prompt}]
+                )
+            result = response.choices[0].message.content
+            entry['analysis'] = parse_urgency_analysis(result)
+            # Only well-formed analyses are cached, so a bad answer is retried next time
+            if key is not None:
+                self.cache.put(key, result, kind='urgency', model=self.model)
+        except Exception as e:
+            logger.warning(f"Urgency analysis failed for thread {entry['thread_id']}: {str(e)}")
+            entry['error'] = str(e) or type(e).__name__
+        return entry
+
+    async def aanalyze_threads_urgency_batch(self, threads: Iterable[Dict], concurrency: int = None,
+                                             requests_per_minute: float = None, use_cache: bool = True,
+                                             preclassify: bool = None, cluster: bool = None) -> List[Dict]:
+        """
+        Analyze many candidate threads concurrently.
+
+        Each thread is a scan candidate (subject, to, snippet, days_since_last)
+        or a dict with thread_content and days_since_sent. With preclassify
+        (AI_PRECLASSIFY by default), threads the local rules in
+        app.preclassifier can decide never reach the model. With cluster
+        (AI_CLUSTER_THREADS by default), near-duplicates of the remaining
+        threads (see app.thread_clusters) share one analysis. At most
+        concurrency requests are in flight and no more than
+        requests_per_minute are started; cached analyses cost neither.
+        Returns one entry per thread, in order: {thread_id, analysis, error,
+        cached, tokens_saved, source}, where analysis is the validated result
+        of parse_urgency_analysis, or None with the error when the call or
+        validation failed (one failure does not fail the batch), and source
+        is 'local', 'cache', 'model', or 'cluster' for a thread answered with
+        the thread named by its cluster_of.
+        """
+        threads = list(threads)
+        concurrency = concurrency or AI_BATCH_CONCURRENCY
+        preclassify = AI_PRECLASSIFY if preclassify is None else preclassify
+        cluster = AI_CLUSTER_THREADS if cluster is None else cluster
+        rate = (requests_per_minute or AI_REQUESTS_PER_MINUTE) / 60.0
+        limiter = TokenBucket(rate, capacity=max(1.0, min(rate, concurrency)))
+        semaphore = asyncio.Semaphore(concurrency)
+
+        # Each thread is preclassified once, both to pick the ambiguous threads and to answer the rest
+        decisions = [preclassify_thread(thread) if preclassify else None for thread in threads]
+        # Index of each thread -> index of the thread whose analysis it shares
+        representative = list(range(len(threads)))
+        if cluster:
+            ambiguous = [i for i, decision in enumerate(decisions) if decision is None]
+            for group in cluster_threads([threads[i] for i in ambiguous], partition=cluster_partition):
+                for j in group:
+                    representative[ambiguous[j]] = ambiguous[group[0]]
+        analyzed = [i for i in range(len(threads)) if representative[i] == i]
+
+        async def run(client: AsyncOpenAI) -> List[Dict]:
+            entries = dict(zip(analyzed, await asyncio.gather(
+                *(self._aanalyze(client, limiter, semaphore, threads[i], use_cache, decisions[i]) for i in analyzed)
+            )))
+            for i, rep in enumerate(representative):
+                if rep != i:
+                    self._count_source('cluster')
+                    shared = entries[rep]
+                    entries[i] = dict(shared, thread_id=threads[i].get('thread_id'), cached=False, tokens_saved=0,
+                                      source='cluster', cluster_of=shared['thread_id'],
+                                      analysis=dict(shared['analysis']) if shared['analysis'] else None)
+            results = [entries[i] for i in range(len(threads))]
+            # One line per batch; per-prompt trimming is logged at DEBUG
+            logger.info(f"Urgency batch: {len(threads)} threads, {len(analyzed)} analyzed, "
+                        f"{sum(entry['tokens_saved'] for entry in results)} prompt tokens saved by trimming")
+            return results
+
+        if self.async_client is not None:
+            return await run(self.async_client)
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with AsyncOpenAI(api_key=_api_key(), http_client=httpx.AsyncClient(limits=limits)) as client:
+            return await run(client)
+
+    def analyze_threads_urgency_batch(self, threads: Iterable[Dict], concurrency: int = None,
+                                      requests_per_minute: float = None, use_cache: bool = True,
+                                      preclassify: bool = None, cluster: bool = None) -> List[Dict]:
+        """Blocking wrapper around aanalyze_threads_urgency_batch for callers without an event loop."""
+        return asyncio.run(self.aanalyze_threads_urgency_batch(threads, concurrency, requests_per_minute, use_cache,
+                                                               preclassify, cluster))
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_ai_service() -> AIService:
+    """Return the process-wide AIService; raises ValueError when OPENAI_API_KEY is not set."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = AIService()
+        return _service
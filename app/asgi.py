@@ -0,0 +1,200 @@
+"""
+ASGI entry point: serves the SSE streams on the event loop, everything else through Flask.
+
+Run with an ASGI server, e.g. ``uvicorn app.asgi:asgi_app --port 5000``. Each
+stream client is a coroutine waiting on the event loop, so concurrent clients
+do not each hold a worker thread. The thread stream follows the same
+ScanCache snapshot as the Flask route, whose scan runs once in the
+background with an AsyncGmailClient, and emits the same frames. The AI
+draft stream closes the model stream as soon as its client goes away.
+"""
+import asyncio
+import json
+import threading
+from typing import Dict
+from urllib.parse import parse_qs
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import app
+from app.ai_service import get_ai_service, recipient_name_for, thread_content_for
+from app.async_gmail import AsyncGmailClient, iterate_async
+from app.config import STREAM_COALESCE_MS, STREAM_GZIP, STREAM_HEARTBEAT_SECONDS, STREAM_RETRY_MS
+from app.email_service import aget_threads_to_follow_up
+from app.gmail_service import get_service_provider
+from app.scan_cache import get_scan_cache
+from app.send_queue import get_send_queue
+from app.sse import GzipFrames, SSE_HEADERS, ThreadStreamFrames, sse_event
+
+STREAM_PATH = '/api/threads-stream'
+DRAFT_STREAM_PATH = '/api/ai-draft-stream'
+STREAM_HEADERS = [(b'content-type', b'text/event-stream')] + [
+    (name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in SSE_HEADERS.items()
+]
+
+flask_app = WsgiToAsgi(app)
+
+
+def _scan_threads():
+    """Run the async scan on the scan cache's background thread, with a client bound to its loop."""
+    credentials = get_service_provider().credentials()
+
+    async def scan():
+        async with AsyncGmailClient(credentials) as client:
+            async for thread in aget_threads_to_follow_up(client):
+                yield thread
+
+    return iterate_async(scan)
+
+
+def _headers(scope) -> Dict[str, str]:
+    return {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope.get('headers', [])}
+
+
+def _query(scope) -> Dict[str, str]:
+    params = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    return {name: values[-1] for name, values in params.items()}
+
+
+async def _wait_for_disconnect(receive) -> None:
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def _until_disconnect(produce, receive) -> None:
+    """Run the `produce` coroutine until it finishes or the client disconnects, whichever comes first."""
+    producer = asyncio.ensure_future(produce)
+    disconnect = asyncio.ensure_future(_wait_for_disconnect(receive))
+    done, pending = await asyncio.wait({producer, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    if producer in done:
+        producer.result()
+    else:
+        # Let the producer's cleanup (closing what it streams from) finish before returning
+        await asyncio.gather(producer, return_exceptions=True)
+
+
+async def threads_stream(scope, receive, send) -> None:
+    """
+    Stream follow-up threads as SSE, like routes.threads_stream.
+
+    Supports the same Last-Event-ID resume and 'reset', coalesce_ms,
+    heartbeats, retry hint and gzip. A client going away only stops its
+    own subscription; the shared scan runs to the end and stays cached.
+    """
+    headers, query = _headers(scope), _query(scope)
+    snapshot = get_scan_cache().get('me', _scan_threads)
+    last_event_id = headers.get('last-event-id') or query.get('last_event_id')
+    try:
+        coalesce = max(0.0, float(query.get('coalesce_ms', STREAM_COALESCE_MS))) / 1000
+    except ValueError:
+        coalesce = STREAM_COALESCE_MS / 1000
+    frames = ThreadStreamFrames(snapshot, last_event_id, bool(coalesce))
+
+    response_headers = list(STREAM_HEADERS)
+    encoder = None
+    if STREAM_GZIP and 'gzip' in headers.get('accept-encoding', ''):
+        encoder = GzipFrames()
+        response_headers += [(b'content-encoding', b'gzip'), (b'vary', b'Accept-Encoding')]
+    await send({'type': 'http.response.start', 'status': 200, 'headers': response_headers})
+
+    async def write(chunks, more_body=True):
+        body = b''.join(encoder.encode(chunk) if encoder else chunk.encode('utf-8') for chunk in chunks)
+        if not more_body and encoder:
+            body += encoder.close()
+        await send({'type': 'http.response.body', 'body': body, 'more_body': more_body})
+
+    async def produce():
+        await write(frames.opening(STREAM_RETRY_MS))
+        try:
+            async for batch in snapshot.abatches(frames.index, coalesce, STREAM_HEARTBEAT_SECONDS):
+                await write(frames.batch(batch))
+        except Exception:
+            await write([frames.error()], more_body=False)
+            return
+        await write([frames.complete()], more_body=False)
+
+    await _until_disconnect(produce(), receive)
+
+
+async def ai_draft_stream(scope, receive, send) -> None:
+    """
+    Stream an AI follow-up draft as SSE, like routes.ai_draft_stream.
+
+    The model stream is a blocking iterator, so each chunk is read on a
+    worker thread. When the client goes away the draft generator is closed
+    (after any chunk being read), which closes the model stream so no more
+    tokens are generated or billed.
+    """
+    try:
+        ai = await asyncio.to_thread(get_ai_service)
+    except ValueError as exc:
+        body = json.dumps({'success': False, 'error': str(exc)}).encode('utf-8')
+        await send({'type': 'http.response.start', 'status': 503,
+                    'headers': [(b'content-type', b'application/json')]})
+        await send({'type': 'http.response.body', 'body': body})
+        return
+
+    query = _query(scope)
+    thread = {name: query.get(name, '') for name in ('thread_id', 'subject', 'to', 'snippet')}
+    try:
+        days = int(query.get('days', 0))
+    except ValueError:
+        days = 0
+    drafts = ai.stream_followup_email(thread_content_for(thread), recipient_name_for(thread),
+                                      thread['snippet'], days)
+    # next() and close() must not overlap: a generator cannot be closed while another thread runs it
+    lock = threading.Lock()
+
+    def step():
+        with lock:
+            return next(drafts, None)
+
+    def close():
+        with lock:
+            drafts.close()
+
+    await send({'type': 'http.response.start', 'status': 200, 'headers': STREAM_HEADERS})
+
+    async def write(data, more_body=True):
+        await send({'type': 'http.response.body', 'body': sse_event(data).encode('utf-8'), 'more_body': more_body})
+
+    async def produce():
+        try:
+            while (text := await asyncio.to_thread(step)) is not None:
+                await write({'type': 'token', 'text': text})
+        except Exception:
+            await write({'type': 'error', 'error': 'Draft generation failed.'}, more_body=False)
+            return
+        finally:
+            await asyncio.shield(asyncio.to_thread(close))
+        await write({'type': 'complete'}, more_body=False)
+
+    await _until_disconnect(produce(), receive)
+
+
+async def _lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Resume any follow-ups queued before the last shutdown
+            await asyncio.to_thread(get_send_queue)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await asyncio.to_thread(get_send_queue().stop, 5)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def asgi_app(scope, receive, send) -> None:
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+    elif scope['type'] == 'http' and scope['path'] == STREAM_PATH:
+        await threads_stream(scope, receive, send)
+    elif scope['type'] == 'http' and scope['path'] == DRAFT_STREAM_PATH:
+        await ai_draft_stream(scope, receive, send)
+    else:
+        await flask_app(scope, receive, send)
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import asyncio
+from typing import AsyncIterator, Callable, Dict, Iterator
+
+import httpx
+from google.auth.transport.requests import Request
+
+from app.config import ASYNC_MAX_CONNECTIONS
+from app.rate_limiter import GmailScheduler, get_gmail_scheduler
+
+GMAIL_API_BASE = 'https://gmail.googleapis.com/gmail/v1/users/me/'
+
+
+class AsyncGmailClient:
+    """
+    Minimal asyncio client for the Gmail REST endpoints the scan uses.
+
+    All requests share one httpx connection pool, so many concurrent scans or
+    stream clients reuse a bounded set of keep-alive connections. Responses are
+    the same JSON the discovery-based client returns, so the scan's parsing and
+    filtering helpers apply unchanged. Calls go through the quota scheduler.
+    """
+
+    def __init__(self, credentials, max_connections: int | None = None,
+                 transport: httpx.AsyncBaseTransport | None = None, scheduler: GmailScheduler | None = None):
+        max_connections = max_connections or ASYNC_MAX_CONNECTIONS
+        self.credentials = credentials
+        self.scheduler = scheduler or get_gmail_scheduler()
+        self._client = httpx.AsyncClient(
+            base_url=GMAIL_API_BASE,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=30.0,
+            transport=transport,
+        )
+        self._refresh_lock = asyncio.Lock()
+
+    async def __aenter__(self) -> 'AsyncGmailClient':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def _auth_headers(self) -> Dict[str, str]:
+        if not self.credentials.valid:
+            async with self._refresh_lock:
+                if not self.credentials.valid:
+                    # google-auth refresh is blocking; keep it off the event loop
+                    await asyncio.to_thread(self.credentials.refresh, Request())
+        return {'Authorization': f'Bearer {self.credentials.token}'}
+
+    async def _get(self, method: str, path: str, params: Dict | None = None) -> Dict:
+        params = {k: v for k, v in (params or {}).items() if v is not None}
+
+        async def call():
+            response = await self._client.get(path, params=params, headers=await self._auth_headers())
+            response.raise_for_status()
+            return response.json()
+
+        return await self.scheduler.execute_async(call, method)
+
+    async def get_profile(self) -> Dict:
+        return await self._get('users.getProfile', 'profile')
+
+    async def list_messages(self, q: str, page_token: str | None = None, max_results: int | None = None,
+                            fields: str | None = None) -> Dict:
+        params = {'q': q, 'pageToken': page_token, 'maxResults': max_results, 'fields': fields}
+        return await self._get('users.messages.list', 'messages', params)
+
+    async def list_threads(self, q: str, page_token: str | None = None, max_results: int | None = None,
+                           fields: str | None = None) -> Dict:
+        params = {'q': q, 'pageToken': page_token, 'maxResults': max_results, 'fields': fields}
+        return await self._get('users.threads.list', 'threads', params)
+
+    async def get_thread(self, thread_id: str, **params) -> Dict:
+        return await self._get('users.threads.get', f'threads/{thread_id}', params)
+
+
+def iterate_async(factory: Callable[[], AsyncIterator]) -> Iterator:
+    """
+    Drive an async generator from synchronous code on a private event loop.
+
+    factory is called inside the loop, so clients it creates are bound to it.
+    """
+    loop = asyncio.new_event_loop()
+    agen = None
+    try:
+        agen = factory()
+        while True:
+            try:
+                yield loop.run_until_complete(agen.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        if agen is not None:
+            loop.run_until_complete(agen.aclose())
+        loop.close()
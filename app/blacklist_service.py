@@ -1,31 +1,248 @@
 from __future__ import annotations
 
+import fnmatch
+import logging
+import re
+import threading
+from collections import deque
 from pathlib import Path
-from typing import Set
+from typing import Dict, List, Set, Tuple
 
-from app.config import BLACKLIST_FILE
+from app.config import BLACKLIST_FILE, BLACKLIST_RULES_FILE
+from app.scan_cache import get_scan_cache
+from app.thread_groups import normalize_subject
+
+logger = logging.getLogger(__name__)
+
+# Kinds of pattern rule; BLACKLIST_FILE holds exact subjects only, pattern rules live in BLACKLIST_RULES_FILE
+RULE_KINDS = ('prefix', 'contains', 'glob')
+_GLOB_SPECIALS = re.compile(r'[*?]|\[[^\]]*\]')
 
 
 def _blacklist_path() -> Path:
     return Path(BLACKLIST_FILE)
 
 
-def load_blacklisted_subjects() -> Set[str]:
-    """Load normalized blacklisted subjects from disk."""
-    path = _blacklist_path()
-    if not path.exists():
-        return set()
+def _rules_path() -> Path:
+    return Path(BLACKLIST_RULES_FILE)
+
+
+def parse_rule(line: str) -> Tuple[str, str]:
+    """
+    Parse a pattern rule line into (kind, normalized pattern).
+
+    Rules are 'prefix:Interest in', 'contains:recruiting' or
+    'glob:interest in * role'; anything else raises ValueError. Patterns are
+    normalized like subjects, so rules match regardless of case and spacing.
+    Rules come only from the rules file, so a blacklisted subject that
+    happens to start with 'prefix:' stays an exact subject.
+    """
+    kind, sep, pattern = line.partition(':')
+    if not sep or kind.strip().lower() not in RULE_KINDS:
+        raise ValueError(f"Not a blacklist rule ({', '.join(k + ':' for k in RULE_KINDS)}): {line!r}")
+    return kind.strip().lower(), normalize_subject(pattern)
+
+
+class _Automaton:
+    """
+    Aho-Corasick automaton over literal patterns.
+
+    search walks the subject once, whatever the number of patterns, and
+    returns as soon as a 'contains' pattern occurs; globs are reported as
+    candidates when their longest literal part occurs, then checked in full.
+    """
+
+    def __init__(self, contains: Set[str], globs: Dict[str, str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.hit: List[bool] = [False]
+        self.candidates: List[Tuple[str, ...]] = [()]
+        for pattern in contains:
+            self.hit[self._insert(pattern)] = True
+        for glob, anchor in globs.items():
+            node = self._insert(anchor)
+            self.candidates[node] += (glob,)
+
+        fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                state = fail[node]
+                while state and ch not in self.goto[state]:
+                    state = fail[state]
+                fail[child] = self.goto[state].get(ch, 0)
+                self.hit[child] = self.hit[child] or self.hit[fail[child]]
+                self.candidates[child] += self.candidates[fail[child]]
+                queue.append(child)
+        self.fail = fail
+
+    def _insert(self, pattern: str) -> int:
+        node = 0
+        for ch in pattern:
+            nxt = self.goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[node][ch] = nxt
+                self.goto.append({})
+                self.hit.append(False)
+                self.candidates.append(())
+            node = nxt
+        return node
+
+    def search(self, text: str) -> Tuple[bool, Set[str]]:
+        """Return (whether a contains pattern occurs, globs whose anchor occurs)."""
+        goto, fail, hit, candidates = self.goto, self.fail, self.hit, self.candidates
+        found: Set[str] = set()
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if hit[node]:
+                return True, found
+            if candidates[node]:
+                found.update(candidates[node])
+        return False, found
+
+
+class BlacklistIndex:
+    """
+    The blacklist's rules, indexed so a lookup walks the subject rather than the rules.
+
+    Exact subjects are a set, prefixes a character trie, and substrings plus
+    the literal anchors of globs share one Aho-Corasick automaton; only globs
+    whose anchor occurs in the subject (or that have no literal part) are
+    matched in full. `subject in index` tests a subject against every rule,
+    so the index stands in for the set of subjects it replaced.
+    """
+
+    def __init__(self, subjects=(), rules=()):
+        self.rules: Set[Tuple[str, str]] = set()
+        self.exact: Set[str] = set()
+        self._prefixes: Dict = {}
+        self._contains: Set[str] = set()
+        self._globs: Dict[str, str] = {}
+        self._glob_patterns: Dict[str, re.Pattern] = {}
+        self._unanchored: Tuple[str, ...] = ()
+        self._automaton: _Automaton | None = None
+        for subject in subjects:
+            self._add('exact', normalize_subject(subject))
+        for line in rules:
+            try:
+                self._add(*parse_rule(line))
+            except ValueError as e:
+                logger.warning(f"Ignoring blacklist rule: {e}")
+        self._rebuild()
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def __contains__(self, subject) -> bool:
+        return isinstance(subject, str) and self.matches(subject)
+
+    def _add(self, kind: str, pattern: str) -> bool:
+        if not pattern or (kind, pattern) in self.rules:
+            return False
+        self.rules.add((kind, pattern))
+        if kind == 'exact':
+            self.exact.add(pattern)
+        elif kind == 'prefix':
+            node = self._prefixes
+            for ch in pattern:
+                node = node.setdefault(ch, {})
+            node[''] = True
+        elif kind == 'contains':
+            self._contains.add(pattern)
+        else:
+            self._globs[pattern] = max(_GLOB_SPECIALS.split(pattern), key=len)
+            self._glob_patterns[pattern] = re.compile(fnmatch.translate(pattern))
+        return True
 
-    return {
-        line.strip().casefold()
-        for line in path.read_text(encoding='utf-8').splitlines()
-        if line.strip()
-    }
+    def _rebuild(self) -> None:
+        anchored = {glob: anchor for glob, anchor in self._globs.items() if anchor}
+        self._unanchored = tuple(glob for glob, anchor in self._globs.items() if not anchor)
+        # Swapped in whole, so concurrent lookups see the old or the new automaton
+        self._automaton = _Automaton(self._contains, anchored) if self._contains or anchored else None
 
+    def add(self, subject: str) -> bool:
+        """Add an exact subject in place; returns False when it is empty or already present."""
+        return self._add('exact', normalize_subject(subject))
 
-def is_subject_blacklisted(subject: str, blacklist: Set[str] | None = None) -> bool:
-    """Check whether a subject is in the blacklist."""
-    normalized_subject = subject.strip().casefold()
+    def add_rule(self, line: str) -> bool:
+        """Add a pattern rule (see parse_rule) in place; returns False when it is empty or already present."""
+        kind, pattern = parse_rule(line)
+        if not self._add(kind, pattern):
+            return False
+        if kind in ('contains', 'glob'):
+            self._rebuild()
+        return True
+
+    def matches(self, subject: str) -> bool:
+        """Check a subject against every rule."""
+        subject = normalize_subject(subject)
+        if not subject:
+            return False
+        if subject in self.exact:
+            return True
+
+        node = self._prefixes
+        for ch in subject:
+            if '' in node:
+                return True
+            node = node.get(ch)
+            if node is None:
+                break
+        else:
+            if '' in node:
+                return True
+
+        candidates = self._unanchored
+        if self._automaton is not None:
+            hit, found = self._automaton.search(subject)
+            if hit:
+                return True
+            candidates = candidates + tuple(found)
+        return any(self._glob_patterns[glob].match(subject) for glob in candidates)
+
+
+_index: BlacklistIndex | None = None
+_index_key = None
+_lock = threading.Lock()
+
+
+def _file_key(path: Path):
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return str(path), None, None
+    return str(path), stat.st_mtime_ns, stat.st_size
+
+
+def _read_lines(path: Path, key) -> List[str]:
+    lines = path.read_text(encoding='utf-8').splitlines() if key[1] is not None else ()
+    return [line for line in lines if line.strip()]
+
+
+def _current_index() -> BlacklistIndex:
+    """Return the cached index, re-reading the files only when an mtime or size changed. Needs _lock."""
+    global _index, _index_key
+    subjects_path, rules_path = _blacklist_path(), _rules_path()
+    key = (_file_key(subjects_path), _file_key(rules_path))
+    if _index is None or key != _index_key:
+        _index = BlacklistIndex(_read_lines(subjects_path, key[0]), _read_lines(rules_path, key[1]))
+        _index_key = key
+    return _index
+
+
+def load_blacklisted_subjects() -> BlacklistIndex:
+    """Return the process-wide blacklist index, reloaded if the file changed on disk."""
+    with _lock:
+        return _current_index()
+
+
+def is_subject_blacklisted(subject: str, blacklist=None) -> bool:
+    """Check whether a subject is in the blacklist (an index, or a set of normalized subjects)."""
+    normalized_subject = normalize_subject(subject)
     if not normalized_subject:
         return False
 
@@ -35,19 +252,30 @@ def is_subject_blacklisted(subject: str, blacklist: Set[str] | None = None) -> b
 
 
 def add_subject_to_blacklist(subject: str) -> bool:
-    """Persist a subject to the flat-file blacklist if it is not already present."""
+    """
+    Persist an exact subject to the flat-file blacklist if it is not already
+    present. Pattern rules are edited in BLACKLIST_RULES_FILE instead.
+
+    The check and append happen under the index lock, so concurrent callers
+    cannot write the same rule twice; the in-memory index is updated directly
+    rather than re-read.
+    """
+    global _index_key
     normalized_subject = subject.strip()
-    if not normalized_subject:
+    if not normalize_subject(normalized_subject):
         raise ValueError('Subject cannot be empty.')
 
-    blacklist = load_blacklisted_subjects()
-    if normalized_subject.casefold() in blacklist:
-        return False
-
-    path = _blacklist_path()
-    path.parent.mkdir(parents=True, exist_ok=True)
+    with _lock:
+        index = _current_index()
+        if ('exact', normalize_subject(normalized_subject)) in index.rules:
+            return False
 
-    with path.open('a', encoding='utf-8') as blacklist_file:
-        blacklist_file.write(f"{normalized_subject}\n")
+        path = _blacklist_path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open('a', encoding='utf-8') as blacklist_file:
+            blacklist_file.write(f"{normalized_subject}\n")
+        index.add(normalized_subject)
+        _index_key = (_file_key(path), _index_key[1])
 
+    get_scan_cache().invalidate()
     return True
@@ -13,6 +13,100 @@ MAX_DAYS = int(os.getenv('MAX_DAYS', 6))
 BATCH_SIZE = int(os.getenv('BATCH_SIZE', 20))
 MAX_FOLLOW_UPS = int(os.getenv('MAX_FOLLOW_UPS', 3))
 BLACKLIST_FILE = os.getenv('BLACKLIST_FILE', 'subject_blacklist.txt')
+# Pattern rules (prefix:/contains:/glob:), kept apart so no subject line is ever read as a rule
+BLACKLIST_RULES_FILE = os.getenv('BLACKLIST_RULES_FILE', 'subject_blacklist_rules.txt')
+
+# Local state (queues, caches, history) holds addresses, subjects and prompt text, so by default
+# it lives in a per-user data directory rather than the working directory (usually the checkout)
+DATA_DIR = os.getenv('DATA_DIR') or os.path.join(
+    os.getenv('XDG_DATA_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'share'), 'gmailpy'
+)
+
+# Thread fetching during the follow-up scan: 'sequential', 'batch' or 'parallel'
+SCAN_FETCH_MODE = os.getenv('SCAN_FETCH_MODE', 'sequential')
+THREAD_BATCH_SIZE = int(os.getenv('THREAD_BATCH_SIZE', 50))
+THREAD_BATCH_MAX_RETRIES = int(os.getenv('THREAD_BATCH_MAX_RETRIES', 3))
+SCAN_WORKERS = int(os.getenv('SCAN_WORKERS', 8))
+# Parallel scans yield in page order when set, otherwise as soon as each thread finishes
+SCAN_PRESERVE_ORDER = bool(int(os.getenv('SCAN_PRESERVE_ORDER', '1')))
+
+# Async scan: shared connection pool size, and whether the nightly job uses the async scan
+ASYNC_MAX_CONNECTIONS = int(os.getenv('ASYNC_MAX_CONNECTIONS', 20))
+USE_ASYNC_SCAN = bool(int(os.getenv('USE_ASYNC_SCAN', '0')))
+
+# Gmail API quota scheduler (per-user limit is 250 quota units per second)
+GMAIL_QUOTA_UNITS_PER_SECOND = float(os.getenv('GMAIL_QUOTA_UNITS_PER_SECOND', 250))
+GMAIL_MAX_RETRIES = int(os.getenv('GMAIL_MAX_RETRIES', 5))
+GMAIL_BACKOFF_BASE_SECONDS = float(os.getenv('GMAIL_BACKOFF_BASE_SECONDS', 1))
+GMAIL_BACKOFF_MAX_SECONDS = float(os.getenv('GMAIL_BACKOFF_MAX_SECONDS', 64))
+
+# Pooled Gmail service objects (each holds its own keep-alive HTTP transport)
+GMAIL_SERVICE_POOL_SIZE = int(os.getenv('GMAIL_SERVICE_POOL_SIZE', 8))
+
+# How the scan lists candidate threads (the search query itself is fixed)
+SCAN_LIST_METHOD = os.getenv('SCAN_LIST_METHOD', 'auto')  # 'auto', 'messages' or 'threads'
+
+# Incremental sync: re-fetch only threads changed since the last stored Gmail historyId
+INCREMENTAL_SYNC = bool(int(os.getenv('INCREMENTAL_SYNC', '0')))
+SYNC_STATE_FILE = os.getenv('SYNC_STATE_FILE', os.path.join(DATA_DIR, 'sync_state.json'))
+
+# Local SQLite thread-state cache shared by the scan and send paths (disabled when empty)
+THREAD_STORE_PATH = os.getenv('THREAD_STORE_PATH', '')
+THREAD_STORE_MAX_ENTRIES = int(os.getenv('THREAD_STORE_MAX_ENTRIES', 10000))
+THREAD_STORE_MAX_AGE_SECONDS = int(os.getenv('THREAD_STORE_MAX_AGE_SECONDS', 7 * 24 * 3600))
+
+# Concurrent sends for the bulk /send-followups endpoint (paced by the Gmail quota scheduler)
+SEND_WORKERS = int(os.getenv('SEND_WORKERS', 4))
+
+# Durable background send queue (SQLite) drained by in-process workers
+SEND_QUEUE_PATH = os.getenv('SEND_QUEUE_PATH', os.path.join(DATA_DIR, 'send_queue.sqlite3'))
+SEND_QUEUE_WORKERS = int(os.getenv('SEND_QUEUE_WORKERS', 2))
+SEND_RATE_PER_SECOND = float(os.getenv('SEND_RATE_PER_SECOND', 1))
+SEND_MAX_ATTEMPTS = int(os.getenv('SEND_MAX_ATTEMPTS', 5))
+SEND_RETRY_BASE_SECONDS = float(os.getenv('SEND_RETRY_BASE_SECONDS', 5))
+SEND_RETRY_MAX_SECONDS = float(os.getenv('SEND_RETRY_MAX_SECONDS', 300))
+SEND_LEASE_SECONDS = float(os.getenv('SEND_LEASE_SECONDS', 300))
+
+# Shared scan results for /api/threads-stream: reused for this long, dropped on send or blacklist
+SCAN_CACHE_TTL_SECONDS = float(os.getenv('SCAN_CACHE_TTL_SECONDS', 300))
+
+# /api/threads-stream framing: coalescing window, heartbeat interval, client retry delay, gzip
+STREAM_COALESCE_MS = float(os.getenv('STREAM_COALESCE_MS', 0))
+STREAM_HEARTBEAT_SECONDS = float(os.getenv('STREAM_HEARTBEAT_SECONDS', 15))
+STREAM_RETRY_MS = int(os.getenv('STREAM_RETRY_MS', 3000))
+STREAM_GZIP = bool(int(os.getenv('STREAM_GZIP', '1')))
+
+# Follow-up report: 'csv', 'jsonl' or 'parquet' (needs pyarrow); rows are buffered at most this long
+REPORT_FORMAT = os.getenv('REPORT_FORMAT', 'csv')
+REPORT_FLUSH_ROWS = int(os.getenv('REPORT_FLUSH_ROWS', 100))
+REPORT_FLUSH_SECONDS = float(os.getenv('REPORT_FLUSH_SECONDS', 5))
+
+# Queryable follow-up history (SQLite) written alongside the reports (disabled when empty)
+HISTORY_STORE_PATH = os.getenv('HISTORY_STORE_PATH', os.path.join(DATA_DIR, 'followup_history.sqlite3'))
+
+# OpenAI model for AIService, and its persistent response cache (disabled when AI_CACHE_PATH is empty)
+AI_MODEL = os.getenv('AI_MODEL', 'gpt-5-nano')
+AI_CACHE_PATH = os.getenv('AI_CACHE_PATH', os.path.join(DATA_DIR, 'ai_cache.sqlite3'))
+AI_CACHE_TTL_SECONDS = int(os.getenv('AI_CACHE_TTL_SECONDS', 7 * 24 * 3600))
+AI_CACHE_MAX_ENTRIES = int(os.getenv('AI_CACHE_MAX_ENTRIES', 5000))
+# Thread text pasted into an AI prompt is trimmed to this many tokens per input
+AI_PROMPT_TOKEN_BUDGET = int(os.getenv('AI_PROMPT_TOKEN_BUDGET', 1500))
+# Batch urgency analysis: requests in flight, and requests started per minute
+AI_BATCH_CONCURRENCY = int(os.getenv('AI_BATCH_CONCURRENCY', 8))
+AI_REQUESTS_PER_MINUTE = float(os.getenv('AI_REQUESTS_PER_MINUTE', 500))
+# Nightly job (ENABLE_FLASK_UI=0): after the sends, export a score and draft for every candidate
+# through a batch job file (report-only; the sends do not use it), on the 'openai' Batch API or
+# the file-based 'local' backend, polling until it finishes
+AI_BATCH_NIGHTLY = bool(int(os.getenv('AI_BATCH_NIGHTLY', '0')))
+AI_BATCH_BACKEND = os.getenv('AI_BATCH_BACKEND', 'openai')
+AI_BATCH_DIR = os.getenv('AI_BATCH_DIR', os.path.join(DATA_DIR, 'ai_batches'))
+AI_BATCH_POLL_SECONDS = float(os.getenv('AI_BATCH_POLL_SECONDS', 60))
+AI_BATCH_TIMEOUT_SECONDS = float(os.getenv('AI_BATCH_TIMEOUT_SECONDS', 24 * 3600))
+# Near-duplicate clustering: one AI call per cluster of threads at least this similar (MinHash Jaccard)
+AI_CLUSTER_THREADS = bool(int(os.getenv('AI_CLUSTER_THREADS', '1')))
+AI_CLUSTER_THRESHOLD = float(os.getenv('AI_CLUSTER_THRESHOLD', 0.8))
+# Decide obvious threads with local rules (app.preclassifier) instead of the model
+AI_PRECLASSIFY = bool(int(os.getenv('AI_PRECLASSIFY', '1')))
 
 # Flag to disable sending follow-up emails
 DISABLE_SEND_FOLLOWUP = bool(int(os.getenv('DISABLE_SEND_FOLLOWUP', '0')))
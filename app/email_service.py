@@ -1,13 +1,49 @@
-from app.report_service import generate_followup_report
+from app import report_service
 from app.blacklist_service import is_subject_blacklisted, load_blacklisted_subjects
 from app.config import FOLLOWUP_TEMPLATES
+from app.async_gmail import AsyncGmailClient, iterate_async
+from app.gmail_query import compile_followup_query
+from app.rate_limiter import get_gmail_scheduler, is_rate_limited, is_retryable, quota_units
+from app.scan_cache import get_scan_cache
+from app.thread_model import ParsedMessage, ParsedThread, parse_messages
+from app.thread_store import get_thread_store
 
+import asyncio
 import datetime
+import logging
 import os
 import base64
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
 from email.mime.text import MIMEText
-from typing import List, Dict
-from app.config import MIN_DAYS, MAX_DAYS, BATCH_SIZE, MAX_FOLLOW_UPS, DISABLE_SEND_FOLLOWUP
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.errors import HttpError
+from app.config import (
+    MIN_DAYS, MAX_DAYS, BATCH_SIZE, MAX_FOLLOW_UPS, DISABLE_SEND_FOLLOWUP,
+    SCAN_FETCH_MODE, THREAD_BATCH_SIZE, THREAD_BATCH_MAX_RETRIES,
+    SCAN_WORKERS, SCAN_PRESERVE_ORDER, INCREMENTAL_SYNC, SEND_WORKERS
+)
+
+logger = logging.getLogger(__name__)
+
+FETCH_MODES = ('sequential', 'batch', 'parallel')
+
+# Lean fetch profile for the scan: it only reads these headers plus each message's
+# id, internalDate and snippet, so bodies and MIME parts are never transferred.
+# Message-ID is kept so the thread store can serve the send path's In-Reply-To.
+SCAN_METADATA_HEADERS = ['From', 'Subject', 'To', 'Message-ID']
+SCAN_THREAD_PARAMS = {
+    'format': 'metadata',
+    'metadataHeaders': SCAN_METADATA_HEADERS,
+    'fields': 'id,historyId,messages(id,threadId,internalDate,snippet,payload/headers)',
+}
+SCAN_LIST_FIELDS = 'messages(id,threadId),nextPageToken'
+SCAN_THREAD_LIST_FIELDS = 'threads(id,historyId),nextPageToken'
 
 
 def is_within_followup_window(days_since_last: int) -> bool:
@@ -15,83 +51,496 @@ def is_within_followup_window(days_since_last: int) -> bool:
     return MIN_DAYS <= days_since_last <= MAX_DAYS
 
 
-def get_threads_to_follow_up_generator(service):
+def _scan_thread_request(service, thread_id: str):
+    """Build a threads().get request using the scan's metadata-only profile."""
+    return service.users().threads().get(userId='me', id=thread_id, **SCAN_THREAD_PARAMS)
+
+
+def _execute(request, **kwargs):
+    """Execute a Gmail request through the process-wide quota scheduler."""
+    return get_gmail_scheduler().execute(request, **kwargs)
+
+
+def _full_thread_request(service, thread_id: str):
+    """Build a threads().get request for the whole thread, bodies included."""
+    return service.users().threads().get(userId='me', id=thread_id)
+
+
+def _history_id_request(service, thread_id: str):
+    """Build a threads().get request for just the thread's current historyId."""
+    return service.users().threads().get(userId='me', id=thread_id, format='minimal', fields='historyId')
+
+
+def fetch_threads_batched(service, thread_ids: Iterable[str],
+                          batch_size: int | None = None,
+                          max_retries: int | None = None,
+                          make_request: Callable = _scan_thread_request) -> Dict[str, Dict]:
     """
-    Generator that yields threads batch-wise for streaming.
+    Fetch threads through the Gmail batch endpoint, up to batch_size per round-trip.
+
+    make_request builds each item's request; the default uses the scan's
+    metadata-only profile.
+
+    Each round-trip reserves the quota of all its items from the scheduler.
+    Items that fail with a rate-limit or transient status are retried with
+    jittered exponential backoff; items that still fail, or fail permanently,
+    are logged and left out of the returned {thread_id: thread} mapping.
     """
-    profile = service.users().getProfile(userId='me').execute()
-    user_email = profile['emailAddress']
-    now = datetime.datetime.utcnow()
-    blacklisted_subjects = load_blacklisted_subjects()
-    after_ts = int((now - datetime.timedelta(days=MAX_DAYS)).timestamp())
-    before_ts = int((now - datetime.timedelta(days=MIN_DAYS)).timestamp())
-    query = f"label:SENT after:{after_ts} before:{before_ts} subject:'Interest in'"
+    scheduler = get_gmail_scheduler()
+    batch_size = batch_size or THREAD_BATCH_SIZE
+    max_retries = THREAD_BATCH_MAX_RETRIES if max_retries is None else max_retries
+    results = {}
+    pending = list(dict.fromkeys(thread_ids))
+    attempt = 0
+    while pending:
+        retry = []
+
+        def callback(request_id, response, exception):
+            if exception is None:
+                results[request_id] = response
+            elif is_retryable(exception):
+                if is_rate_limited(exception):
+                    scheduler.record_throttle()
+                retry.append(request_id)
+            else:
+                logger.warning(f"Skipping thread {request_id}: {exception}")
+
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            batch = service.new_batch_http_request(callback=callback)
+            for thread_id in chunk:
+                batch.add(make_request(service, thread_id), request_id=thread_id)
+            scheduler.acquire(quota_units('users.threads.get') * len(chunk))
+            try:
+                batch.execute()
+            except HttpError as e:
+                if not is_retryable(e):
+                    raise
+                retry.extend(tid for tid in chunk if tid not in results and tid not in retry)
+
+        if not retry:
+            break
+        if attempt >= max_retries:
+            logger.warning(f"Giving up on {len(retry)} threads after {attempt} retries: {retry}")
+            break
+        time.sleep(scheduler.backoff_delay(attempt))
+        attempt += 1
+        pending = retry
+    return results
+
+
+def _iter_page_threads(service, thread_ids: List[str], fetch_mode: str) -> Iterator[Tuple[str, Dict]]:
+    """Yield (thread_id, thread) pairs for one page, in page order."""
+    if fetch_mode == 'batch':
+        fetched = fetch_threads_batched(service, thread_ids)
+        for thread_id in thread_ids:
+            if thread_id in fetched:
+                yield thread_id, fetched[thread_id]
+    else:
+        for thread_id in thread_ids:
+            yield thread_id, _execute(_scan_thread_request(service, thread_id))
+
+
+def _worker_http_factory(service) -> Callable[[], object] | None:
+    """
+    Return a factory for per-worker transports sharing the service's credentials.
+
+    httplib2.Http is not thread-safe, so parallel workers must not share the
+    transport the service was built with.
+    """
+    http = getattr(service, '_http', None)
+    if not isinstance(http, AuthorizedHttp):
+        return None
+    return lambda: AuthorizedHttp(http.credentials, http=httplib2.Http())
+
+
+def _iter_parallel(service, thread_ids: Iterable[str], evaluate: Callable[[str, Dict], Dict | None],
+                   workers: int, ordered: bool,
+                   lookup: Callable[[str], Dict | None] | None = None) -> Iterator[Dict | None]:
+    """
+    Fetch and evaluate threads on a bounded pool of workers.
+
+    At most 2 * workers threads are in flight, so the listing is only paged
+    as fast as results are consumed. With ordered=True results come back in
+    listing order, otherwise in completion order. Threads lookup already has
+    a result for are not fetched; their result is ready at once.
+    """
+    http_factory = _worker_http_factory(service)
+    local = threading.local()
+
+    def work(thread_id):
+        if http_factory is not None and not hasattr(local, 'http'):
+            local.http = http_factory()
+        thread = _execute(_scan_thread_request(service, thread_id), http=getattr(local, 'http', None))
+        return evaluate(thread_id, thread)
+
+    def submit(thread_id) -> Future:
+        known = lookup(thread_id) if lookup is not None else None
+        if known is None:
+            return pool.submit(work, thread_id)
+        future = Future()
+        future.set_result(known)
+        return future
+
+    max_in_flight = max(1, workers) * 2
+    thread_ids = iter(thread_ids)
+    pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='scan')
+    try:
+        if ordered:
+            in_flight = deque()
+            while True:
+                for thread_id in thread_ids:
+                    in_flight.append(submit(thread_id))
+                    if len(in_flight) >= max_in_flight:
+                        break
+                if not in_flight:
+                    break
+                yield in_flight.popleft().result()
+        else:
+            in_flight = set()
+            while True:
+                for thread_id in thread_ids:
+                    in_flight.add(submit(thread_id))
+                    if len(in_flight) >= max_in_flight:
+                        break
+                if not in_flight:
+                    break
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def summarize_thread(thread_id: str, thread: Dict | ParsedThread, user_email: str) -> Dict | None:
+    """
+    Reduce a fetched thread to the facts the follow-up criteria are checked against.
+
+    Summaries are JSON-serialisable and independent of the current time, so they
+    can be stored and re-evaluated later with evaluate_summary.
+    """
+    parsed = thread if isinstance(thread, ParsedThread) else ParsedThread(thread, thread_id)
+    if not parsed.messages:
+        return None
+    first_msg, last_msg = parsed.first, parsed.last
+    return {
+        'thread_id': thread_id,
+        'history_id': parsed.history_id,
+        'all_from_user': all(m.is_from(user_email) for m in parsed.messages),
+        'first_subject': first_msg.subject,
+        'message_id': first_msg.header('message-id') or None,
+        'last_message_id': last_msg.id,
+        'subject': last_msg.subject,
+        'to': last_msg.header('to'),
+        'snippet': last_msg.snippet,
+        'last_message_ts': last_msg.timestamp,
+        'followup_count': count_followups(parsed.messages),
+    }
+
+
+def evaluate_summary(summary: Dict | None, now: datetime.datetime, blacklisted_subjects) -> Dict | None:
+    """Return the follow-up entry for a thread summary, or None when it does not qualify."""
+    # Only process if all messages are from user
+    if not summary or not summary['all_from_user']:
+        return None
+    # Filter: first email subject must start with 'Interest in'
+    if not summary['first_subject'].strip().lower().startswith('interest in'):
+        return None
+    subject = summary['subject']
+    if is_subject_blacklisted(subject, blacklisted_subjects):
+        return None
+    # Check last message date
+    last_msg_date = summary['last_message_ts']
+    days_since_last = (now - datetime.datetime.utcfromtimestamp(last_msg_date)).days
+    if not is_within_followup_window(days_since_last):
+        return None
+    # Check follow-up count
+    followup_count = summary['followup_count']
+    if followup_count >= MAX_FOLLOW_UPS:
+        return None
+    return {
+        'id': summary['last_message_id'],
+        'thread_id': summary['thread_id'],
+        'subject': subject,
+        'to': summary['to'],
+        'date': datetime.datetime.utcfromtimestamp(last_msg_date).strftime('%Y-%m-%d %H:%M:%S'),
+        'snippet': summary['snippet'],
+        'followup_count': followup_count,
+        'days_since_last': days_since_last
+    }
+
 
-    threads_to_follow_up = []
+def _evaluate_thread(thread_id: str, thread: Dict, user_email: str,
+                     now: datetime.datetime, blacklisted_subjects) -> Dict | None:
+    """Return the follow-up entry for a thread, or None when it does not qualify."""
+    return evaluate_summary(summarize_thread(thread_id, thread, user_email), now, blacklisted_subjects)
+
+
+def iter_thread_id_pages(service, query: str) -> Iterator[List[str]]:
+    """Yield the not-yet-seen thread IDs of each listing page, in first-appearance order."""
     seen_thread_ids = set()
     page_token = None
     while True:
-        results = service.users().messages().list(
+        results = _execute(service.users().messages().list(
             userId='me',
             q=query,
             maxResults=BATCH_SIZE,
-            pageToken=page_token
-        ).execute()
+            pageToken=page_token,
+            fields=SCAN_LIST_FIELDS
+        ))
         messages = results.get('messages', [])
         if not messages:
             break
 
-        thread_ids = set(msg['threadId'] for msg in messages) - seen_thread_ids
+        thread_ids = [tid for tid in dict.fromkeys(msg['threadId'] for msg in messages)
+                      if tid not in seen_thread_ids]
         seen_thread_ids.update(thread_ids)
-        for thread_id in thread_ids:
-            thread = service.users().threads().get(userId='me', id=thread_id).execute()
-            thread_messages = thread.get('messages', [])
-            # Only process if all messages are from user
-            if all(is_from_user(m, user_email) for m in thread_messages):
-                # Filter: first email subject must start with 'Interest in'
-                if thread_messages:
-                    first_subject = get_header(thread_messages[0], 'subject').strip().lower()
-                    if not first_subject.startswith('interest in'):
-                        continue
-                # Check last message date
-                last_msg = thread_messages[-1]
-                subject = get_header(last_msg, 'subject')
-                if is_subject_blacklisted(subject, blacklisted_subjects):
-                    continue
-                last_msg_date = int(last_msg['internalDate']) // 1000
-                days_since_last = (now - datetime.datetime.utcfromtimestamp(last_msg_date)).days
-                if is_within_followup_window(days_since_last):
-                    # Check follow-up count
-                    followup_count = count_followups(thread_messages)
-                    if followup_count < MAX_FOLLOW_UPS:
-                        thread_data = {
-                            'id': last_msg['id'],
-                            'thread_id': thread_id,
-                            'subject': subject,
-                            'to': get_header(last_msg, 'to'),
-                            'date': datetime.datetime.utcfromtimestamp(last_msg_date).strftime('%Y-%m-%d %H:%M:%S'),
-                            'snippet': last_msg.get('snippet', ''),
-                            'followup_count': followup_count,
-                            'days_since_last': days_since_last
-                        }
-                        threads_to_follow_up.append(thread_data)
-                        yield thread_data
+        yield thread_ids
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
+
+
+def iter_thread_history_pages(service, query: str) -> Iterator[List[Tuple[str, str]]]:
+    """Yield (thread_id, historyId) pairs per page of a threads().list listing."""
+    page_token = None
+    while True:
+        results = _execute(service.users().threads().list(
+            userId='me',
+            q=query,
+            maxResults=BATCH_SIZE,
+            pageToken=page_token,
+            fields=SCAN_THREAD_LIST_FIELDS
+        ))
+        threads = results.get('threads', [])
+        if not threads:
+            break
+
+        yield [(thread['id'], thread.get('historyId')) for thread in threads]
         page_token = results.get('nextPageToken')
         if not page_token:
             break
-    
-    # Generate CSV report after batch processing
-    generate_followup_report(threads_to_follow_up)
 
 
-def get_threads_to_follow_up(service) -> List[Dict]:
+def _read_through_summaries(service, store, pages: Iterable[List[Tuple[str, str]]], user_email: str,
+                            fetch_mode: str | None, ordered: bool | None) -> Iterator[Dict | None]:
+    """
+    Yield a summary per listed thread, fetching only threads whose historyId changed.
+
+    All pages go through one iter_processed_threads call, so stored
+    summaries are yielded as soon as they are looked up, fetches overlap
+    across pages and a parallel fetch keeps its pool and transports.
+    """
+    listed_history: Dict[str, str | None] = {}
+
+    def id_pages():
+        for page in pages:
+            listed_history.update(page)
+            yield [thread_id for thread_id, _ in page]
+
+    def stored(thread_id):
+        return store.get_summary(thread_id, listed_history.pop(thread_id, None))
+
+    def fetch_summary(thread_id, thread):
+        summary = summarize_thread(thread_id, thread, user_email)
+        if summary:
+            store.put_summary(thread_id, thread.get('historyId'), summary)
+        return summary
+
+    yield from iter_processed_threads(service, id_pages(), fetch_summary, fetch_mode, ordered, lookup=stored)
+    store.evict()
+
+
+def iter_processed_threads(service, pages: Iterable[List[str]], process: Callable[[str, Dict], Dict | None],
+                           fetch_mode: str | None = None, ordered: bool | None = None,
+                           lookup: Callable[[str], Dict | None] | None = None) -> Iterator[Dict | None]:
+    """
+    Fetch the threads of each listing page and yield process(thread_id, thread) for each.
+
+    fetch_mode selects how threads are fetched: 'sequential' issues one
+    threads().get per thread, 'batch' groups them through the Gmail batch
+    endpoint and 'parallel' fetches and processes them on SCAN_WORKERS threads.
+    Results follow listing order, except for a parallel fetch with
+    ordered=False, which yields them as they finish. When lookup returns a
+    result for a thread ID (e.g. a stored summary), that is yielded instead
+    and the thread is not fetched.
+    """
+    fetch_mode = fetch_mode or SCAN_FETCH_MODE
+    if fetch_mode not in FETCH_MODES:
+        raise ValueError(f"Unknown fetch mode: {fetch_mode}")
+    if ordered is None:
+        ordered = SCAN_PRESERVE_ORDER
+
+    if fetch_mode == 'parallel':
+        thread_ids = (thread_id for page in pages for thread_id in page)
+        return _iter_parallel(service, thread_ids, process, SCAN_WORKERS, ordered, lookup)
+    if lookup is None:
+        return (process(thread_id, thread)
+                for page in pages
+                for thread_id, thread in _iter_page_threads(service, page, fetch_mode))
+    return _iter_pages_with_lookup(service, pages, process, fetch_mode, lookup)
+
+
+def _iter_pages_with_lookup(service, pages: Iterable[List[str]], process: Callable[[str, Dict], Dict | None],
+                            fetch_mode: str, lookup: Callable[[str], Dict | None]) -> Iterator[Dict | None]:
+    """Sequential or batch fetch of each page's threads lookup has no result for, in listing order."""
+    for page in pages:
+        known = {thread_id: lookup(thread_id) for thread_id in page}
+        # Fetched lazily, in page order (a batch fetch leaves out threads it could not get)
+        fetched = _iter_page_threads(service, [tid for tid, result in known.items() if result is None], fetch_mode)
+        pending = next(fetched, None)
+        for thread_id in page:
+            if known[thread_id] is not None:
+                yield known[thread_id]
+            elif pending is not None and pending[0] == thread_id:
+                yield process(*pending)
+                pending = next(fetched, None)
+            else:
+                yield None
+
+
+def get_threads_to_follow_up_generator(service, fetch_mode: str | None = None, ordered: bool | None = None,
+                                       incremental: bool | None = None, report: bool = True):
+    """
+    Generator that yields threads batch-wise for streaming.
+
+    See iter_processed_threads for fetch_mode and ordered. With incremental=True
+    (default INCREMENTAL_SYNC) only threads changed since the last run are
+    fetched, via sync_service, and the stored candidates are re-evaluated.
+    Otherwise the listing query comes from gmail_query.compile_followup_query,
+    and when the thread store is enabled only threads not already stored at
+    their listed historyId are fetched.
+
+    With report=True each thread is also written to today's follow-up
+    report as it is yielded.
+    """
+    if (fetch_mode or SCAN_FETCH_MODE) not in FETCH_MODES:
+        raise ValueError(f"Unknown fetch mode: {fetch_mode}")
+    if incremental is None:
+        incremental = INCREMENTAL_SYNC
+
+    profile = _execute(service.users().getProfile(userId='me'))
+    user_email = profile['emailAddress']
+    now = datetime.datetime.utcnow()
+    blacklisted_subjects = load_blacklisted_subjects()
+
+    store = get_thread_store()
+    if incremental:
+        from app.sync_service import sync_thread_summaries
+        summaries = sync_thread_summaries(service, profile, fetch_mode, ordered)
+        results = (evaluate_summary(summary, now, blacklisted_subjects) for summary in summaries)
+    else:
+        compiled = compile_followup_query(now)
+        if compiled.list_method == 'threads':
+            ref_pages = iter_thread_history_pages(service, compiled.q)
+        else:
+            ref_pages = ([(thread_id, None) for thread_id in page]
+                         for page in iter_thread_id_pages(service, compiled.q))
+
+        if store is not None:
+            summaries = _read_through_summaries(service, store, ref_pages, user_email, fetch_mode, ordered)
+            results = (evaluate_summary(summary, now, blacklisted_subjects) for summary in summaries)
+        else:
+            def evaluate(thread_id, thread):
+                return _evaluate_thread(thread_id, thread, user_email, now, blacklisted_subjects)
+
+            pages = ([thread_id for thread_id, _ in page] for page in ref_pages)
+            results = iter_processed_threads(service, pages, evaluate, fetch_mode, ordered)
+
+    # Report rows are streamed as threads are yielded rather than collected for the end
+    report_sink = report_service.open_followup_report() if report else None
+    try:
+        for thread_data in results:
+            if thread_data:
+                if report_sink is not None:
+                    report_sink.write(thread_data)
+                yield thread_data
+    finally:
+        if report_sink is not None:
+            report_sink.close()
+
+
+async def aget_threads_to_follow_up(client, ordered: bool | None = None, concurrency: int | None = None,
+                                    report: bool = True):
+    """
+    Async variant of get_threads_to_follow_up_generator on an AsyncGmailClient.
+
+    Same query and filtering; the threads of each listing page are fetched
+    concurrently, at most concurrency (default SCAN_WORKERS) at a time. The
+    thread store and incremental sync are not used on this path.
+    """
+    if ordered is None:
+        ordered = SCAN_PRESERVE_ORDER
+    semaphore = asyncio.Semaphore(concurrency or SCAN_WORKERS)
+
+    profile = await client.get_profile()
+    user_email = profile['emailAddress']
+    now = datetime.datetime.utcnow()
+    blacklisted_subjects = await asyncio.to_thread(load_blacklisted_subjects)
+    compiled = compile_followup_query(now)
+
+    async def evaluate(thread_id):
+        async with semaphore:
+            thread = await client.get_thread(thread_id, **SCAN_THREAD_PARAMS)
+        return _evaluate_thread(thread_id, thread, user_email, now, blacklisted_subjects)
+
+    report_sink = await asyncio.to_thread(report_service.open_followup_report) if report else None
+    seen_thread_ids = set()
+    page_token = None
+    try:
+        while True:
+            if compiled.list_method == 'threads':
+                results = await client.list_threads(compiled.q, page_token, BATCH_SIZE, SCAN_THREAD_LIST_FIELDS)
+                listed = [thread['id'] for thread in results.get('threads', [])]
+            else:
+                results = await client.list_messages(compiled.q, page_token, BATCH_SIZE, SCAN_LIST_FIELDS)
+                listed = [msg['threadId'] for msg in results.get('messages', [])]
+            if not listed:
+                break
+
+            thread_ids = [tid for tid in dict.fromkeys(listed) if tid not in seen_thread_ids]
+            seen_thread_ids.update(thread_ids)
+            tasks = [asyncio.ensure_future(evaluate(thread_id)) for thread_id in thread_ids]
+            try:
+                for next_result in (tasks if ordered else asyncio.as_completed(tasks)):
+                    thread_data = await next_result
+                    if thread_data:
+                        if report_sink is not None:
+                            # Buffered; only every REPORT_FLUSH_ROWS-th write touches the file
+                            report_sink.write(thread_data)
+                        yield thread_data
+            finally:
+                for task in tasks:
+                    task.cancel()
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+    finally:
+        if report_sink is not None:
+            await asyncio.to_thread(report_sink.close)
+
+
+def iter_threads_to_follow_up_async(credentials, ordered: bool | None = None, report: bool = True) -> Iterator[Dict]:
+    """Synchronous adapter over aget_threads_to_follow_up for non-async callers."""
+    async def scan():
+        async with AsyncGmailClient(credentials) as client:
+            async for thread_data in aget_threads_to_follow_up(client, ordered, report=report):
+                yield thread_data
+
+    return iterate_async(scan)
+
+
+def get_threads_to_follow_up(service, fetch_mode: str | None = None, ordered: bool | None = None,
+                             incremental: bool | None = None, report: bool = True) -> List[Dict]:
     """
     Get threads from last MIN_DAYS to MAX_DAYS, batch-wise, that need follow-up.
     (Deprecated: use get_threads_to_follow_up_generator for streaming results)
     """
-    return list(get_threads_to_follow_up_generator(service))
+    return list(get_threads_to_follow_up_generator(service, fetch_mode, ordered, incremental, report))
 
 def is_from_user(message, user_email: str) -> bool:
+    if isinstance(message, ParsedMessage):
+        return message.is_from(user_email)
     try:
         headers = message.get('payload', {}).get('headers', [])
         from_header = next((h['value'] for h in headers if h['name'].lower() == 'from'), '')
@@ -112,102 +561,250 @@ def get_plain_text_body(payload) -> str | None:
     return None
 
 def get_header(message, name: str) -> str:
+    if isinstance(message, ParsedMessage):
+        return message.header(name.lower())
     try:
         headers = message.get('payload', {}).get('headers', [])
         return next((h['value'] for h in headers if h['name'].lower() == name.lower()), '')
     except (KeyError, AttributeError):
         return ''
 
-def count_followups(messages: List[Dict]) -> int:
-    """Count how many follow-ups have been sent in this thread."""
+def count_followups(messages: Iterable) -> int:
+    """Count how many follow-ups have been sent in this thread (raw or parsed messages)."""
     # Simple heuristic: count messages with subject starting with 'Re:' or containing 'follow up'
     count = 0
-    for m in messages:
-        subject = get_header(m, 'subject').lower()
+    for m in parse_messages(messages):
+        subject = m.subject.lower()
         if subject.startswith('re:') or 'follow up' in subject:
             count += 1
     return count
 
+def extract_receiver_name(message) -> str | None:
+    """Extract the recipient's name from a message's salutation, e.g. 'Hi James,'."""
+    payload = message.payload if isinstance(message, ParsedMessage) else message.get('payload', {})
+    body_data = get_plain_text_body(payload)
+    if not body_data:
+        return None
+    # Ensure proper padding for base64 then decode
+    padded = body_data + '=' * (-len(body_data) % 4)
+    decoded_body = base64.urlsafe_b64decode(padded).decode('utf-8', errors='ignore')
+    # Match salutations like "Hi James," or "Hello James Smith" (case-insensitive, multiline).
+    m = re.search(
+        r'^\s*(?:hi|hello)[\s,]+([A-Za-z][A-Za-z\'\-\s]*?)(?=[,\.\n\r]|$)',
+        decoded_body,
+        re.IGNORECASE | re.MULTILINE
+    )
+    return m.group(1).strip() if m else None
+
+
+def get_followup_details(service, thread_id: str, user_email: str) -> Dict:
+    """
+    Return the first message's Message-ID, the receiver name, the follow-up count
+    and the last message's To and Subject.
+
+    Served from the thread store when it holds these details at the thread's
+    live historyId (checked with a minimal fetch, so a reply that arrived since
+    the last scan is never missed); otherwise the full thread is fetched once
+    and the store is filled for next time.
+    """
+    store = get_thread_store()
+    record = _stored_details(store, thread_id)
+    if record is not None:
+        live = _execute(_history_id_request(service, thread_id))
+        if str(live.get('historyId')) == record['history_id']:
+            return _details_from_record(record)
+
+    thread = _execute(_full_thread_request(service, thread_id))
+    return _details_from_thread(store, thread_id, thread, user_email)
+
+
+def _stored_details(store, thread_id: str) -> Dict | None:
+    """The stored record when it has send details and a known historyId to check them against."""
+    record = store.get(thread_id) if store is not None else None
+    if record and record['has_details'] and record['summary'] and record['history_id']:
+        return record
+    return None
+
+
+def _details_from_record(record: Dict) -> Dict:
+    summary = record['summary']
+    return {
+        'message_id': record['message_id'],
+        'receiver_name': record['receiver_name'],
+        'followup_count': summary['followup_count'],
+        'to': summary.get('to'),
+        'subject': summary.get('subject'),
+    }
+
+
+def _details_from_thread(store, thread_id: str, thread: Dict, user_email: str) -> Dict:
+    """Extract follow-up details from a fully fetched thread, filling the store when enabled."""
+    parsed = ParsedThread(thread, thread_id)
+    details = {'message_id': None, 'receiver_name': None, 'followup_count': count_followups(parsed.messages)}
+    if parsed.messages:
+        # First message (original) carries the In-Reply-To target and the salutation
+        first_msg = parsed.first
+        details['message_id'] = first_msg.header('message-id') or None
+        details['receiver_name'] = extract_receiver_name(first_msg)
+        # Last message is what the follow-up replies to
+        details['to'] = parsed.last.header('to')
+        details['subject'] = parsed.last.subject
+        if store is not None:
+            store.put_summary(thread_id, parsed.history_id, summarize_thread(thread_id, parsed, user_email))
+            store.put_details(thread_id, details['message_id'], details['receiver_name'])
+    return details
+
+
+def get_followup_details_bulk(service, thread_ids: Iterable[str], user_email: str) -> Dict[str, Dict]:
+    """
+    get_followup_details for many threads at once.
+
+    The historyIds of threads the store knows are checked together through
+    the batch endpoint, and threads still current are served from the store;
+    the rest are fetched in full, also batched. Threads that cannot be
+    fetched are missing from the returned {thread_id: details} mapping.
+    """
+    store = get_thread_store()
+    details, stored, missing = {}, {}, []
+    for thread_id in dict.fromkeys(thread_ids):
+        record = _stored_details(store, thread_id)
+        if record is not None:
+            stored[thread_id] = record
+        else:
+            missing.append(thread_id)
+    if stored:
+        live = fetch_threads_batched(service, stored, make_request=_history_id_request)
+        for thread_id, record in stored.items():
+            if thread_id in live and str(live[thread_id].get('historyId')) == record['history_id']:
+                details[thread_id] = _details_from_record(record)
+            else:
+                missing.append(thread_id)
+    if missing:
+        fetched = fetch_threads_batched(service, missing, make_request=_full_thread_request)
+        for thread_id, thread in fetched.items():
+            details[thread_id] = _details_from_thread(store, thread_id, thread, user_email)
+    return details
+
+
 def send_followup_email(service, to: str, subject: str, thread_id: str) -> bool:
     """Send a general follow-up email."""
     try:
-        from datetime import datetime
-        import re
-        
         # Get authenticated user's profile for actual email
-        profile = service.users().getProfile(userId='me').execute()
+        profile = _execute(service.users().getProfile(userId='me'))
         profile_email = profile['emailAddress']
         sender_name = os.getenv('SENDER_NAME', 'Nishant Soni')
         
-        # Get thread and extract message IDs for threading
-        thread = service.users().threads().get(userId='me', id=thread_id).execute()
-        last_email_date = None
-        thread_messages = thread.get('messages', [])
-        receiver_name = None
-        original_message_id = None
-        
-        if thread and 'messages' in thread and thread['messages']:
-            # Get first message (original) for In-Reply-To header
-            first_msg = thread['messages'][0]
-            first_msg_headers = first_msg.get('payload', {}).get('headers', [])
-            original_message_id = next((h['value'] for h in first_msg_headers if h['name'].lower() == 'message-id'), None)
-            
-            # Get last message date
-            last_msg = thread['messages'][-1]
-            last_email_ts = int(last_msg.get('internalDate', '0')) // 1000
-            last_email_date = datetime.utcfromtimestamp(last_email_ts).strftime('%Y-%m-%d %H:%M UTC')
-            
-            # Extract receiver name from first message salutation
-            body_data = get_plain_text_body(first_msg.get('payload', {}))
-
-            if body_data:
-                # Ensure proper padding for base64 then decode
-                padded = body_data + '=' * (-len(body_data) % 4)
-                decoded_body = base64.urlsafe_b64decode(padded).decode('utf-8', errors='ignore')
-                # Match salutations like "Hi James," or "Hello James Smith" (case-insensitive, multiline).
-                m = re.search(
-                    r'^\s*(?:hi|hello)[\s,]+([A-Za-z][A-Za-z\'\-\s]*?)(?=[,\.\n\r]|$)',
-                    decoded_body,
-                    re.IGNORECASE | re.MULTILINE
-                )
-                if m:
-                    receiver_name = m.group(1).strip()
-        
-        if not receiver_name:
-            receiver_name = ''
-        
-        # Select template based on follow-up count
-        followup_count = count_followups(thread_messages)
-        print(f"Follow-up count for thread {thread_id}: {followup_count}")
-        template_idx = followup_count % len(FOLLOWUP_TEMPLATES)
-        template_body = FOLLOWUP_TEMPLATES[template_idx]
-        salutation = f"Hi {receiver_name}," if receiver_name else "Hi,"
-        
-        #signature = f"{sender_name}\n{sender_email}{spacing}{separator}{spacing}{sender_phone}"
-        signature = f"{sender_name}"
-        message_text = f"{salutation}\n\n{template_body}\n\nThanks,\n{signature}"
-        
-        message = MIMEText(message_text)
-        message['to'] = to
-        message['from'] = f"{sender_name} <{profile_email}>"
-        message['subject'] = f"Re: {subject}"
-        
-        # Add threading headers to keep emails in same thread
-        if original_message_id:
-            message['In-Reply-To'] = original_message_id
-            message['References'] = original_message_id
-        
-        raw = base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
-        
-        if DISABLE_SEND_FOLLOWUP:
-            print(f"Dry run: Would send follow-up to {to} | Subject: Re: {subject} | message: {message_text}")
-            return True
-        else:
-            service.users().messages().send(
-                userId='me',
-                body={'raw': raw, 'threadId': thread_id}
-            ).execute()
-            return True
+        # Get thread details for threading headers, salutation and template choice
+        details = get_followup_details(service, thread_id, profile_email)
+        deliver_followup(service, to, subject, thread_id, details, profile_email, sender_name)
+        return True
     except Exception as e:
-        print(f"Error sending follow-up: {e}")
+        logger.warning(f"Error sending follow-up for thread {thread_id}: {e}")
         return False
+
+
+def _compose_followup(to: str, subject: str, details: Dict, profile_email: str, sender_name: str) -> Tuple[str, str]:
+    """Return the raw (base64url) follow-up message and its text."""
+    receiver_name = details['receiver_name'] or ''
+    original_message_id = details['message_id']
+
+    # Select template based on follow-up count
+    template_idx = details['followup_count'] % len(FOLLOWUP_TEMPLATES)
+    template_body = FOLLOWUP_TEMPLATES[template_idx]
+    salutation = f"Hi {receiver_name}," if receiver_name else "Hi,"
+
+    #signature = f"{sender_name}\n{sender_email}{spacing}{separator}{spacing}{sender_phone}"
+    signature = f"{sender_name}"
+    message_text = f"{salutation}\n\n{template_body}\n\nThanks,\n{signature}"
+
+    message = MIMEText(message_text)
+    message['to'] = to
+    message['from'] = f"{sender_name} <{profile_email}>"
+    message['subject'] = f"Re: {subject}"
+
+    # Add threading headers to keep emails in same thread
+    if original_message_id:
+        message['In-Reply-To'] = original_message_id
+        message['References'] = original_message_id
+
+    return base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8'), message_text
+
+
+def deliver_followup(service, to: str, subject: str, thread_id: str, details: Dict,
+                     profile_email: str, sender_name: str, http=None, invalidate: bool = True) -> bool:
+    """
+    Compose and send (or, in dry-run mode, print) one follow-up; raises on failure.
+
+    Returns whether the message was actually sent, i.e. False for a dry run.
+    A sent thread no longer qualifies, so cached scans are dropped; callers
+    sending many (invalidate=False) drop them once when they are done.
+    """
+    raw, message_text = _compose_followup(to, subject, details, profile_email, sender_name)
+    if DISABLE_SEND_FOLLOWUP:
+        print(f"Dry run: Would send follow-up to {to} | Subject: Re: {subject} | message: {message_text}")
+        return False
+    _execute(service.users().messages().send(
+        userId='me',
+        body={'raw': raw, 'threadId': thread_id}
+    ), http=http)
+    store = get_thread_store()
+    if store is not None:
+        store.record_followup_sent(thread_id)
+    if invalidate:
+        get_scan_cache().invalidate()
+    return True
+
+
+def send_followups_bulk(service, items: Iterable, workers: int | None = None) -> Iterator[Dict]:
+    """
+    Send follow-ups for many threads, yielding one result per item as it completes.
+
+    items are thread IDs or dicts with a thread_id and optionally the to and
+    subject the scan reported; missing values are taken from the thread's
+    last message. The profile is fetched once and thread details in bulk
+    (thread store, then batched fetches); sends then run on a worker pool,
+    each worker with its own transport, paced by the quota scheduler.
+    """
+    items = [{'thread_id': item} if isinstance(item, str) else dict(item) for item in items]
+    if not items:
+        return
+    profile = _execute(service.users().getProfile(userId='me'))
+    profile_email = profile['emailAddress']
+    sender_name = os.getenv('SENDER_NAME', 'Nishant Soni')
+    details = get_followup_details_bulk(service, [item['thread_id'] for item in items], profile_email)
+
+    http_factory = _worker_http_factory(service)
+    local = threading.local()
+
+    def send(item):
+        thread_id = item['thread_id']
+        thread_details = details.get(thread_id)
+        to = item.get('to') or (thread_details or {}).get('to')
+        subject = item.get('subject') or (thread_details or {}).get('subject')
+        result = {'thread_id': thread_id, 'to': to, 'subject': subject, 'success': False}
+        if thread_details is None:
+            result['error'] = 'Thread could not be fetched'
+            return result
+        if http_factory is not None and not hasattr(local, 'http'):
+            local.http = http_factory()
+        try:
+            sent.append(deliver_followup(service, to, subject, thread_id, thread_details, profile_email,
+                                         sender_name, http=getattr(local, 'http', None), invalidate=False))
+            result['success'] = True
+        except Exception as e:
+            logger.warning(f"Error sending follow-up for thread {thread_id}: {e}")
+            result['error'] = str(e)
+        return result
+
+    sent: List[bool] = []
+    workers = max(1, min(workers or SEND_WORKERS, len(items)))
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='send')
+    try:
+        for future in as_completed([pool.submit(send, item) for item in items]):
+            yield future.result()
+    finally:
+        # Sends already in progress finish; queued ones are dropped if the consumer goes away
+        pool.shutdown(wait=False, cancel_futures=True)
+        # Once for the whole call, rather than after every send
+        if any(sent):
+            get_scan_cache().invalidate()
@@ -1,35 +1,65 @@
+import logging
 import os
-from app.gmail_service import get_gmail_service
-from app.email_service import get_threads_to_follow_up, send_followup_email
-from app.report_service import generate_followup_report
+from app.config import AI_BATCH_NIGHTLY, USE_ASYNC_SCAN
+from app.gmail_service import get_gmail_service, get_service_provider
+from app.email_service import get_threads_to_follow_up, iter_threads_to_follow_up_async, send_followup_email
+from app.report_service import open_followup_report
+
+logger = logging.getLogger(__name__)
+
+
+def run_ai_batch_for(threads):
+    """
+    Export an AI score and draft for each of the run's threads through a batch
+    job, after the sends. Report-only: the sends never use the results, which
+    are saved to <job>.results.jsonl for review. AI problems never fail the run.
+    """
+    from app.ai_batch import run_ai_batch
+    try:
+        job = run_ai_batch(threads)
+    except Exception as e:
+        logger.error(f"AI batch failed: {e}")
+        return None
+    needs = sum(1 for entry in job.results.values() if entry['analysis'] and entry['analysis']['needs_followup'])
+    drafted = sum(1 for entry in job.results.values() if entry['draft'])
+    logger.info(f"AI batch: {needs} of {len(job.results)} threads need a follow-up, {drafted} drafted "
+                f"(results in {job.directory / (job.name + '.results.jsonl')})")
+    return job.results
+
 
 def run_followup_and_report():
     disable_send = os.getenv('DISABLE_SEND_FOLLOWUP', '0') in ['1', 'true', 'True']
     service = get_gmail_service()
-    threads = get_threads_to_follow_up(service)
-    print(f"Found {len(threads)} threads to follow up.")
-    results = []
-    for thread in threads:
-        result = {
-            'to': thread.get('to'),
-            'subject': thread.get('subject'),
-            'thread_id': thread.get('thread_id'),
-            'date': thread.get('date'),
-            'followup_count': thread.get('followup_count', 0),
-            'status': None
-        }
-        if disable_send:
-            print(f"Dry run: Would send follow-up to {result['to']} | Subject: {result['subject']}")
-            result['status'] = 'dry_run'
-        else:
-            success = send_followup_email(
-                service,
-                result['to'],
-                result['subject'],
-                result['thread_id']
-            )
-            print(f"Sent follow-up to {result['to']} | Subject: {result['subject']} | Success: {success}")
-            result['status'] = 'sent' if success else 'failed'
-        results.append(result)
-    # Generate report after processing
-    generate_followup_report(results)
+    # Only the send outcomes are reported, so each thread gets one row rather than a scan row and a send row
+    if USE_ASYNC_SCAN:
+        threads = list(iter_threads_to_follow_up_async(get_service_provider().credentials(), report=False))
+    else:
+        threads = get_threads_to_follow_up(service, report=False)
+    logger.info(f"Found {len(threads)} threads to follow up.")
+    with open_followup_report() as report:
+        for thread in threads:
+            result = {
+                'to': thread.get('to'),
+                'subject': thread.get('subject'),
+                'thread_id': thread.get('thread_id'),
+                'date': thread.get('date'),
+                'followup_count': thread.get('followup_count', 0),
+                'status': None
+            }
+            if disable_send:
+                logger.info(f"Dry run: Would send follow-up to {result['to']} | Subject: {result['subject']}")
+                result['status'] = 'dry_run'
+            else:
+                success = send_followup_email(
+                    service,
+                    result['to'],
+                    result['subject'],
+                    result['thread_id']
+                )
+                logger.info(f"Sent follow-up to {result['to']} | Subject: {result['subject']} | Success: {success}")
+                result['status'] = 'sent' if success else 'failed'
+            # Written as each send completes, so an interrupted run still reports what it sent
+            report.write(result)
+    # Last, so the sends never wait on a batch that can take up to 24 hours; the export informs later runs only
+    if AI_BATCH_NIGHTLY and threads:
+        run_ai_batch_for(threads)
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import datetime
+from typing import List, NamedTuple
+
+from app.config import MAX_DAYS, MIN_DAYS, SCAN_LIST_METHOD
+from app.thread_store import get_thread_store
+
+LIST_METHODS = ('messages', 'threads')
+
+
+class CompiledQuery(NamedTuple):
+    q: str
+    list_method: str
+
+
+def compile_followup_query(now: datetime.datetime, bounded: bool = True,
+                           list_method: str | None = None) -> CompiledQuery:
+    """
+    The scan's Gmail search query and listing method.
+
+    The query is the historical label/date/subject one; none of the follow-up
+    checks can be pushed into it. Search operators match single messages, so
+    thread-level rules ("every message is from me", "the last subject is not
+    blacklisted") would drop threads the local checks keep, and from:me adds
+    nothing to label:SENT. All of them run on the fetched threads.
+
+    list_method 'auto' picks threads().list when the thread store is enabled,
+    since only that listing returns historyIds, and messages().list otherwise.
+    """
+    list_method = list_method or SCAN_LIST_METHOD
+    if list_method == 'auto':
+        list_method = 'threads' if get_thread_store() is not None else 'messages'
+    if list_method not in LIST_METHODS:
+        raise ValueError(f"Unknown list method: {list_method}")
+
+    after_ts = int((now - datetime.timedelta(days=MAX_DAYS)).timestamp())
+    terms: List[str] = ['label:SENT', f'after:{after_ts}']
+    if bounded:
+        before_ts = int((now - datetime.timedelta(days=MIN_DAYS)).timestamp())
+        terms.append(f'before:{before_ts}')
+    terms.append("subject:'Interest in'")
+    return CompiledQuery(' '.join(terms), list_method)
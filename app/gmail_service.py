@@ -1,16 +1,23 @@
 import os
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+import httplib2
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.discovery_cache import get_static_doc
 from google.auth.transport.requests import Request
+from app.config import GMAIL_SERVICE_POOL_SIZE
 
 SCOPES = [
     'https://www.googleapis.com/auth/gmail.readonly',
     'https://www.googleapis.com/auth/gmail.send'
 ]
 
-def get_gmail_service():
-    """Initialize and return Gmail service with proper authentication."""
+def get_gmail_credentials():
+    """Load, refresh or obtain OAuth credentials for the Gmail account."""
     creds = None
     cred_path = os.getenv('GMAIL_CREDENTIALS_PATH') or os.environ.get('GMAIL_CREDENTIALS_PATH') or 'credentials.json'
     
@@ -51,13 +58,115 @@ def get_gmail_service():
             
             # Save the credentials only if we successfully got them
             if creds and creds.valid:
-                try:
-                    with open('token.json', 'w') as token:
-                        token.write(creds.to_json())
-                except Exception as e:
-                    print(f"Error saving token.json: {e}")
+                _save_token(creds)
     except Exception as e:
         print(f"Error in authentication flow: {e}")
         raise
     
-    return build('gmail', 'v1', credentials=creds)
+    return creds
+
+
+def _save_token(creds) -> None:
+    try:
+        with open('token.json', 'w') as token:
+            token.write(creds.to_json())
+    except Exception as e:
+        print(f"Error saving token.json: {e}")
+
+
+@lru_cache(maxsize=None)
+def _discovery_document() -> str | None:
+    """The Gmail v1 discovery document bundled with googleapiclient, read once."""
+    return get_static_doc('gmail', 'v1')
+
+
+class GmailServiceProvider:
+    """
+    Process-wide source of Gmail service objects.
+
+    Credentials are loaded from token.json once and kept in memory; when they
+    expire, one caller refreshes them under a lock and persists the new token
+    while the others wait. Services are built from the cached discovery
+    document, each with its own AuthorizedHttp (httplib2 is not thread-safe),
+    and are returned to a bounded pool after a lease, so later requests reuse
+    their keep-alive connections instead of opening new ones.
+    """
+
+    def __init__(self, credentials_loader=get_gmail_credentials, pool_size: int | None = None):
+        self._load_credentials = credentials_loader
+        self.pool_size = GMAIL_SERVICE_POOL_SIZE if pool_size is None else pool_size
+        self._credentials = None
+        self._credentials_lock = threading.Lock()
+        self._idle = []
+        self._pool_lock = threading.Lock()
+        self.stats = {'credential_loads': 0, 'refreshes': 0, 'services_built': 0, 'leases': 0}
+
+    def credentials(self):
+        """Return valid in-memory credentials, loading or refreshing them once under the lock."""
+        creds = self._credentials
+        if creds is not None and creds.valid:
+            return creds
+        with self._credentials_lock:
+            creds = self._credentials
+            if creds is not None and creds.valid:
+                return creds
+            if creds is not None and creds.refresh_token:
+                try:
+                    creds.refresh(Request())
+                    self.stats['refreshes'] += 1
+                    _save_token(creds)
+                    return creds
+                except Exception as e:
+                    print(f"Error refreshing token: {e}")
+            self._credentials = self._load_credentials()
+            self.stats['credential_loads'] += 1
+            return self._credentials
+
+    def _build(self):
+        credentials = self.credentials()
+        http = AuthorizedHttp(credentials, http=httplib2.Http())
+        document = _discovery_document()
+        self.stats['services_built'] += 1
+        if document is None:
+            return build('gmail', 'v1', http=http)
+        return build_from_document(document, http=http)
+
+    def service(self):
+        """Return a service owned by the caller, for long-lived single-threaded use."""
+        return self._build()
+
+    @contextmanager
+    def lease(self):
+        """Borrow a pooled service for the duration of a request."""
+        with self._pool_lock:
+            service = self._idle.pop() if self._idle else None
+            self.stats['leases'] += 1
+        if service is None:
+            service = self._build()
+        else:
+            # Shared credentials object: refresh once here rather than per transport
+            self.credentials()
+        try:
+            yield service
+        finally:
+            with self._pool_lock:
+                if len(self._idle) < self.pool_size:
+                    self._idle.append(service)
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_service_provider() -> GmailServiceProvider:
+    """Return the process-wide service provider."""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = GmailServiceProvider()
+        return _provider
+
+
+def get_gmail_service():
+    """Return a Gmail service built from cached credentials and discovery document."""
+    return get_service_provider().service()
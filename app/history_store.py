@@ -0,0 +1,192 @@
+"""
+Queryable follow-up history: every report row, in one indexed SQLite table.
+
+ReportSink writes here alongside the daily report files. Existing reports
+(CSV, JSONL or Parquet) can be loaded once with:
+
+    python -m app.history_store [followup_report_YYYY-MM-DD.csv ...]
+
+which imports every followup_report_* file in the working directory when no
+paths are given. Importing is idempotent.
+"""
+from __future__ import annotations
+
+import glob
+import os
+import re
+import sys
+import threading
+from email.utils import parseaddr
+from typing import Dict, Iterable, List
+
+from app.config import HISTORY_STORE_PATH
+from app.sqlite_store import SQLiteStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS followups (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    reported_on TEXT NOT NULL,
+    thread_id TEXT,
+    recipient TEXT NOT NULL,
+    recipient_domain TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    prev_message_at TEXT NOT NULL,
+    followup_number INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    UNIQUE (reported_on, recipient, subject, prev_message_at, status)
+);
+CREATE INDEX IF NOT EXISTS idx_followups_day ON followups (reported_on, status, recipient_domain, followup_number);
+CREATE INDEX IF NOT EXISTS idx_followups_domain ON followups (recipient_domain, reported_on);
+CREATE INDEX IF NOT EXISTS idx_followups_recipient ON followups (recipient, reported_on);
+CREATE INDEX IF NOT EXISTS idx_followups_thread ON followups (thread_id);
+CREATE INDEX IF NOT EXISTS idx_followups_status ON followups (status, followup_number, reported_on);
+"""
+
+COLUMNS = ('reported_on', 'thread_id', 'recipient', 'recipient_domain', 'subject', 'prev_message_at',
+           'followup_number', 'status')
+
+# SQL for each aggregate dimension (each leads an index)
+GROUP_BY = {
+    'day': 'reported_on',
+    'month': 'substr(reported_on, 1, 7)',
+    'domain': 'recipient_domain',
+    'recipient': 'recipient',
+    'status': 'status',
+    'followup_number': 'followup_number',
+}
+
+_REPORT_DATE = re.compile(r'followup_report_(\d{4}-\d{2}-\d{2})')
+
+
+def recipient_domain(recipient: str) -> str:
+    """Domain of the first address in a To header, lowercased ('' when there is none)."""
+    address = parseaddr((recipient or '').split(',')[0])[1]
+    return address.rpartition('@')[2].lower() if '@' in address else ''
+
+
+class HistoryStore(SQLiteStore):
+    """
+    SQLite table of follow-up report rows with a small query API.
+
+    Rows are unique on report day, recipient, subject, previous message time
+    and status, like the report files, so writing the same row twice (or
+    re-importing a CSV) is a no-op while the same outcome reported on
+    another day is kept. Every thread gets its own connection and the database
+    runs in WAL mode, so API reads never block on the scan writing.
+    """
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def record(self, entries: Iterable[Dict]) -> int:
+        """Insert history entries (dicts with COLUMNS; recipient_domain is derived); returns rows added."""
+        rows = [(
+            entry['reported_on'], entry.get('thread_id'), entry['recipient'] or '',
+            recipient_domain(entry['recipient']), entry['subject'] or '', entry['prev_message_at'] or '',
+            int(entry['followup_number']), entry['status'] or ''
+        ) for entry in entries]
+        with self._connection() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                f"INSERT OR IGNORE INTO followups ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                rows
+            )
+            return conn.total_changes - before
+
+    @staticmethod
+    def _where(start=None, end=None, recipient=None, domain=None, thread_id=None, status=None):
+        clauses, params = [], []
+        for clause, value in (('reported_on >= ?', start), ('reported_on <= ?', end),
+                              ('recipient = ?', recipient), ('recipient_domain = ?', domain and domain.lower()),
+                              ('thread_id = ?', thread_id), ('status = ?', status)):
+            if value is not None and value != '':
+                clauses.append(clause)
+                params.append(value)
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def query(self, limit: int = 50, before_id: int | None = None, **filters) -> Dict:
+        """
+        Page through entries, newest first.
+
+        filters are start/end (YYYY-MM-DD, inclusive), recipient, domain,
+        thread_id and status. Pass the returned next_before_id as before_id
+        for the next page; it is None on the last page.
+        """
+        where, params = self._where(**filters)
+        if before_id is not None:
+            where += (' AND ' if where else ' WHERE ') + 'id < ?'
+            params.append(before_id)
+        rows = self._connection().execute(
+            f'SELECT * FROM followups{where} ORDER BY id DESC LIMIT ?', params + [limit + 1]
+        ).fetchall()
+        items = [dict(row) for row in rows[:limit]]
+        return {'items': items, 'next_before_id': items[-1]['id'] if len(rows) > limit else None}
+
+    def aggregate(self, group_by: str = 'day', **filters) -> List[Dict]:
+        """Counts per group_by value (see GROUP_BY): total rows, and how many were sent, failed or pending."""
+        if group_by not in GROUP_BY:
+            raise ValueError(f"Unknown group_by: {group_by}")
+        where, params = self._where(**filters)
+        rows = self._connection().execute(
+            f"""
+            SELECT {GROUP_BY[group_by]} AS key, COUNT(*) AS total,
+                   SUM(status = 'success') AS sent, SUM(status = 'fail') AS failed, SUM(status = '') AS pending
+            FROM followups{where} GROUP BY key ORDER BY key
+            """,
+            params
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def __len__(self) -> int:
+        return self._connection().execute('SELECT COUNT(*) FROM followups').fetchone()[0]
+
+
+def import_reports(store: HistoryStore, paths: Iterable[str]) -> int:
+    """
+    Load followup_report_* files (any REPORT_FORMATS) into the store; returns
+    the number of new rows. Raises ValueError for a file that is not a report.
+    """
+    from app.report_service import read_report_rows
+
+    added = 0
+    for path in paths:
+        match = _REPORT_DATE.search(os.path.basename(path))
+        entries = [{
+            # Rows carry the previous message's day; the file name is the day it was reported
+            'reported_on': match.group(1) if match else row[0],
+            'recipient': row[1],
+            'subject': row[2],
+            'prev_message_at': row[3],
+            'followup_number': row[5] or 0,
+            'status': row[6],
+        } for row in read_report_rows(path) if len(row) >= 7]
+        added += store.record(entries)
+    return added
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_history_store() -> HistoryStore | None:
+    """Return the process-wide history store, or None when HISTORY_STORE_PATH is empty."""
+    global _store
+    if not HISTORY_STORE_PATH:
+        return None
+    with _store_lock:
+        if _store is None or _store.path != HISTORY_STORE_PATH:
+            _store = HistoryStore(HISTORY_STORE_PATH)
+        return _store
+
+
+if __name__ == '__main__':
+    history = get_history_store()
+    if history is None:
+        sys.exit('HISTORY_STORE_PATH is empty; nothing to import into.')
+    report_paths = sys.argv[1:] or sorted(
+        path for ext in ('csv', 'jsonl', 'parquet') for path in glob.glob(f'followup_report_*.{ext}')
+    )
+    print(f"Imported {import_reports(history, report_paths)} rows from {len(report_paths)} reports "
+          f"into {history.path}")
@@ -0,0 +1,121 @@
+"""
+Local pre-classification of follow-up candidates, in front of AIService.
+
+Threads a rule can decide (too many follow-ups already, the recipient
+replied, a subject that is clearly not about a job, or a clearly job-related
+thread that is past its follow-up timing) get an analysis built locally in
+the same shape as parse_urgency_analysis; only the rest are sent to the
+model.
+"""
+from __future__ import annotations
+
+import re
+from typing import Dict, Iterable, List, Tuple
+
+from app.config import MAX_FOLLOW_UPS
+from app.thread_groups import decode_text
+
+# Checked in order; the first context whose pattern matches the subject names the thread
+JOB_PATTERNS = (
+    ('interview', re.compile(r'\binterview\w*|\bphone screen|\bonsite\b|\btechnical (?:round|assessment)', re.I)),
+    ('job_application', re.compile(
+        r'\binterest in\b|\bappl(?:y|ied|ication)\b|\bposition\b|\brole\b|\bopening\b|\bjob\b|\bresume\b'
+        r'|\bcandidacy\b|\brecruit\w*|\bhiring\b', re.I)),
+    ('networking', re.compile(r'\bcoffee chat\b|\bintroduction\b|\breferral\b|\bnetworking\b|\bconnect\w*', re.I)),
+)
+NON_JOB_PATTERN = re.compile(
+    r'\bunsubscribe\b|\bnewsletter\b|\binvoice\b|\breceipt\b|\border\s*#|\byour order\b|\bpassword\b'
+    r'|\bverification code\b|\bsubscription\b|\bpayment\b|\bshipping\b|\bdelivery\b|\bwebinar\b|\bpromo\w*'
+    r'|\bdiscount\b|\brsvp\b|\bbirthday\b|\bwedding\b', re.I)
+DEFINITIVE_RESPONSE_PATTERN = re.compile(
+    r'\bunfortunately\b|\bnot (?:be )?moving forward\b|\bposition (?:has been|was) filled\b'
+    r'|\bother candidates\b|\bdo not (?:follow up|contact)\b', re.I)
+
+# Days after which a follow-up is due for each context (see the timing rules in URGENCY_PROMPT),
+# and after which it is overdue
+FOLLOWUP_TIMING = {'interview': (3, 5), 'job_application': (7, 10), 'networking': (14, 21)}
+
+# Score thresholds: at or below NOT_JOB_SCORE is not a job thread, at or above JOB_SCORE clearly is
+NOT_JOB_SCORE = -3
+JOB_SCORE = 3
+
+
+def _decision(needs_followup: bool, reason: str, urgency: str = 'low', context: str = 'other') -> Dict:
+    return {'needs_followup': needs_followup, 'reason': reason, 'urgency': urgency, 'context': context,
+            'original_role': ''}
+
+
+def score_thread(thread: Dict) -> Tuple[int, str]:
+    """Keyword score of a thread (positive: about a job) and its likely context."""
+    subject = decode_text(thread.get('subject'))
+    snippet = decode_text(thread.get('snippet'))
+    score, context = 0, 'other'
+    for name, pattern in JOB_PATTERNS:
+        if pattern.search(subject):
+            score += 3
+            if context == 'other':
+                context = name
+        elif pattern.search(snippet):
+            score += 1
+            if context == 'other':
+                context = name
+    if NON_JOB_PATTERN.search(subject):
+        score -= 4
+    if NON_JOB_PATTERN.search(snippet):
+        score -= 1
+    return score, context
+
+
+def preclassify(thread: Dict) -> Dict | None:
+    """
+    Decide a candidate thread locally, or return None when the model should.
+
+    thread is a scan candidate or summary: subject, snippet, followup_count,
+    days_since_last (or days_since_sent), and optionally all_from_user /
+    has_reply.
+    """
+    if thread.get('followup_count', 0) >= MAX_FOLLOW_UPS:
+        return _decision(False, f"Already followed up {thread['followup_count']} times")
+    if thread.get('has_reply') or thread.get('all_from_user') is False:
+        return _decision(False, "The recipient has replied")
+    if DEFINITIVE_RESPONSE_PATTERN.search(decode_text(thread.get('snippet'))):
+        return _decision(False, "The thread already has a definitive response")
+
+    score, context = score_thread(thread)
+    if score <= NOT_JOB_SCORE:
+        return _decision(False, "Not job-related")
+    days = thread.get('days_since_sent', thread.get('days_since_last'))
+    if score >= JOB_SCORE and days is not None and context in FOLLOWUP_TIMING:
+        due, overdue = FOLLOWUP_TIMING[context]
+        if days >= due:
+            return _decision(True, f"No reply after {days} days", 'high' if days > overdue else 'medium', context)
+    return None
+
+
+def agreement(threads: Iterable[Dict], labels: Iterable[bool]) -> Dict:
+    """
+    Compare local decisions with labels (the model's needs_followup) on a
+    sample: how many threads the local stage decided (coverage) and how
+    often those decisions matched.
+    """
+    sample, decided, agreed = 0, 0, 0
+    disagreements: List[Dict] = []
+    for thread, label in zip(threads, labels):
+        sample += 1
+        decision = preclassify(thread)
+        if decision is None:
+            continue
+        decided += 1
+        if decision['needs_followup'] == bool(label):
+            agreed += 1
+        else:
+            disagreements.append({'thread_id': thread.get('thread_id'), 'subject': thread.get('subject'),
+                                  'local': decision['needs_followup'], 'label': bool(label)})
+    return {
+        'sample': sample,
+        'decided': decided,
+        'agreed': agreed,
+        'coverage': decided / sample if sample else 0.0,
+        'agreement': agreed / decided if decided else None,
+        'disagreements': disagreements,
+    }
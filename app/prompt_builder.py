@@ -0,0 +1,165 @@
+"""
+Token-budgeted prompt inputs for AIService.
+
+Thread text is reduced before it is pasted into a prompt: quoted replies,
+reply headers and signatures are stripped, paragraphs repeated across
+messages are kept once, and whole messages are dropped (oldest first, the
+thread's first message last) until what is left fits the token budget.
+Tokens are counted locally with tiktoken when it is installed, otherwise
+estimated from the text's word pieces.
+"""
+from __future__ import annotations
+
+import math
+import re
+from typing import Dict, List, NamedTuple
+
+from app.config import AI_PROMPT_TOKEN_BUDGET
+
+TIKTOKEN_ENCODING = 'o200k_base'
+
+_REPLY_HEADER = re.compile(r'^\s*On\b.*\bwrote:\s*$', re.IGNORECASE)
+_QUOTE_CUTOFFS = re.compile(
+    r'^\s*(-{2,}\s*Original Message\s*-{2,}|_{10,}|Begin forwarded message:)\s*$', re.IGNORECASE
+)
+_SIGNATURE_DELIMITER = re.compile(r'^--\s?$')
+_MOBILE_SIGNATURE = re.compile(r'^\s*Sent from my \w+', re.IGNORECASE)
+_WORD_PIECES = re.compile(r'\w+|[^\w\s]')
+# Paragraphs shorter than this ("Thanks,", "Best regards,") may repeat legitimately
+_MIN_DEDUP_CHARS = 40
+
+_encoding = None
+
+
+class BuiltContent(NamedTuple):
+    text: str
+    tokens: int
+    original_tokens: int
+    messages_kept: int
+    messages_total: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.original_tokens - self.tokens
+
+
+def _tiktoken_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(TIKTOKEN_ENCODING)
+        except Exception:
+            # Not installed, or the encoding cannot be downloaded: estimate instead
+            _encoding = False
+    return _encoding or None
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in text: exact with tiktoken, otherwise about one per punctuation mark or four word characters."""
+    if not text:
+        return 0
+    encoding = _tiktoken_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return sum(math.ceil(len(piece) / 4) for piece in _WORD_PIECES.findall(text))
+
+
+def truncate_tokens(text: str, budget: int) -> str:
+    """Longest prefix of text, cut at a word boundary, that fits in budget tokens."""
+    if count_tokens(text) <= budget:
+        return text
+    words = text.split(' ')
+    low, high = 0, len(words)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(' '.join(words[:mid]) + ' …') <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    return (' '.join(words[:low]) + ' …') if low else ''
+
+
+def strip_quoted(text: str) -> str:
+    """Drop quoted lines, everything from a reply header or signature onwards, and mobile signatures."""
+    lines = (text or '').replace('\r\n', '\n').split('\n')
+    kept: List[str] = []
+    for i, line in enumerate(lines):
+        # Gmail wraps long "On <date>, <name> wrote:" headers over two lines
+        two_lines = line + ' ' + lines[i + 1] if i + 1 < len(lines) else line
+        if (_REPLY_HEADER.match(line) or (line.strip().startswith('On ') and _REPLY_HEADER.match(two_lines))
+                or _QUOTE_CUTOFFS.match(line) or _SIGNATURE_DELIMITER.match(line)):
+            break
+        if line.lstrip().startswith('>') or _MOBILE_SIGNATURE.match(line):
+            continue
+        kept.append(line.rstrip())
+    return re.sub(r'\n{3,}', '\n\n', '\n'.join(kept)).strip()
+
+
+def _message_text(message) -> str:
+    if isinstance(message, dict):
+        header = ' '.join(str(message[field]) for field in ('from', 'date') if message.get(field))
+        body = message.get('body') or message.get('snippet') or ''
+        return f"[{header}]\n{body}" if header else body
+    return str(message or '')
+
+
+def _dedupe_paragraphs(messages: List[str]) -> List[str]:
+    """Keep each long paragraph only in the newest message it appears in."""
+    seen = set()
+    result = [''] * len(messages)
+    for index in range(len(messages) - 1, -1, -1):
+        paragraphs = []
+        for paragraph in messages[index].split('\n\n'):
+            key = ' '.join(paragraph.split()).casefold()
+            if len(key) >= _MIN_DEDUP_CHARS:
+                if key in seen:
+                    continue
+                seen.add(key)
+            paragraphs.append(paragraph)
+        result[index] = '\n\n'.join(paragraphs).strip()
+    return result
+
+
+def build_thread_content(thread_content, budget: int | None = None) -> BuiltContent:
+    """
+    Reduce thread text (a string, or a list of messages oldest first, each a
+    string or a dict with body/snippet and optional from/date) to fit budget
+    tokens (AI_PROMPT_TOKEN_BUDGET by default).
+
+    The newest message is kept first, then the thread's first message (which
+    usually names the role), then the others newest to oldest while they
+    fit; dropped messages are replaced by a marker. When the newest message
+    alone is over budget it is truncated.
+    """
+    budget = AI_PROMPT_TOKEN_BUDGET if budget is None else budget
+    raw = [_message_text(m) for m in thread_content] if isinstance(thread_content, (list, tuple)) \
+        else [str(thread_content or '')]
+    original_tokens = count_tokens('\n\n'.join(raw))
+    messages = _dedupe_paragraphs([strip_quoted(text) for text in raw])
+    indexes = [i for i, text in enumerate(messages) if text]
+
+    order = indexes[-1:] + indexes[:1] + indexes[-2:0:-1]
+    keep: Dict[int, str] = {}
+    used = 0
+    for index in dict.fromkeys(order):
+        tokens = count_tokens(messages[index])
+        if used + tokens <= budget:
+            keep[index] = messages[index]
+            used += tokens
+        elif not keep:
+            keep[index] = truncate_tokens(messages[index], budget)
+            break
+
+    parts: List[str] = []
+    omitted = 0
+    for index in indexes:
+        if index in keep:
+            if omitted:
+                parts.append(f"[{omitted} earlier message{'s' if omitted > 1 else ''} omitted]")
+                omitted = 0
+            parts.append(keep[index])
+        else:
+            omitted += 1
+    text = '\n\n'.join(parts)
+    return BuiltContent(text, count_tokens(text), original_tokens, len(keep), len(raw))
@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import asyncio
+import email.utils
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Dict
+
+from app.config import (
+    GMAIL_BACKOFF_BASE_SECONDS, GMAIL_BACKOFF_MAX_SECONDS, GMAIL_MAX_RETRIES, GMAIL_QUOTA_UNITS_PER_SECOND
+)
+
+# Quota units charged per Gmail API method
+# (https://developers.google.com/gmail/api/reference/quota)
+QUOTA_UNITS = {
+    'users.getProfile': 1,
+    'users.history.list': 2,
+    'users.messages.get': 5,
+    'users.messages.list': 5,
+    'users.messages.send': 100,
+    'users.threads.get': 10,
+    'users.threads.list': 10,
+}
+DEFAULT_QUOTA_UNITS = 5
+
+RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+TRANSIENT_STATUS_CODES = {500, 502, 503, 504}
+# Methods that must not run twice. A 5xx may arrive after Gmail already acted on
+# the request, so only clear rejections (rate limits) are retried for these.
+NON_IDEMPOTENT_METHODS = {'users.messages.send'}
+
+
+def quota_units(method: str | None) -> int:
+    """Quota cost of a method ID such as 'gmail.users.threads.get'."""
+    if not isinstance(method, str):
+        return DEFAULT_QUOTA_UNITS
+    return QUOTA_UNITS.get(method.removeprefix('gmail.'), DEFAULT_QUOTA_UNITS)
+
+
+def _status(exception: Exception) -> int | None:
+    resp = getattr(exception, 'resp', None)  # googleapiclient HttpError
+    if resp is None:
+        resp = getattr(exception, 'response', None)  # httpx.HTTPStatusError
+    status = getattr(resp, 'status', None) or getattr(resp, 'status_code', None)
+    try:
+        return int(status)
+    except (TypeError, ValueError):
+        return None
+
+
+def is_rate_limited(exception: Exception) -> bool:
+    status = _status(exception)
+    if status == 429:
+        return True
+    if status == 403:
+        content = getattr(exception, 'content', b'') or b''
+        text = content.decode('utf-8', errors='ignore') if isinstance(content, bytes) else str(content)
+        return any(reason in text for reason in RATE_LIMIT_REASONS)
+    return False
+
+
+def is_idempotent(method: str | None) -> bool:
+    return not isinstance(method, str) or method.removeprefix('gmail.') not in NON_IDEMPOTENT_METHODS
+
+
+def is_retryable(exception: Exception, method: str | None = None) -> bool:
+    """Whether a failed call to method can safely be repeated."""
+    if is_rate_limited(exception):
+        return True
+    return is_idempotent(method) and _status(exception) in TRANSIENT_STATUS_CODES
+
+
+def retry_after_seconds(exception: Exception) -> float | None:
+    """Parse a Retry-After header (delta-seconds or HTTP date) from a failed response."""
+    resp = getattr(exception, 'resp', None) or getattr(exception, 'response', None)
+    headers = getattr(resp, 'headers', resp)
+    try:
+        value = headers.get('retry-after') or headers.get('Retry-After')
+    except AttributeError:
+        return None
+    if not isinstance(value, str):
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at `rate` tokens per second.
+
+    acquire reserves tokens immediately, letting the balance go negative, and
+    returns how long the caller must wait, so concurrent callers are queued in
+    arrival order instead of racing for the refill.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, tokens: float) -> float:
+        """Take tokens and return the seconds to wait before using them."""
+        with self._lock:
+            self._refill()
+            self._tokens -= tokens
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self, tokens: float) -> float:
+        wait = self.reserve(tokens)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens: float) -> float:
+        wait = self.reserve(tokens)
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+    def set_rate(self, rate: float) -> None:
+        with self._lock:
+            self._refill()
+            self.rate = rate
+
+
+class GmailScheduler:
+    """
+    Central gate for Gmail API calls: quota budgeting, adaptive backoff and retries.
+
+    Every call reserves its method's quota units from a token bucket sized to
+    the per-user limit. Rate-limit responses (429, 403 rateLimitExceeded)
+    halve the bucket's rate and each success wins back a small step, so the
+    scheduler settles just under the limit Gmail actually enforces. Retries
+    wait for Retry-After when given, otherwise exponential backoff with full
+    jitter.
+    """
+
+    def __init__(self, units_per_second: float | None = None, max_retries: int | None = None,
+                 backoff_base: float | None = None, backoff_max: float | None = None):
+        self.max_rate = units_per_second or GMAIL_QUOTA_UNITS_PER_SECOND
+        self.min_rate = self.max_rate / 20
+        self.max_retries = GMAIL_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_base = GMAIL_BACKOFF_BASE_SECONDS if backoff_base is None else backoff_base
+        self.backoff_max = GMAIL_BACKOFF_MAX_SECONDS if backoff_max is None else backoff_max
+        self.bucket = TokenBucket(self.max_rate)
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._stats = {'calls': 0, 'units': 0, 'throttled': 0, 'retries': 0, 'failures': 0, 'waited_seconds': 0.0}
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given retry attempt (0-based)."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def record_throttle(self) -> None:
+        """Multiplicative decrease after a rate-limit response."""
+        with self._lock:
+            self._stats['throttled'] += 1
+            self.bucket.set_rate(max(self.min_rate, self.bucket.rate / 2))
+
+    def _record_success(self, units: int) -> None:
+        with self._lock:
+            self._stats['calls'] += 1
+            self._stats['units'] += units
+            if self.bucket.rate < self.max_rate:
+                self.bucket.set_rate(min(self.max_rate, self.bucket.rate + self.max_rate / 50))
+
+    def _retry_delay(self, exception: Exception, attempt: int, method: str | None = None) -> float | None:
+        """Return the wait before retrying, or None when the error should propagate."""
+        if not is_retryable(exception, method) or attempt >= self.max_retries:
+            with self._lock:
+                self._stats['failures'] += 1
+            return None
+        if is_rate_limited(exception):
+            self.record_throttle()
+        with self._lock:
+            self._stats['retries'] += 1
+        delay = retry_after_seconds(exception)
+        return self.backoff_delay(attempt) if delay is None else delay
+
+    def acquire(self, units: int) -> None:
+        waited = self.bucket.acquire(units)
+        if waited:
+            with self._lock:
+                self._stats['waited_seconds'] += waited
+
+    def execute(self, request, units: int | None = None, **kwargs):
+        """
+        Execute a googleapiclient request under the quota budget, retrying transient failures.
+
+        Non-idempotent methods (NON_IDEMPOTENT_METHODS) are retried only after
+        a rate-limit rejection; a 5xx leaves their outcome unknown and propagates.
+        """
+        method = getattr(request, 'methodId', None)
+        units = units or quota_units(method)
+        attempt = 0
+        while True:
+            self.acquire(units)
+            try:
+                result = request.execute(**kwargs)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, method)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self._record_success(units)
+            return result
+
+    async def execute_async(self, call: Callable[[], Awaitable], method: str | None = None):
+        """Async counterpart of execute; call is invoked once per attempt."""
+        units = quota_units(method)
+        attempt = 0
+        while True:
+            waited = await self.bucket.acquire_async(units)
+            if waited:
+                with self._lock:
+                    self._stats['waited_seconds'] += waited
+            try:
+                result = await call()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, method)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self._record_success(units)
+            return result
+
+    def stats(self) -> Dict:
+        """Counters plus achieved throughput in calls and quota units per second."""
+        with self._lock:
+            stats = dict(self._stats)
+            elapsed = max(time.monotonic() - self._started, 1e-9)
+            stats['current_rate'] = self.bucket.rate
+            stats['calls_per_second'] = stats['calls'] / elapsed
+            stats['units_per_second'] = stats['units'] / elapsed
+        return stats
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_gmail_scheduler() -> GmailScheduler:
+    """Return the process-wide scheduler; Gmail's quota is per user, not per thread."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = GmailScheduler()
+        return _scheduler
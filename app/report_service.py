@@ -1,50 +1,259 @@
 import csv
-from typing import List, Dict
+import datetime
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Iterable, List, Set
 from app.config import *
+from app.history_store import get_history_store
 
-def generate_followup_report(threads_to_follow_up: List[Dict], report_path: str = None):
+REPORT_COLUMNS = ["Day", "Sent To", "Subject", "Prev Message sent on", "Follow up text", "Number of follow up",
+                  "Status"]
+REPORT_FORMATS = ('csv', 'jsonl', 'parquet')
+_DEFAULT = object()
+
+
+def report_row(thread: Dict) -> List:
+    """Map a thread (scan result or send result) to a report row in REPORT_COLUMNS order."""
+    # Determine follow-up text and count
+    followup_count = thread.get('followup_count', 0)
+    template_idx = min(followup_count, len(FOLLOWUP_TEMPLATES)-1)
+    followup_text = FOLLOWUP_TEMPLATES[template_idx]
+    # Determine status: 'fail' for dry run, 'success' for sent, 'fail' for failed
+    status = thread.get('status') or ''
+    if status == 'dry_run' or status == 'failed':
+        status_str = 'fail'
+    elif status == 'sent':
+        status_str = 'success'
+    else:
+        status_str = status
+    return [
+        (thread.get('date') or '').split(' ')[0],  # YYYY-MM-DD
+        thread.get('to', ''),
+        thread.get('subject', ''),
+        thread.get('date', ''),
+        followup_text,
+        (followup_count + 1),
+        status_str
+    ]
+
+
+def _row_key(row: List) -> bytes:
+    """Dedup key of a row: recipient, subject, previous message time and status, hashed to 8 bytes."""
+    fields = (row[1], row[2], row[3], row[6])
+    return hashlib.blake2b('\x1f'.join(str(f) for f in fields).encode('utf-8'), digest_size=8).digest()
+
+
+class _CsvWriter:
+    def __init__(self, path: str):
+        new = not os.path.isfile(path) or os.path.getsize(path) == 0
+        self.file = open(path, mode='a', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        if new:
+            self.writer.writerow(REPORT_COLUMNS)
+            self.file.flush()
+
+    @staticmethod
+    def existing_rows(path: str) -> Iterable[List]:
+        with open(path, newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            yield from (row for row in reader if len(row) == len(REPORT_COLUMNS))
+
+    def write(self, rows: List[List]) -> None:
+        self.writer.writerows(rows)
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class _JsonlWriter:
+    def __init__(self, path: str):
+        self.file = open(path, mode='a', encoding='utf-8')
+
+    @staticmethod
+    def existing_rows(path: str) -> Iterable[List]:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    yield [record.get(column, '') for column in REPORT_COLUMNS]
+
+    def write(self, rows: List[List]) -> None:
+        for row in rows:
+            self.file.write(json.dumps(dict(zip(REPORT_COLUMNS, row))) + "\n")
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class _ParquetWriter:
+    """
+    Parquet output; each flush becomes one row group. Parquet files cannot be
+    appended to, so a run that finds the day's file already present writes
+    the next free '<name>.<n>.parquet' part next to it. The part is created
+    on the first write, so a sink that writes no rows leaves no file.
+    """
+
+    def __init__(self, path: str):
+        pa, self.pq = self._pyarrow()
+        self.pa = pa
+        self.path = path
+        self.schema = pa.schema([(column, pa.int64() if column == "Number of follow up" else pa.string())
+                                 for column in REPORT_COLUMNS])
+        self.writer = None
+
+    @staticmethod
+    def _pyarrow():
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise RuntimeError("REPORT_FORMAT=parquet requires pyarrow (pip install pyarrow)") from e
+        return pyarrow, pyarrow.parquet
+
+    @staticmethod
+    def part_path(path: str, part: int) -> str:
+        root, ext = os.path.splitext(path)
+        return path if part == 0 else f"{root}.{part}{ext}"
+
+    @classmethod
+    def existing_rows(cls, path: str) -> Iterable[List]:
+        _, pq = cls._pyarrow()
+        part = 0
+        while os.path.exists(cls.part_path(path, part)):
+            table = pq.read_table(cls.part_path(path, part))
+            yield from (list(record.values()) for record in table.to_pylist())
+            part += 1
+
+    def write(self, rows: List[List]) -> None:
+        if self.writer is None:
+            part = 0
+            while os.path.exists(self.part_path(self.path, part)):
+                part += 1
+            self.writer = self.pq.ParquetWriter(self.part_path(self.path, part), self.schema)
+        columns = list(zip(*rows))
+        self.writer.write_table(self.pa.Table.from_arrays(
+            [self.pa.array(values, type=field.type) for values, field in zip(columns, self.schema)],
+            schema=self.schema))
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+
+
+_WRITERS = {'csv': _CsvWriter, 'jsonl': _JsonlWriter, 'parquet': _ParquetWriter}
+
+
+def read_report_rows(path: str) -> Iterable[List]:
+    """
+    Rows of one report file in REPORT_COLUMNS order, its format taken from
+    the extension; a Parquet part file is read on its own. Raises ValueError
+    for any other file.
+    """
+    report_format = os.path.splitext(path)[1].lstrip('.').lower()
+    if report_format not in REPORT_FORMATS:
+        raise ValueError(f"Not a follow-up report ({', '.join(REPORT_FORMATS)}): {path}")
+    if report_format == 'parquet':
+        _, pq = _ParquetWriter._pyarrow()
+        return (list(record.values()) for record in pq.read_table(path).to_pylist())
+    return _WRITERS[report_format].existing_rows(path)
+
+
+class ReportSink:
+    """
+    Streaming follow-up report writer.
+
+    Rows are written as threads are passed to write, buffered at most
+    flush_rows rows or flush_seconds seconds, so memory stays bounded however
+    long the scan. A row is skipped when the report already holds one with
+    the same recipient, subject, previous message time and status, whether
+    it came from an earlier scan or send today or earlier in this run; keys
+    of rows already in the file are loaded on open. Each flush also records
+    the rows in the history store (history_store.get_history_store unless
+    another store, or None, is given).
+    """
+
+    def __init__(self, report_path: str = None, report_format: str = None, flush_rows: int = None,
+                 flush_seconds: float = None, history=_DEFAULT):
+        self.format = (report_format or REPORT_FORMAT).lower()
+        if self.format not in REPORT_FORMATS:
+            raise ValueError(f"Unknown report format: {self.format}")
+        curr_date = datetime.datetime.now().strftime('%Y-%m-%d')
+        self.reported_on = curr_date
+        if report_path is None:
+            report_path = f"followup_report_{curr_date}.{self.format}"
+        self.path = report_path
+        self.flush_rows = flush_rows or REPORT_FLUSH_ROWS
+        self.flush_seconds = REPORT_FLUSH_SECONDS if flush_seconds is None else flush_seconds
+        self.rows_written = 0
+        self.history = get_history_store() if history is _DEFAULT else history
+        self._buffer: List[List] = []
+        self._thread_ids: List = []
+        self._last_flush = time.monotonic()
+
+        writer_cls = _WRITERS[self.format]
+        self._seen: Set[bytes] = set()
+        if os.path.exists(self.path):
+            self._seen.update(_row_key(row) for row in writer_cls.existing_rows(self.path))
+        self._writer = writer_cls(self.path)
+
+    def write(self, thread: Dict) -> bool:
+        """Queue a thread's row; returns False when the report already has it."""
+        row = report_row(thread)
+        key = _row_key(row)
+        if key in self._seen:
+            return False
+        self._seen.add(key)
+        self._buffer.append(row)
+        self._thread_ids.append(thread.get('thread_id'))
+        if len(self._buffer) >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+        return True
+
+    def flush(self) -> None:
+        if self._buffer:
+            self._writer.write(self._buffer)
+            if self.history is not None:
+                self.history.record({
+                    'reported_on': self.reported_on, 'thread_id': thread_id, 'recipient': row[1],
+                    'subject': row[2], 'prev_message_at': row[3], 'followup_number': row[5], 'status': row[6]
+                } for row, thread_id in zip(self._buffer, self._thread_ids))
+            self.rows_written += len(self._buffer)
+            self._buffer = []
+            self._thread_ids = []
+        self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self.flush()
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_followup_report(report_path: str = None, report_format: str = None) -> ReportSink:
+    """Open today's follow-up report (REPORT_FORMAT, default CSV) for streaming writes."""
+    return ReportSink(report_path, report_format)
+
+
+def generate_followup_report(threads_to_follow_up: Iterable[Dict], report_path: str = None,
+                             report_format: str = None):
     """
     Generate a day-wise CSV report of processed emails.
     Columns: Sent To, Subject, Prev Message sent on, Follow up text, Number of follow up
+
+    Rows go through a ReportSink, so threads may be any iterable and rows
+    already in today's report are not written again.
     """
-    # Group by date
-    day_groups = {}
-    for thread in threads_to_follow_up:
-        day = thread['date'].split(' ')[0]  # YYYY-MM-DD
-        if day not in day_groups:
-            day_groups[day] = []
-        day_groups[day].append(thread)
-    import datetime
-    curr_date = datetime.datetime.now().strftime('%Y-%m-%d')
-    if report_path is None:
-        report_path = f"followup_report_{curr_date}.csv"
-
-    import os
-    file_exists = os.path.isfile(report_path)
-    with open(report_path, mode='a', newline='', encoding='utf-8') as csvfile:
-        writer = csv.writer(csvfile)
-        if not file_exists:
-            writer.writerow(["Day", "Sent To", "Subject", "Prev Message sent on", "Follow up text", "Number of follow up", "Status"])
-        for day, threads in sorted(day_groups.items()):
-            for thread in threads:
-                # Determine follow-up text and count
-                followup_count = thread.get('followup_count', 0)
-                template_idx = min(followup_count, len(FOLLOWUP_TEMPLATES)-1)
-                followup_text = FOLLOWUP_TEMPLATES[template_idx]
-                # Determine status: 'fail' for dry run, 'success' for sent, 'fail' for failed
-                status = thread.get('status', '')
-                if status == 'dry_run' or status == 'failed':
-                    status_str = 'fail'
-                elif status == 'sent':
-                    status_str = 'success'
-                else:
-                    status_str = status
-                writer.writerow([
-                    day,
-                    thread.get('to', ''),
-                    thread.get('subject', ''),
-                    thread.get('date', ''),
-                    followup_text,
-                    (followup_count + 1),
-                    status_str
-                ])
+    with open_followup_report(report_path, report_format) as report:
+        for thread in threads_to_follow_up:
+            report.write(thread)
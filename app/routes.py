@@ -1,8 +1,16 @@
 from flask import render_template_string, request, jsonify, Response
 from app import app
-from app.gmail_service import get_gmail_service
-from app.email_service import get_threads_to_follow_up, get_threads_to_follow_up_generator, send_followup_email
+from app.gmail_service import get_service_provider
+from app.email_service import (
+    get_threads_to_follow_up, get_threads_to_follow_up_generator, send_followup_email, send_followups_bulk
+)
 from app.blacklist_service import add_subject_to_blacklist
+from app.history_store import GROUP_BY, get_history_store
+from app.scan_cache import get_scan_cache
+from app.send_queue import get_send_queue
+from app.ai_service import get_ai_service, recipient_name_for, thread_content_for
+from app.sse import SSE_HEADERS, ThreadStreamFrames, gzip_stream, sse_comment, sse_event
+from app.config import STREAM_COALESCE_MS, STREAM_GZIP, STREAM_HEARTBEAT_SECONDS, STREAM_RETRY_MS
 from itertools import groupby
 import json
 
@@ -51,24 +59,21 @@ TEMPLATE = """
             0% { transform: rotate(0deg); }
             100% { transform: rotate(360deg); }
         }
+        #groups-container {
+            position: relative;
+        }
+        /* Groups and rows are absolutely positioned at computed offsets (virtualized list) */
         .group-section {
+            position: absolute;
+            left: 0;
+            right: 0;
+            display: flex;
+            flex-direction: column;
             background-color: white;
             border: 1px solid #dadce0;
             border-radius: 8px;
-            margin-bottom: 20px;
             overflow: hidden;
             box-shadow: 0 1px 2px rgba(60,64,67,.1);
-            animation: slideIn 0.3s ease-out;
-        }
-        @keyframes slideIn {
-            from {
-                opacity: 0;
-                transform: translateY(10px);
-            }
-            to {
-                opacity: 1;
-                transform: translateY(0);
-            }
         }
         .group-header {
             background-color: #f8f9fa;
@@ -77,6 +82,7 @@ TEMPLATE = """
             display: flex;
             align-items: center;
             gap: 12px;
+            flex: 0 0 54px;
             cursor: pointer;
             user-select: none;
         }
@@ -102,23 +108,21 @@ TEMPLATE = """
             border-radius: 12px;
         }
         .emails-list {
-            max-height: 500px;
+            position: relative;
+            flex: 1 1 auto;
             overflow-y: auto;
         }
         .email-item {
+            position: absolute;
+            left: 0;
+            right: 0;
+            height: 100px;
+            overflow: hidden;
             padding: 12px 16px;
             border-bottom: 1px solid #f0f0f0;
             display: flex;
             gap: 12px;
             align-items: flex-start;
-            animation: fadeIn 0.2s ease-out;
-        }
-        @keyframes fadeIn {
-            from { opacity: 0; }
-            to { opacity: 1; }
-        }
-        .email-item:last-child {
-            border-bottom: none;
         }
         .email-item input[type="checkbox"] {
             width: 18px;
@@ -154,7 +158,9 @@ TEMPLATE = """
             background-color: #f8f9fa;
             border-top: 1px solid #dadce0;
             display: flex;
+            flex: 0 0 58px;
             gap: 8px;
+            align-items: center;
             justify-content: flex-end;
         }
         .btn {
@@ -210,162 +216,339 @@ TEMPLATE = """
             padding: 40px 20px;
             color: #5f6368;
         }
+        .draft-btn {
+            flex-shrink: 0;
+            padding: 4px 10px;
+            font-size: 12px;
+        }
+        #draft-panel {
+            display: none;
+            position: fixed;
+            right: 20px;
+            bottom: 20px;
+            width: 420px;
+            max-height: 60vh;
+            flex-direction: column;
+            background-color: white;
+            border: 1px solid #dadce0;
+            border-radius: 8px;
+            box-shadow: 0 4px 12px rgba(60,64,67,.2);
+            z-index: 10;
+        }
+        #draft-panel.active {
+            display: flex;
+        }
+        .draft-header {
+            display: flex;
+            align-items: center;
+            gap: 8px;
+            padding: 12px 16px;
+            border-bottom: 1px solid #dadce0;
+            font-weight: 500;
+        }
+        #draft-status {
+            flex: 1;
+            color: #5f6368;
+            font-size: 13px;
+        }
+        #draft-text {
+            padding: 12px 16px;
+            overflow-y: auto;
+            white-space: pre-wrap;
+            font-family: inherit;
+            font-size: 13px;
+            color: #3c4043;
+        }
     </style>
     <script>
-    const groupsMap = new Map(); // Track groups by subject
-    
-    // Decode HTML entities
-    function decodeHTMLEntities(text) {
-        const textarea = document.createElement('textarea');
-        textarea.innerHTML = text;
-        return textarea.value;
+    // Groups arrive already formed by the server (text decoded, counts
+    // included); only groups and rows near the viewport are built as DOM
+    // nodes, so page memory and render time stay flat as results grow.
+    const ROW_HEIGHT = 100;
+    const LIST_MAX_HEIGHT = 500;
+    const HEADER_HEIGHT = 54;
+    const ACTIONS_HEIGHT = 58;
+    const GROUP_GAP = 20;
+    const OVERSCAN_PX = 600;
+    const OVERSCAN_ROWS = 3;
+
+    let groups = []; // indexed by server group id; null once blacklisted
+    let renderQueued = false;
+
+    function groupHeight(group) {
+        return HEADER_HEIGHT + ACTIONS_HEIGHT + Math.min(group.emails.length * ROW_HEIGHT, LIST_MAX_HEIGHT) + 2;
     }
-    
-    function toggleGroupCheckboxes(groupIndex, mainCheckbox) {
-        const emailCheckboxes = document.querySelectorAll(`.group-${groupIndex} .email-checkbox`);
-        emailCheckboxes.forEach(cb => {
-            cb.checked = mainCheckbox.checked;
+
+    function scheduleRender() {
+        if (renderQueued) return;
+        renderQueued = true;
+        requestAnimationFrame(() => {
+            renderQueued = false;
+            renderGroups();
+        });
+    }
+
+    function renderGroups() {
+        const container = document.getElementById('groups-container');
+        const containerTop = container.getBoundingClientRect().top;
+        const viewTop = -containerTop - OVERSCAN_PX;
+        const viewBottom = window.innerHeight - containerTop + OVERSCAN_PX;
+        let top = 0;
+
+        groups.forEach(group => {
+            if (!group) return;
+            const height = groupHeight(group);
+            if (top < viewBottom && top + height > viewTop) {
+                if (!group.section) mountGroup(group, container);
+                group.section.style.top = `${top}px`;
+                group.section.style.height = `${height}px`;
+                renderGroupState(group);
+                renderRows(group);
+            } else if (group.section) {
+                group.section.remove();
+                group.section = null;
+                group.rows.clear();
+            }
+            top += height + GROUP_GAP;
+        });
+        container.style.height = top ? `${top}px` : '';
+    }
+
+    function mountGroup(group, container) {
+        const groupSection = document.createElement('div');
+        groupSection.className = 'group-section';
+
+        const header = document.createElement('div');
+        header.className = 'group-header';
+        header.onclick = () => toggleGroup(group, !group.checkbox.checked);
+
+        const checkbox = document.createElement('input');
+        checkbox.type = 'checkbox';
+        checkbox.className = 'group-checkbox';
+        checkbox.onclick = (e) => e.stopPropagation();
+        checkbox.onchange = (e) => toggleGroup(group, e.target.checked);
+
+        const title = document.createElement('span');
+        title.className = 'subject-title';
+        title.textContent = group.subject;
+
+        const count = document.createElement('span');
+        count.className = 'email-count';
+
+        header.appendChild(checkbox);
+        header.appendChild(title);
+        header.appendChild(count);
+
+        const emailsList = document.createElement('div');
+        emailsList.className = 'emails-list';
+        const spacer = document.createElement('div');
+        emailsList.appendChild(spacer);
+        emailsList.onscroll = () => renderRows(group);
+
+        const actions = document.createElement('div');
+        actions.className = 'group-actions';
+
+        const status = document.createElement('span');
+
+        const blacklistBtn = document.createElement('button');
+        blacklistBtn.className = 'btn btn-danger';
+        blacklistBtn.textContent = 'Blacklist Subject';
+        blacklistBtn.onclick = () => blacklistSubject(group, blacklistBtn);
+
+        const sendBtn = document.createElement('button');
+        sendBtn.className = 'btn btn-primary';
+        sendBtn.onclick = () => sendSelectedFollowUps(group);
+
+        actions.appendChild(status);
+        actions.appendChild(blacklistBtn);
+        actions.appendChild(sendBtn);
+
+        groupSection.appendChild(header);
+        groupSection.appendChild(emailsList);
+        groupSection.appendChild(actions);
+        container.appendChild(groupSection);
+
+        Object.assign(group, {
+            section: groupSection, checkbox, countEl: count, list: emailsList,
+            spacer, statusEl: status, sendBtn
         });
     }
 
-    function toggleGroupByClick(headerEl, groupIndex) {
-        const cb = headerEl.querySelector('input[type="checkbox"]');
-        if (!cb) return;
-        cb.checked = !cb.checked;
-        toggleGroupCheckboxes(groupIndex, cb);
+    function renderGroupState(group) {
+        if (!group.section) return;
+        group.countEl.textContent = `${group.count} email${group.count !== 1 ? 's' : ''}`;
+        group.checkbox.checked = group.emails.every(e => e.checked || e.sent);
+        group.sendBtn.disabled = group.sending;
+        group.sendBtn.textContent = group.progress || 'Send Follow-ups';
+        group.sendBtn.style.display = group.sendHidden ? 'none' : '';
+        group.statusEl.className = group.status
+            ? 'status-message ' + (group.status.error ? 'status-error' : 'status-success') : '';
+        group.statusEl.textContent = group.status ? group.status.text : '';
     }
 
-    function updateEmailCount(subject) {
-        const group = groupsMap.get(subject);
-        if (group) {
-            const count = group.emails.length;
-            const countEl = group.section.querySelector('.email-count');
-            if (countEl) {
-                countEl.textContent = `${count} email${count !== 1 ? 's' : ''}`;
+    function renderRows(group) {
+        if (!group.section) return;
+        group.spacer.style.height = `${group.emails.length * ROW_HEIGHT}px`;
+        const scrollTop = group.list.scrollTop;
+        const first = Math.max(0, Math.floor(scrollTop / ROW_HEIGHT) - OVERSCAN_ROWS);
+        const last = Math.min(group.emails.length,
+                              Math.ceil((scrollTop + LIST_MAX_HEIGHT) / ROW_HEIGHT) + OVERSCAN_ROWS);
+
+        for (const [index, row] of group.rows) {
+            if (index < first || index >= last) {
+                row.remove();
+                group.rows.delete(index);
             }
         }
+        for (let index = first; index < last; index++) {
+            const email = group.emails[index];
+            let row = group.rows.get(index);
+            if (!row) {
+                row = buildRow(group, email);
+                row.style.top = `${index * ROW_HEIGHT}px`;
+                group.list.appendChild(row);
+                group.rows.set(index, row);
+            }
+            row.checkbox.checked = email.checked;
+            row.checkbox.disabled = email.sent;
+            row.style.opacity = email.sent ? '0.5' : '';
+        }
     }
 
-    function addThreadToUI(thread) {
-        const subject = thread.subject;
-        let assignedIndex;
-        
-        // Create or get group
-        if (!groupsMap.has(subject)) {
-            assignedIndex = groupsMap.size; // assign next sequential index
-            const groupSection = document.createElement('div');
-            groupSection.className = 'group-section';
-            
-            const header = document.createElement('div');
-            header.className = 'group-header';
-            header.onclick = () => toggleGroupByClick(header, assignedIndex);
-            
-            const checkbox = document.createElement('input');
-            checkbox.type = 'checkbox';
-            checkbox.className = 'group-checkbox';
-            checkbox.checked = true;
-            checkbox.onclick = (e) => e.stopPropagation();
-            checkbox.onchange = (e) => toggleGroupCheckboxes(assignedIndex, e.target);
-            
-            const title = document.createElement('span');
-            title.className = 'subject-title';
-            title.textContent = decodeHTMLEntities(subject);
-            
-            const count = document.createElement('span');
-            count.className = 'email-count';
-            count.textContent = '0 emails';
-            
-            header.appendChild(checkbox);
-            header.appendChild(title);
-            header.appendChild(count);
-            
-            const emailsList = document.createElement('div');
-            emailsList.className = 'emails-list';
-            
-            const actions = document.createElement('div');
-            actions.className = 'group-actions';
-
-            const blacklistBtn = document.createElement('button');
-            blacklistBtn.className = 'btn btn-danger';
-            blacklistBtn.textContent = 'Blacklist Subject';
-            blacklistBtn.onclick = () => blacklistSubject(subject, blacklistBtn);
-
-            const sendBtn = document.createElement('button');
-            sendBtn.className = 'btn btn-primary';
-            sendBtn.textContent = 'Send Follow-ups';
-            sendBtn.onclick = () => sendSelectedFollowUps(assignedIndex, sendBtn);
-            
-            actions.appendChild(blacklistBtn);
-            actions.appendChild(sendBtn);
-            
-            groupSection.appendChild(header);
-            groupSection.appendChild(emailsList);
-            groupSection.appendChild(actions);
-            
-            document.getElementById('groups-container').appendChild(groupSection);
-            
-            groupsMap.set(subject, {
-                section: groupSection,
-                emails: [],
-                emailsList: emailsList,
-                groupIndex: assignedIndex
-            });
-        }
-        
-        const group = groupsMap.get(subject);
-        assignedIndex = group.groupIndex;
-        
-        // Add email to list
+    function buildRow(group, email) {
         const emailItem = document.createElement('div');
-        emailItem.className = `email-item group-${assignedIndex}`;
-        
+        emailItem.className = 'email-item';
+
         const cbEmail = document.createElement('input');
         cbEmail.type = 'checkbox';
         cbEmail.className = 'email-checkbox';
-        cbEmail.dataset.emailId = thread.id;
-        cbEmail.dataset.threadId = thread.thread_id;
-        cbEmail.dataset.to = thread.to;
-        cbEmail.dataset.subject = thread.subject;
-        cbEmail.checked = true;
-        
+        cbEmail.onchange = () => {
+            email.checked = cbEmail.checked;
+            renderGroupState(group);
+        };
+
         const details = document.createElement('div');
         details.className = 'email-details';
-        
+
         const toDiv = document.createElement('div');
         toDiv.className = 'email-to';
-        toDiv.textContent = decodeHTMLEntities(thread.to);
-        
+        toDiv.textContent = email.to;
+
         const dateDiv = document.createElement('div');
         dateDiv.className = 'email-date';
-        dateDiv.textContent = decodeHTMLEntities(thread.date);
-        
+        dateDiv.textContent = email.date;
+
         const daysDiv = document.createElement('div');
         daysDiv.className = 'email-date';
-        daysDiv.textContent = `${thread.days_since_last} days since follow-up`;
-        
+        daysDiv.textContent = `${email.days_since_last} days since follow-up`;
+
         details.appendChild(toDiv);
         details.appendChild(dateDiv);
         details.appendChild(daysDiv);
-        
-        if (thread.snippet) {
+
+        if (email.snippet) {
             const snippetDiv = document.createElement('div');
             snippetDiv.className = 'snippet-text';
-            snippetDiv.textContent = decodeHTMLEntities(thread.snippet);
+            snippetDiv.textContent = email.snippet;
             details.appendChild(snippetDiv);
         }
-        
+
+        const draftBtn = document.createElement('button');
+        draftBtn.className = 'btn btn-secondary draft-btn';
+        draftBtn.textContent = 'AI draft';
+        draftBtn.onclick = () => previewDraft(email);
+
         emailItem.appendChild(cbEmail);
         emailItem.appendChild(details);
-        group.emailsList.appendChild(emailItem);
-        group.emails.push(thread);
-        updateEmailCount(subject);
+        emailItem.appendChild(draftBtn);
+        emailItem.checkbox = cbEmail;
+        return emailItem;
+    }
+
+    // One draft preview at a time; closing its EventSource drops the
+    // connection, which stops generation on the server
+    let draftStream = null;
+
+    function closeDraft() {
+        if (draftStream) {
+            draftStream.close();
+            draftStream = null;
+        }
+        document.getElementById('draft-panel').classList.remove('active');
+    }
+
+    function previewDraft(email) {
+        closeDraft();
+        const text = document.getElementById('draft-text');
+        const status = document.getElementById('draft-status');
+        text.textContent = '';
+        status.textContent = `Drafting for ${email.to}...`;
+        document.getElementById('draft-panel').classList.add('active');
+
+        const params = new URLSearchParams({
+            thread_id: email.thread_id, subject: email.subject || '', to: email.to || '',
+            snippet: email.snippet || '', days: email.days_since_last || 0
+        });
+        const stream = new EventSource(`/api/ai-draft-stream?${params}`);
+        draftStream = stream;
+        const finish = (message) => {
+            stream.close();
+            if (draftStream === stream) {
+                draftStream = null;
+                status.textContent = message;
+            }
+        };
+        stream.onmessage = (event) => {
+            const data = JSON.parse(event.data);
+            if (data.type === 'token') {
+                text.textContent += data.text;
+            } else if (data.type === 'complete') {
+                finish('Draft ready');
+            } else if (data.type === 'error') {
+                finish(`✗ ${data.error}`);
+            }
+        };
+        // Never let EventSource reconnect: that would start (and bill) a new draft
+        stream.onerror = () => finish('✗ Draft unavailable');
+    }
+
+    function toggleGroup(group, checked) {
+        group.emails.forEach(e => {
+            if (!e.sent) e.checked = checked;
+        });
+        renderGroupState(group);
+        renderRows(group);
+    }
+
+    function addThreads(data) {
+        data.groups.forEach(g => {
+            groups[g.id] = {
+                id: g.id, subject: g.subject, count: 0, emails: [], rows: new Map(), section: null,
+                sending: false, progress: null, status: null, sendHidden: false
+            };
+        });
+        data.threads.forEach(thread => {
+            const group = groups[thread.group_id];
+            if (group) group.emails.push({...thread, checked: true, sent: false});
+        });
+        Object.entries(data.counts).forEach(([id, count]) => {
+            if (groups[id]) groups[id].count = count;
+        });
+        scheduleRender();
+    }
+
+    function clearGroups() {
+        groups = [];
+        const container = document.getElementById('groups-container');
+        container.innerHTML = '';
+        container.style.height = '';
     }
 
     function showEmptyStateIfNeeded() {
         const container = document.getElementById('groups-container');
         if (!container) return;
 
-        const hasGroups = container.querySelector('.group-section');
+        const hasGroups = groups.some(group => group);
         const existingEmptyState = container.querySelector('.empty-state');
 
         if (!hasGroups && !existingEmptyState) {
@@ -378,7 +561,8 @@ TEMPLATE = """
         }
     }
 
-    function blacklistSubject(subject, button) {
+    function blacklistSubject(group, button) {
+        const subject = group.subject;
         const confirmed = window.confirm(`Blacklist "${subject}" and hide this group from future loads?`);
         if (!confirmed) return;
 
@@ -397,11 +581,9 @@ TEMPLATE = """
                 throw new Error(result.error || 'Failed to save subject to blacklist.');
             }
 
-            const group = groupsMap.get(subject);
-            if (group) {
-                group.section.remove();
-                groupsMap.delete(subject);
-            }
+            if (group.section) group.section.remove();
+            groups[group.id] = null;
+            scheduleRender();
             showEmptyStateIfNeeded();
         })
         .catch(err => {
@@ -412,82 +594,96 @@ TEMPLATE = """
         });
     }
 
-    function sendSelectedFollowUps(groupIndex, button) {
-        const selectedEmails = Array.from(document.querySelectorAll(`.group-${groupIndex} .email-checkbox:checked`))
-            .map(cb => ({
-                email_id: cb.dataset.emailId,
-                thread_id: cb.dataset.threadId,
-                to: cb.dataset.to,
-                subject: cb.dataset.subject
-            }));
+    function sendSelectedFollowUps(group) {
+        const selectedEmails = group.emails.filter(e => e.checked && !e.sent);
 
         if (selectedEmails.length === 0) {
             alert('Please select at least one email');
             return;
         }
 
-        if (!button) button = document.activeElement; // fallback
-        button.disabled = true;
-        const originalText = button.textContent;
+        // Progress lives on the group so it survives the group scrolling out of view
+        group.sending = true;
+        group.status = null;
+        renderGroupState(group);
         let completed = 0;
         let failed = 0;
 
-        selectedEmails.forEach((email, index) => {
-            setTimeout(() => {
-                fetch('/send-followup', {
-                    method: 'POST',
-                    headers: {'Content-Type': 'application/json'},
-                    body: JSON.stringify(email)
-                })
-                .then(r => r.json())
-                .then(result => {
-                    if (result.success) {
-                        completed++;
-                        const checkbox = document.querySelector(
-                            `.email-checkbox[data-email-id="${email.email_id}"]`
-                        );
-                        if (checkbox) {
-                            checkbox.parentElement.style.opacity = '0.5';
-                            checkbox.disabled = true;
-                        }
-                    } else {
-                        failed++;
-                    }
-                    const progress = completed + failed;
-                    button.textContent = `${progress}/${selectedEmails.length}`;
-                    
-                    if (progress === selectedEmails.length) {
-                        button.disabled = false;
-                        button.textContent = originalText;
-                        const msg = document.createElement('span');
-                        msg.className = 'status-message ' + (failed === 0 ? 'status-success' : 'status-error');
-                        msg.textContent = failed === 0 ? ' ✓ Done' : ` ${failed} failed`;
-                        // append message next to the button, not inside it
-                        button.parentElement.appendChild(msg);
-                        // hide the button when complete
-                        button.style.display = 'none';
-                    }
-                })
-                .catch(err => {
-                    console.error('Send error', err);
-                    failed++;
-                    const progress = completed + failed;
-                    if (progress === selectedEmails.length) {
-                        button.disabled = false;
-                        const msg = document.createElement('span');
-                        msg.className = 'status-message status-error';
-                        msg.textContent = ` ✗ Error: ${failed} failed`;
-                        button.parentElement.appendChild(msg);
-                    }
-                });
-            }, index * 500);
+        function finish(errorText) {
+            group.sending = false;
+            group.progress = null;
+            group.status = {
+                text: errorText || (failed === 0 ? ' ✓ Done' : ` ${failed} failed`),
+                error: failed > 0 || Boolean(errorText)
+            };
+            // hide the button when complete
+            if (!errorText) group.sendHidden = true;
+            renderGroupState(group);
+        }
+
+        const finished = new Set();
+
+        function handleJob(job) {
+            if (finished.has(job.id) || !['sent', 'dry_run', 'failed'].includes(job.status)) return;
+            finished.add(job.id);
+            if (job.status === 'dry_run') {
+                // Dry run (DISABLE_SEND_FOLLOWUP): nothing went out, so the row stays selectable
+                completed++;
+            } else if (job.status === 'sent') {
+                completed++;
+                const email = selectedEmails.find(e => e.thread_id === job.thread_id);
+                if (email) email.sent = true;
+                renderRows(group);
+            } else {
+                failed++;
+            }
+            group.progress = `${completed + failed}/${selectedEmails.length}`;
+            renderGroupState(group);
+        }
+
+        // Jobs are queued server-side and keep sending even if this page is closed
+        fetch('/send-jobs', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({threads: selectedEmails.map(e => ({
+                thread_id: e.thread_id, to: e.to, subject: e.subject
+            }))})
+        })
+        .then(r => r.json())
+        .then(result => {
+            if (!result.success) throw new Error(result.error || 'Unable to queue follow-ups.');
+            group.progress = `0/${selectedEmails.length}`;
+            renderGroupState(group);
+            const events = new EventSource(`/send-jobs/${result.batch_id}/events`);
+            events.onmessage = (event) => {
+                const data = JSON.parse(event.data);
+                if (data.type === 'job') {
+                    handleJob(data.job);
+                } else if (data.type === 'complete' || data.type === 'error') {
+                    events.close();
+                    finish(data.type === 'error' ? ` ✗ ${data.error}` : undefined);
+                }
+            };
+        })
+        .catch(err => {
+            console.error('Send error', err);
+            finish(` ✗ Error: ${err.message}`);
         });
     }
 
     // Connect to SSE stream
+    function showStreamError() {
+        const loadingEl = document.querySelector('.loading-indicator');
+        if (loadingEl) {
+            loadingEl.classList.remove('active');
+            loadingEl.innerHTML = '<p style="color: #d33b27;">Error loading emails. Please refresh the page.</p>';
+        }
+    }
+
     function connectToStream() {
-        const eventSource = new EventSource('/api/threads-stream');
-        let groupIndex = 0;
+        // Threads arriving close together come in one event; after a dropped
+        // connection EventSource reconnects with Last-Event-ID and resumes
+        const eventSource = new EventSource('/api/threads-stream?coalesce_ms=100');
         
         eventSource.onmessage = (event) => {
             const data = JSON.parse(event.data);
@@ -498,29 +694,32 @@ TEMPLATE = """
                 if (loadingEl) {
                     loadingEl.classList.remove('active');
                 }
-                const container = document.getElementById('groups-container');
-                if (container.children.length === 0) {
-                    showEmptyStateIfNeeded();
-                }
-            } else if (data.type === 'thread') {
-                addThreadToUI(data.thread);
                 showEmptyStateIfNeeded();
+            } else if (data.type === 'reset') {
+                // The scan we were following is gone; a fresh one starts from the top
+                clearGroups();
+            } else if (data.type === 'threads') {
+                addThreads(data);
+                showEmptyStateIfNeeded();
+            } else if (data.type === 'error') {
+                eventSource.close();
+                showStreamError();
             }
         };
         
         eventSource.onerror = (error) => {
-            console.error('Stream error:', error);
-            eventSource.close();
-            const loadingEl = document.querySelector('.loading-indicator');
-            if (loadingEl) {
-                loadingEl.classList.remove('active');
-                loadingEl.innerHTML = '<p style="color: #d33b27;">Error loading emails. Please refresh the page.</p>';
+            // While CONNECTING the browser is already retrying; only give up once it stops
+            if (eventSource.readyState === EventSource.CLOSED) {
+                console.error('Stream error:', error);
+                showStreamError();
             }
         };
     }
 
     // Start streaming when page loads
     window.addEventListener('load', connectToStream);
+    window.addEventListener('scroll', scheduleRender, {passive: true});
+    window.addEventListener('resize', scheduleRender);
     </script>
 </head>
 <body>
@@ -529,40 +728,62 @@ TEMPLATE = """
         <span class="spinner"></span>Loading emails...
     </div>
     <div id="groups-container"></div>
+    <div id="draft-panel">
+        <div class="draft-header">
+            <span>AI draft</span>
+            <span id="draft-status"></span>
+            <button class="btn btn-secondary draft-btn" onclick="closeDraft()">Close</button>
+        </div>
+        <pre id="draft-text"></pre>
+    </div>
 </body>
 </html>
 """
 
 
+def _scan_threads():
+    with get_service_provider().lease() as service:
+        yield from get_threads_to_follow_up_generator(service)
+
+
 @app.route('/api/threads-stream')
 def threads_stream():
-    """Stream threads as SSE for progressive UI rendering."""
+    """
+    Stream threads as SSE for progressive UI rendering.
+
+    Threads are grouped by normalized subject server-side: each 'threads'
+    event carries the groups first seen in it, the threads (display text
+    already decoded) with their group ID, and updated group counts.
+
+    Each event's ID is '<scan id>:<threads sent so far>', so a client that
+    reconnects with Last-Event-ID resumes from the buffered scan instead of
+    rescanning; if that scan is gone it gets a 'reset' event and the new
+    scan from the start. With coalesce_ms > 0, threads arriving within that
+    window are sent together in one event.
+    """
+    # Tabs and reloads share one in-flight or recent scan instead of each starting their own
+    snapshot = get_scan_cache().get('me', _scan_threads)
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    coalesce = max(0.0, request.args.get('coalesce_ms', STREAM_COALESCE_MS, type=float)) / 1000
+    frames = ThreadStreamFrames(snapshot, last_event_id, bool(coalesce))
+
     def generate():
-        service = get_gmail_service()
-        current_subject = None
-        group_index = 0
-        
-        for thread in get_threads_to_follow_up_generator(service):
-            data = {
-                'type': 'thread',
-                'thread': thread,
-                'group_index': group_index,
-                'current_subject': thread['subject']
-            }
-            # Track subject changes for grouping
-            if current_subject != thread['subject']:
-                current_subject = thread['subject']
-                group_index += 1
-            
-            yield f"data: {json.dumps(data)}\n\n"
-        
+        yield from frames.opening(STREAM_RETRY_MS)
+        try:
+            for batch in snapshot.batches(frames.index, coalesce, STREAM_HEARTBEAT_SECONDS):
+                yield from frames.batch(batch)
+        except Exception:
+            yield frames.error()
+            return
+
         # Signal completion
-        yield "data: {\"type\": \"complete\"}\n\n"
-    
-    return Response(generate(), mimetype='text/event-stream', headers={
-        'Cache-Control': 'no-cache',
-        'X-Accel-Buffering': 'no'
-    })
+        yield frames.complete()
+
+    body, headers = generate(), dict(SSE_HEADERS)
+    if STREAM_GZIP and 'gzip' in request.accept_encodings:
+        body = gzip_stream(body)
+        headers.update({'Content-Encoding': 'gzip', 'Vary': 'Accept-Encoding'})
+    return Response(body, mimetype='text/event-stream', headers=headers)
 
 
 @app.route('/')
@@ -576,16 +797,172 @@ def send_followup():
     """Handle follow-up email requests."""
     data = request.json
     # Use a flag from config to disable sending follow-up emails
-    service = get_gmail_service()
-    success = send_followup_email(
-        service,
-        data['to'],
-        data['subject'],
-        data['thread_id']
-    )
+    with get_service_provider().lease() as service:
+        success = send_followup_email(
+            service,
+            data['to'],
+            data['subject'],
+            data['thread_id']
+        )
     return jsonify({'success': success})
 
 
+def _requested_threads():
+    """Thread IDs or {thread_id, to, subject} dicts from the JSON body, or None when malformed."""
+    data = request.json or {}
+    items = data.get('threads') or data.get('thread_ids')
+    valid = isinstance(items, list) and items and all(
+        isinstance(item, str) or (isinstance(item, dict) and item.get('thread_id')) for item in items
+    )
+    return items if valid else None
+
+
+@app.route('/send-followups', methods=['POST'])
+def send_followups():
+    """Send follow-ups for many threads, streaming one NDJSON result line per thread."""
+    items = _requested_threads()
+    if items is None:
+        return jsonify({'success': False, 'error': 'A list of threads or thread_ids is required.'}), 400
+
+    def generate():
+        sent = failed = 0
+        with get_service_provider().lease() as service:
+            for result in send_followups_bulk(service, items):
+                if result['success']:
+                    sent += 1
+                else:
+                    failed += 1
+                yield json.dumps({'type': 'result', **result}) + "\n"
+        yield json.dumps({'type': 'complete', 'sent': sent, 'failed': failed}) + "\n"
+
+    return Response(generate(), mimetype='application/x-ndjson', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+@app.route('/send-jobs', methods=['POST'])
+def create_send_jobs():
+    """Queue follow-ups for background sending; progress is served by send_job_events."""
+    items = _requested_threads()
+    if items is None:
+        return jsonify({'success': False, 'error': 'A list of threads or thread_ids is required.'}), 400
+    batch = get_send_queue().enqueue(items)
+    return jsonify({'success': True, **batch}), 202
+
+
+@app.route('/send-jobs/<batch_id>')
+def send_job_status(batch_id):
+    status = get_send_queue().batch_status(batch_id)
+    if not status['jobs']:
+        return jsonify({'success': False, 'error': 'Unknown batch.'}), 404
+    return jsonify(status)
+
+
+@app.route('/send-jobs/<batch_id>/events')
+def send_job_events(batch_id):
+    """Stream a batch's job updates as SSE until every job is sent, dry-run or failed."""
+    queue = get_send_queue()
+
+    def generate():
+        seen = {}
+        version = queue.version
+        while True:
+            status = queue.batch_status(batch_id)
+            if not status['jobs']:
+                yield sse_event({'type': 'error', 'error': 'Unknown batch.'})
+                return
+            changed = False
+            for job in status['jobs']:
+                key = (job['status'], job['attempts'])
+                if seen.get(job['id']) != key:
+                    seen[job['id']] = key
+                    changed = True
+                    yield sse_event({'type': 'job', 'job': job})
+            if changed:
+                yield sse_event({'type': 'progress', 'counts': status['counts']})
+            if status['done']:
+                yield sse_event({'type': 'complete', 'counts': status['counts']})
+                return
+            current = queue.wait_for_change(version, timeout=15)
+            if current == version:
+                # Comment line keeps proxies from closing an idle stream
+                yield sse_comment('keep-alive')
+            version = current
+
+    return Response(generate(), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+
+@app.route('/api/ai-draft-stream')
+def ai_draft_stream():
+    """
+    Stream an AI follow-up draft for one thread as SSE.
+
+    The page passes the thread's thread_id, subject, to, snippet and days
+    (since the last message). 'token' events carry text as the model
+    produces it, then 'complete'. When the client disconnects the model
+    stream is closed, so an abandoned preview stops generating tokens.
+    """
+    try:
+        ai = get_ai_service()
+    except ValueError as exc:
+        return jsonify({'success': False, 'error': str(exc)}), 503
+
+    thread = {name: request.args.get(name, '') for name in ('thread_id', 'subject', 'to', 'snippet')}
+    drafts = ai.stream_followup_email(thread_content_for(thread), recipient_name_for(thread),
+                                      thread['snippet'], request.args.get('days', 0, type=int))
+
+    def generate():
+        try:
+            for text in drafts:
+                yield sse_event({'type': 'token', 'text': text})
+        except Exception:
+            yield sse_event({'type': 'error', 'error': 'Draft generation failed.'})
+            return
+        finally:
+            # Also runs when the server closes this generator after the client went away
+            drafts.close()
+        yield sse_event({'type': 'complete'})
+
+    return Response(generate(), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+
+@app.route('/api/ai-metrics')
+def ai_metrics():
+    """AIService counters: tokens trimmed, answer sources, draft streams (time to first token) and the cache."""
+    try:
+        return jsonify({'success': True, **get_ai_service().metrics()})
+    except ValueError as exc:
+        return jsonify({'success': False, 'error': str(exc)}), 503
+
+
+@app.route('/api/reports')
+def reports():
+    """
+    Query the follow-up history.
+
+    Filters: start/end (YYYY-MM-DD, inclusive), recipient, domain, thread_id,
+    status. With group_by (day, month, domain, recipient, status or
+    followup_number) returns per-group counts; otherwise a page of entries,
+    newest first, continued by passing next_before_id as before_id.
+    """
+    history = get_history_store()
+    if history is None:
+        return jsonify({'success': False, 'error': 'History store is disabled.'}), 404
+
+    filters = {name: request.args.get(name)
+               for name in ('start', 'end', 'recipient', 'domain', 'thread_id', 'status')}
+    group_by = request.args.get('group_by')
+    if group_by:
+        if group_by not in GROUP_BY:
+            return jsonify({'success': False, 'error': f"group_by must be one of: {', '.join(GROUP_BY)}"}), 400
+        return jsonify({'success': True, 'group_by': group_by, 'groups': history.aggregate(group_by, **filters)})
+
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    page = history.query(limit, request.args.get('before_id', type=int), **filters)
+    return jsonify({'success': True, **page})
+
+
 @app.route('/blacklist-subject', methods=['POST'])
 def blacklist_subject():
     """Persist a subject to the local blacklist file."""
@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, List, Tuple
+
+from app.config import SCAN_CACHE_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class ScanSnapshot:
+    """
+    The results of one scan, buffered as they are produced.
+
+    Any number of subscribers can iterate a snapshot at once; each starts
+    from the first item, so one that joins mid-scan first replays what was
+    already produced and then follows the live scan. Coroutines follow it
+    with await_items / abatches, which wait on their event loop instead of
+    blocking a thread.
+    """
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex[:12]
+        self.items: List = []
+        self.done = False
+        self.error: Exception | None = None
+        self.stale = False
+        self.started_at = time.monotonic()
+        self.finished_at: float | None = None
+        self._changed = threading.Condition()
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+
+    def _notify(self) -> None:
+        # Called with _changed held
+        self._changed.notify_all()
+        for loop, event in self._async_waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def append(self, item) -> None:
+        with self._changed:
+            self.items.append(item)
+            self._notify()
+
+    def finish(self, error: Exception | None = None) -> None:
+        with self._changed:
+            self.done = True
+            self.error = error
+            self.finished_at = time.monotonic()
+            self._notify()
+
+    def wait(self, index: int, timeout: float | None = None) -> Tuple[List, bool]:
+        """Block until there are items past `index` or the scan ends; return (new items, done)."""
+        with self._changed:
+            self._changed.wait_for(lambda: len(self.items) > index or self.done, timeout)
+            return self.items[index:], self.done
+
+    async def await_items(self, index: int, timeout: float | None = None) -> Tuple[List, bool]:
+        """Async counterpart of wait."""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._changed:
+            if len(self.items) > index or self.done:
+                return self.items[index:], self.done
+            self._async_waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._changed:
+                self._async_waiters.remove(waiter)
+        with self._changed:
+            return self.items[index:], self.done
+
+    def iter(self, start: int = 0) -> Iterator:
+        """Yield items from `start` on, following the scan until it finishes; re-raises its error."""
+        index = start
+        while True:
+            items, done = self.wait(index)
+            yield from items
+            index += len(items)
+            if done and not items:
+                if self.error is not None:
+                    raise self.error
+                return
+
+    def __iter__(self) -> Iterator:
+        return self.iter()
+
+    def batches(self, start: int = 0, window: float = 0.0, idle_timeout: float | None = None) -> Iterator[List]:
+        """
+        Like iter, but yield lists of items, coalescing those that arrive within
+        `window` seconds of the first. An empty list is yielded whenever
+        idle_timeout passes without new items, so callers can send heartbeats.
+        """
+        index = start
+        while True:
+            items, done = self.wait(index, idle_timeout)
+            if not items:
+                if not done:
+                    yield []
+                    continue
+                if self.error is not None:
+                    raise self.error
+                return
+            deadline = time.monotonic() + window
+            while not done and (remaining := deadline - time.monotonic()) > 0:
+                more, done = self.wait(index + len(items), remaining)
+                if not more:
+                    break
+                items = items + more
+            index += len(items)
+            yield items
+
+    async def abatches(self, start: int = 0, window: float = 0.0,
+                       idle_timeout: float | None = None) -> AsyncIterator[List]:
+        """Async counterpart of batches."""
+        index = start
+        while True:
+            items, done = await self.await_items(index, idle_timeout)
+            if not items:
+                if not done:
+                    yield []
+                    continue
+                if self.error is not None:
+                    raise self.error
+                return
+            deadline = time.monotonic() + window
+            while not done and (remaining := deadline - time.monotonic()) > 0:
+                more, done = await self.await_items(index + len(items), remaining)
+                if not more:
+                    break
+                items = items + more
+            index += len(items)
+            yield items
+
+
+class ScanCache:
+    """
+    Per-account scan snapshots with single-flight scans and a TTL.
+
+    get returns the in-flight snapshot when a scan for the key is already
+    running, a finished snapshot younger than ttl_seconds, or else starts a
+    new scan on a background thread. The scan therefore runs once however
+    many requests want it, and finishes (filling the cache) even if the
+    request that started it goes away. Failed scans are not cached.
+    invalidate drops snapshots so the next request rescans; subscribers
+    already following an invalidated scan still receive it to the end.
+    """
+
+    def __init__(self, ttl_seconds: float = SCAN_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._snapshots: Dict[str, ScanSnapshot] = {}
+        self._lock = threading.Lock()
+
+    def _reusable(self, snapshot: ScanSnapshot) -> bool:
+        if snapshot.stale:
+            return False
+        if not snapshot.done:
+            return True
+        return snapshot.error is None and time.monotonic() - snapshot.finished_at < self.ttl_seconds
+
+    def get(self, key: str, produce: Callable[[], Iterable]) -> ScanSnapshot:
+        """Return the snapshot for key, starting `produce` in the background when none is reusable."""
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None and self._reusable(snapshot):
+                return snapshot
+            snapshot = ScanSnapshot()
+            self._snapshots[key] = snapshot
+        threading.Thread(target=self._run, args=(snapshot, produce), name=f'scan-{key}', daemon=True).start()
+        return snapshot
+
+    @staticmethod
+    def _run(snapshot: ScanSnapshot, produce: Callable[[], Iterable]) -> None:
+        try:
+            for item in produce():
+                snapshot.append(item)
+        except Exception as e:
+            logger.warning(f"Scan failed: {e}")
+            snapshot.finish(e)
+        else:
+            snapshot.finish()
+
+    def invalidate(self, key: str | None = None) -> None:
+        """Drop the snapshot for key, or every snapshot when key is None."""
+        with self._lock:
+            keys = list(self._snapshots) if key is None else [key]
+            for k in keys:
+                snapshot = self._snapshots.pop(k, None)
+                if snapshot is not None:
+                    snapshot.stale = True
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_scan_cache() -> ScanCache:
+    """Return the process-wide scan cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ScanCache()
+        return _cache
@@ -0,0 +1,431 @@
+from __future__ import annotations
+
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Iterable, List
+
+from googleapiclient.errors import HttpError
+
+from app.config import (
+    SEND_LEASE_SECONDS, SEND_MAX_ATTEMPTS, SEND_QUEUE_PATH, SEND_QUEUE_WORKERS, SEND_RATE_PER_SECOND,
+    SEND_RETRY_BASE_SECONDS, SEND_RETRY_MAX_SECONDS
+)
+from app.email_service import deliver_followup, get_followup_details
+from app.gmail_service import get_service_provider
+from app.rate_limiter import TokenBucket, get_gmail_scheduler, is_rate_limited
+from app.scan_cache import get_scan_cache
+from app.sqlite_store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS send_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_id TEXT NOT NULL,
+    thread_id TEXT NOT NULL,
+    recipient TEXT,
+    subject TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    available_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    claimed_by TEXT,
+    lease_expires_at REAL,
+    unsure_since REAL
+);
+CREATE INDEX IF NOT EXISTS idx_send_jobs_status ON send_jobs (status, available_at);
+CREATE INDEX IF NOT EXISTS idx_send_jobs_batch ON send_jobs (batch_id);
+-- Batches a job belongs to: the one that created it (send_jobs.batch_id) and any that re-queued its thread
+CREATE TABLE IF NOT EXISTS batch_jobs (
+    batch_id TEXT NOT NULL,
+    job_id INTEGER NOT NULL REFERENCES send_jobs (id),
+    PRIMARY KEY (batch_id, job_id)
+);
+"""
+
+ACTIVE_STATUSES = ('pending', 'running')
+# 'dry_run': composed but not sent because DISABLE_SEND_FOLLOWUP is set
+JOB_STATUSES = ('pending', 'running', 'sent', 'dry_run', 'failed')
+# Margin for clock skew between this host and Gmail when looking for an earlier attempt's message
+SENT_CHECK_SKEW_SECONDS = 60
+
+
+class PermanentSendError(Exception):
+    """A send failure that retrying cannot fix."""
+
+
+def _default_send(service, job: Dict, profile_email: str) -> bool:
+    details = get_followup_details(service, job['thread_id'], profile_email)
+    to = job['recipient'] or details.get('to')
+    subject = job['subject'] or details.get('subject')
+    if not to or not subject:
+        raise PermanentSendError('Thread has no recipient or subject to reply to')
+    # The queue drops cached scans once it runs dry, not after every send
+    return deliver_followup(service, to, subject, job['thread_id'], details, profile_email,
+                            os.getenv('SENDER_NAME', 'Nishant Soni'), invalidate=False)
+
+
+def _default_was_sent(service, job: Dict, since: float) -> bool:
+    """Whether the job's thread has a message sent by the user since the given time."""
+    thread = get_gmail_scheduler().execute(
+        service.users().threads().get(userId='me', id=job['thread_id'], format='minimal')
+    )
+    return any('SENT' in message.get('labelIds', ())
+               and int(message.get('internalDate', 0)) / 1000 >= since - SENT_CHECK_SKEW_SECONDS
+               for message in thread.get('messages', ()))
+
+
+def _outcome_known(error: Exception) -> bool:
+    """Whether a failed attempt certainly did not send: Gmail rejected it (4xx), or it never got that far."""
+    if isinstance(error, HttpError):
+        return error.resp.status < 500
+    return isinstance(error, PermanentSendError)
+
+
+def _default_service():
+    return get_service_provider().service()
+
+
+class SendQueue(SQLiteStore):
+    """
+    Durable follow-up send queue backed by a SQLite table, drained by worker threads.
+
+    Jobs survive restarts. Workers claim jobs atomically under a lease of
+    lease_seconds, so several processes can share one queue file: a running
+    job is only taken over once its lease has expired, i.e. its worker died.
+    While the workers run, a keeper thread renews this process's leases, so
+    a slow attempt (backoff, a long Retry-After) keeps its job; an attempt
+    also renews its lease right before sending and skips the send if the job
+    was taken over. Outcomes are only recorded by the claim that made them.
+    Sends are paced through a token bucket at rate_per_second; failures are
+    rescheduled with exponential backoff until max_attempts, and errors
+    retrying cannot fix (e.g. a 400 or 404 from Gmail) fail the job at once.
+    When an attempt may have sent the message (a 5xx, a timeout, a lost
+    worker), the next attempt first looks for it in the thread and marks the
+    job sent if it is there. Every status change bumps a version that
+    wait_for_change blocks on, so progress streams do not poll the database
+    in a tight loop.
+    """
+
+    def __init__(self, path: str, workers: int = SEND_QUEUE_WORKERS,
+                 rate_per_second: float = SEND_RATE_PER_SECOND, max_attempts: int = SEND_MAX_ATTEMPTS,
+                 retry_base: float = SEND_RETRY_BASE_SECONDS, retry_max: float = SEND_RETRY_MAX_SECONDS,
+                 lease_seconds: float = SEND_LEASE_SECONDS,
+                 send: Callable[[object, Dict, str], bool | None] = _default_send,
+                 was_sent: Callable[[object, Dict, float], bool] = _default_was_sent,
+                 service_factory: Callable[[], object] = _default_service):
+        super().__init__(path)
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.lease_seconds = lease_seconds
+        # Identifies this process's workers in claimed_by
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.bucket = TokenBucket(rate_per_second, capacity=1)
+        self._send = send
+        self._was_sent = was_sent
+        self._service_factory = service_factory
+        self._changed = threading.Condition()
+        self._version = 0
+        self._stop = threading.Event()
+        # Set when a follow-up went out since cached scans were last dropped
+        self._sent_since_invalidate = threading.Event()
+        self._threads: List[threading.Thread] = []
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _notify(self) -> None:
+        with self._changed:
+            self._version += 1
+            self._changed.notify_all()
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def wait_for_change(self, version: int, timeout: float | None = None) -> int:
+        """Block until the queue changes after `version` (or timeout); return the current version."""
+        with self._changed:
+            self._changed.wait_for(lambda: self._version != version, timeout)
+            return self._version
+
+    def enqueue(self, items: Iterable) -> Dict:
+        """
+        Queue follow-ups for thread IDs or {thread_id, to, subject} dicts under a new batch.
+
+        Threads that already have a pending or running job are not queued twice;
+        the new batch tracks the existing job too, and so does every batch
+        that tracked it before.
+        """
+        batch_id = uuid.uuid4().hex
+        now = time.time()
+        job_ids = []
+        with self._connection() as conn:
+            for item in items:
+                item = {'thread_id': item} if isinstance(item, str) else item
+                existing = conn.execute(
+                    "SELECT id FROM send_jobs WHERE thread_id = ? AND status IN ('pending', 'running')",
+                    (item['thread_id'],)
+                ).fetchone()
+                if existing is not None:
+                    job_id = existing['id']
+                else:
+                    job_id = conn.execute(
+                        """
+                        INSERT INTO send_jobs
+                            (batch_id, thread_id, recipient, subject, available_at, created_at, updated_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                        """,
+                        (batch_id, item['thread_id'], item.get('to'), item.get('subject'), now, now, now)
+                    ).lastrowid
+                conn.execute('INSERT OR IGNORE INTO batch_jobs (batch_id, job_id) VALUES (?, ?)', (batch_id, job_id))
+                job_ids.append(job_id)
+        self._notify()
+        return {'batch_id': batch_id, 'job_ids': job_ids}
+
+    def claim(self) -> Dict | None:
+        """
+        Atomically lease the next due job to this process and return it.
+
+        Due jobs are pending ones past their available_at, and running ones
+        whose lease expired because the worker holding them is gone. The
+        returned job's unsure_since is set when an earlier attempt may have
+        sent the message.
+        """
+        now = time.time()
+        with self._connection() as conn:
+            row = conn.execute(
+                """
+                UPDATE send_jobs SET status = 'running', attempts = attempts + 1, updated_at = ?,
+                    claimed_by = ?, lease_expires_at = ?,
+                    unsure_since = CASE WHEN status = 'running' THEN COALESCE(unsure_since, updated_at) ELSE unsure_since END
+                WHERE id = (
+                    SELECT id FROM send_jobs
+                    WHERE (status = 'pending' AND available_at <= ?)
+                       OR (status = 'running' AND COALESCE(lease_expires_at, 0) < ?)
+                    ORDER BY available_at, id LIMIT 1
+                )
+                RETURNING *
+                """,
+                (now, self.owner, now + self.lease_seconds, now, now)
+            ).fetchone()
+        if row is None:
+            return None
+        self._notify()
+        return dict(row)
+
+    def _next_due_in(self) -> float | None:
+        row = self._connection().execute(
+            """
+            SELECT MIN(CASE WHEN status = 'pending' THEN available_at ELSE COALESCE(lease_expires_at, 0) END)
+            FROM send_jobs WHERE status IN ('pending', 'running')
+            """
+        ).fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def renew(self, job: Dict) -> bool:
+        """Extend the lease of a claimed job; False when the claim was lost (the job was taken over)."""
+        now = time.time()
+        with self._connection() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE send_jobs SET lease_expires_at = ?
+                WHERE id = ? AND status = 'running' AND claimed_by = ? AND attempts = ?
+                """,
+                (now + self.lease_seconds, job['id'], self.owner, job['attempts'])
+            )
+        return cursor.rowcount == 1
+
+    def _renew_leases(self) -> None:
+        """Extend every lease this process holds; runs on the keeper thread."""
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE send_jobs SET lease_expires_at = ? WHERE status = 'running' AND claimed_by = ?",
+                (time.time() + self.lease_seconds, self.owner)
+            )
+
+    def complete(self, job: Dict, status: str = 'sent') -> bool:
+        """Record a job's outcome; False (and nothing recorded) when this claim no longer holds the job."""
+        with self._connection() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE send_jobs SET status = ?, last_error = NULL, claimed_by = NULL, lease_expires_at = NULL,
+                    unsure_since = NULL, updated_at = ?
+                WHERE id = ? AND claimed_by = ? AND attempts = ?
+                """,
+                (status, time.time(), job['id'], self.owner, job['attempts'])
+            )
+        self._notify()
+        return cursor.rowcount == 1
+
+    def retry_delay(self, attempts: int) -> float:
+        return min(self.retry_max, self.retry_base * 2 ** max(0, attempts - 1))
+
+    def fail(self, job: Dict, error: Exception, started_at: float | None = None) -> bool:
+        """
+        Reschedule a failed job with backoff, or mark it failed when retrying is pointless.
+
+        Unless the error shows the message was not sent, the attempt's start
+        (started_at) is kept in unsure_since so the next attempt checks the
+        thread before sending again. Like complete, returns False when this
+        claim no longer holds the job.
+        """
+        permanent = isinstance(error, PermanentSendError) or (
+            isinstance(error, HttpError) and error.resp.status < 500 and not is_rate_limited(error)
+        )
+        unsure_since = job.get('unsure_since')
+        if not _outcome_known(error):
+            unsure_since = unsure_since or started_at or time.time()
+        now = time.time()
+        with self._connection() as conn:
+            if permanent or job['attempts'] >= self.max_attempts:
+                # Left for manual review: the thread shows whether the last attempt went out
+                message = str(error) if unsure_since is None else f"{error} (the follow-up may have been sent)"
+                cursor = conn.execute(
+                    """
+                    UPDATE send_jobs SET status = 'failed', last_error = ?, claimed_by = NULL,
+                        lease_expires_at = NULL, unsure_since = ?, updated_at = ?
+                    WHERE id = ? AND claimed_by = ? AND attempts = ?
+                    """,
+                    (message, unsure_since, now, job['id'], self.owner, job['attempts'])
+                )
+            else:
+                cursor = conn.execute(
+                    """
+                    UPDATE send_jobs SET status = 'pending', last_error = ?, available_at = ?, claimed_by = NULL,
+                        lease_expires_at = NULL, unsure_since = ?, updated_at = ?
+                    WHERE id = ? AND claimed_by = ? AND attempts = ?
+                    """,
+                    (str(error), now + self.retry_delay(job['attempts']), unsure_since, now, job['id'],
+                     self.owner, job['attempts'])
+                )
+        self._notify()
+        return cursor.rowcount == 1
+
+    def batch_status(self, batch_id: str) -> Dict:
+        """Jobs of a batch with per-status counts; done once none is pending or running."""
+        rows = self._connection().execute(
+            """
+            SELECT id, thread_id, recipient AS 'to', subject, status, attempts, last_error
+            FROM batch_jobs JOIN send_jobs ON send_jobs.id = batch_jobs.job_id
+            WHERE batch_jobs.batch_id = ? ORDER BY id
+            """,
+            (batch_id,)
+        ).fetchall()
+        jobs = [dict(row) for row in rows]
+        counts = {status: 0 for status in JOB_STATUSES}
+        for job in jobs:
+            counts[job['status']] += 1
+        done = bool(jobs) and not any(job['status'] in ACTIVE_STATUSES for job in jobs)
+        return {'batch_id': batch_id, 'jobs': jobs, 'counts': counts, 'done': done}
+
+    def process_next(self, service, profile_email: str) -> bool:
+        """Claim and send one job; returns False when nothing was due."""
+        job = self.claim()
+        if job is None:
+            return False
+        started_at = time.time()
+        try:
+            if job['unsure_since'] is not None and self._was_sent(service, job, job['unsure_since']):
+                logger.info(f"Send job {job['id']}: an earlier attempt reached thread {job['thread_id']}")
+                self.complete(job)
+                return True
+            self.bucket.acquire(1)
+            if not self.renew(job):
+                # Another worker took the job over while this one waited; sending now could send twice
+                logger.warning(f"Send job {job['id']} lost its lease before sending; leaving it to its new worker")
+                return True
+            started_at = time.time()
+            sent = self._send(service, job, profile_email)
+        except Exception as e:
+            logger.warning(f"Send job {job['id']} for thread {job['thread_id']} failed "
+                           f"(attempt {job['attempts']}): {e}")
+            recorded = self.fail(job, e, started_at)
+        else:
+            recorded = self.complete(job, 'dry_run' if sent is False else 'sent')
+            if sent is not False:
+                self._sent_since_invalidate.set()
+        if not recorded:
+            logger.warning(f"Send job {job['id']} was taken over during attempt {job['attempts']}; "
+                           f"its outcome was not recorded")
+        return True
+
+    def _invalidate_scans(self) -> None:
+        """Drop cached scans once after a run of sends, so the sent threads are not offered again."""
+        if self._sent_since_invalidate.is_set():
+            self._sent_since_invalidate.clear()
+            get_scan_cache().invalidate()
+
+    def _worker(self) -> None:
+        service = profile_email = None
+        while not self._stop.is_set():
+            try:
+                if service is None:
+                    # Each worker owns its service, and with it its own HTTP transport
+                    service = self._service_factory()
+                    profile = get_gmail_scheduler().execute(service.users().getProfile(userId='me'))
+                    profile_email = profile['emailAddress']
+                if self.process_next(service, profile_email):
+                    continue
+            except Exception as e:
+                logger.warning(f"Send worker error: {e}")
+                service = None
+                self._stop.wait(self.retry_base)
+                continue
+            # Nothing due: the current run of sends is over
+            self._invalidate_scans()
+            version = self.version
+            due_in = self._next_due_in()
+            with self._changed:
+                # Checking _stop under the condition means a stop() cannot slip in unnoticed
+                self._changed.wait_for(lambda: self._version != version or self._stop.is_set(),
+                                       5.0 if due_in is None else min(due_in, 5.0))
+
+    def _keeper(self) -> None:
+        # Renewing well within the lease means only a dead (or stopped) process ever loses its jobs
+        while not self._stop.wait(max(0.01, self.lease_seconds / 3)):
+            try:
+                self._renew_leases()
+            except Exception as e:
+                logger.warning(f"Send lease renewal failed: {e}")
+
+    def start(self) -> None:
+        """Start the workers (idempotent); jobs a dead process left running are claimed once their lease expires."""
+        if any(t.is_alive() for t in self._threads):
+            return
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f'send-worker-{i}', daemon=True)
+            for i in range(max(1, self.workers))
+        ] + [threading.Thread(target=self._keeper, name='send-lease-keeper', daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stop.set()
+        self._notify()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._invalidate_scans()
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_send_queue() -> SendQueue:
+    """Return the process-wide send queue with its workers running."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = SendQueue(SEND_QUEUE_PATH)
+        _queue.start()
+        return _queue
@@ -0,0 +1,97 @@
+"""
+Shared plumbing for the SQLite-backed stores: the thread store, the AI
+response cache, the follow-up history and the send queue.
+
+SQLiteStore gives every thread its own connection to a WAL-mode database,
+so readers never block on a writer. LRUStore adds age expiry and least
+recently used eviction with amortized bookkeeping: a read refreshes a row's
+accessed_at only when it is older than touch_interval, so most reads take
+no write lock, and eviction runs once per evict_every puts rather than on
+every insert.
+"""
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+# A read refreshes accessed_at only when it is older than this
+TOUCH_INTERVAL_SECONDS = 300
+# Eviction runs once per this many puts (and when a bulk writer finishes), not on every insert
+EVICT_EVERY_PUTS = 200
+
+
+class SQLiteStore:
+    """A SQLite database file with one WAL-mode connection per thread; subclasses create their schema."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+
+class LRUStore(SQLiteStore):
+    """
+    A store of rows keyed by key_column in table, with an accessed_at column.
+
+    Rows whose age_column is older than max_age_seconds are expired; beyond
+    max_entries the least recently used go first. Recency is tracked to
+    within touch_interval seconds and eviction runs every evict_every puts,
+    so the table can briefly hold a few more than max_entries.
+    """
+
+    table = ''
+    key_column = ''
+    age_column = ''
+
+    def __init__(self, path: str, max_entries: int, max_age_seconds: float,
+                 touch_interval: float = TOUCH_INTERVAL_SECONDS, evict_every: int = EVICT_EVERY_PUTS):
+        super().__init__(path)
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.touch_interval = touch_interval
+        self.evict_every = max(1, evict_every)
+        self._puts = 0
+        self._puts_lock = threading.Lock()
+
+    def _touch(self, conn: sqlite3.Connection, key: str, accessed_at: float, now: float) -> None:
+        """Record a read of a row last marked accessed at accessed_at, if that is older than touch_interval."""
+        if accessed_at < now - self.touch_interval:
+            with conn:
+                conn.execute(f'UPDATE {self.table} SET accessed_at = ? WHERE {self.key_column} = ?', (now, key))
+
+    def _put_done(self) -> None:
+        """Count a put, evicting on every evict_every-th."""
+        with self._puts_lock:
+            self._puts += 1
+            due = self._puts % self.evict_every == 0
+        if due:
+            self.evict()
+
+    def evict(self) -> None:
+        """Drop expired rows, then the least recently used rows beyond max_entries."""
+        with self._connection() as conn:
+            conn.execute(f'DELETE FROM {self.table} WHERE {self.age_column} < ?',
+                         (time.time() - self.max_age_seconds,))
+            conn.execute(
+                f"""
+                DELETE FROM {self.table} WHERE {self.key_column} IN (
+                    SELECT {self.key_column} FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,)
+            )
+
+    def __len__(self) -> int:
+        return self._connection().execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
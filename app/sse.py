@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import json
+import zlib
+from typing import Iterable, Iterator, List
+
+from app.thread_groups import SubjectGroups
+
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no',
+}
+
+
+def sse_event(data, event_id: str | None = None) -> str:
+    """Format one SSE frame carrying JSON data, optionally with an event ID."""
+    frame = f"id: {event_id}\n" if event_id is not None else ''
+    return f"{frame}data: {json.dumps(data)}\n\n"
+
+
+def sse_comment(text: str) -> str:
+    """A comment frame; clients ignore it, but it keeps idle connections open."""
+    return f": {text}\n\n"
+
+
+def sse_retry(milliseconds: int) -> str:
+    """Tell EventSource how long to wait before reconnecting."""
+    return f"retry: {int(milliseconds)}\n\n"
+
+
+class GzipFrames:
+    """
+    Incremental gzip encoder for a stream of text chunks, flushing after each one.
+
+    Z_SYNC_FLUSH emits every frame as soon as it is written, so compression
+    does not hold events back until a buffer fills.
+    """
+
+    def __init__(self):
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 selects the gzip container
+
+    def encode(self, chunk: str) -> bytes:
+        return self._compressor.compress(chunk.encode('utf-8')) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def close(self) -> bytes:
+        return self._compressor.flush()
+
+
+def gzip_stream(chunks: Iterable[str]) -> Iterator[bytes]:
+    """Gzip a stream of text chunks with GzipFrames."""
+    encoder = GzipFrames()
+    for chunk in chunks:
+        yield encoder.encode(chunk)
+    yield encoder.close()
+
+
+def resume_index(last_event_id: str | None, stream_id: str, available: int) -> int | None:
+    """
+    Parse a Last-Event-ID of the form '<stream_id>:<count>' into the resume index.
+
+    Returns None when the ID belongs to another stream or is malformed, in
+    which case the client has to start over.
+    """
+    if not last_event_id:
+        return None
+    stream, _, count = last_event_id.rpartition(':')
+    if stream != stream_id or not count.isdigit() or int(count) > available:
+        return None
+    return int(count)
+
+
+class ThreadStreamFrames:
+    """
+    The thread stream's frames for one client, shared by the Flask and ASGI routes.
+
+    Threads come from a scan_cache.ScanSnapshot and are grouped by subject
+    (SubjectGroups). Each event's ID is '<snapshot id>:<threads sent so far>';
+    a Last-Event-ID from the same snapshot resumes after the threads the
+    client already has, any other gets a 'reset' event and the stream from
+    the start. With coalesce, each batch from the snapshot is one event.
+    """
+
+    def __init__(self, snapshot, last_event_id: str | None, coalesce: bool):
+        self.snapshot = snapshot
+        self.coalesce = coalesce
+        start = resume_index(last_event_id, snapshot.id, len(snapshot.items))
+        self.reset = bool(last_event_id) and start is None
+        self.index = start or 0
+        self.groups = SubjectGroups()
+        # Rebuild the groups a resumed client already has
+        for thread in snapshot.items[:self.index]:
+            self.groups.add(thread)
+
+    def opening(self, retry_ms: int) -> List[str]:
+        return [sse_retry(retry_ms)] + ([sse_event({'type': 'reset'})] if self.reset else [])
+
+    def batch(self, threads: List) -> List[str]:
+        """Frames for a batch of threads; an empty batch (an idle interval) is a heartbeat."""
+        if not threads:
+            return [sse_comment('heartbeat')]
+        frames = []
+        for chunk in ([threads] if self.coalesce else ([thread] for thread in threads)):
+            self.index += len(chunk)
+            frames.append(sse_event(self.groups.event(chunk), f"{self.snapshot.id}:{self.index}"))
+        return frames
+
+    def complete(self) -> str:
+        return sse_event({'type': 'complete'}, f"{self.snapshot.id}:{self.index}")
+
+    @staticmethod
+    def error() -> str:
+        return sse_event({'type': 'error', 'error': 'Scan failed.'})
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import datetime
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+
+from googleapiclient.errors import HttpError
+
+from app.config import MAX_DAYS, SYNC_STATE_FILE
+from app.email_service import fetch_threads_batched, iter_processed_threads, iter_thread_id_pages, summarize_thread
+from app.gmail_query import compile_followup_query
+from app.rate_limiter import get_gmail_scheduler
+
+logger = logging.getLogger(__name__)
+
+HISTORY_TYPES = ['messageAdded', 'messageDeleted']
+HISTORY_FIELDS = (
+    'history(messagesAdded/message(id,threadId,labelIds),messagesDeleted/message(threadId)),'
+    'nextPageToken'
+)
+
+
+class HistoryExpiredError(Exception):
+    """Raised when Gmail no longer retains history back to the stored historyId."""
+
+
+def _state_path() -> Path:
+    return Path(SYNC_STATE_FILE)
+
+
+def load_sync_state() -> Dict:
+    """Load the stored historyId and thread summaries, or an empty state."""
+    path = _state_path()
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding='utf-8'))
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable sync state {path}: {e}")
+        return {}
+
+
+def save_sync_state(state: Dict) -> None:
+    """Atomically persist the sync state."""
+    path = _state_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    tmp_path.write_text(json.dumps(state), encoding='utf-8')
+    os.replace(tmp_path, path)
+
+
+def list_history_changes(service, start_history_id: str) -> Tuple[Set[str], Set[str], Set[str]]:
+    """
+    Return the threads touched since start_history_id.
+
+    The result is (changed, sent, deleted): every thread with an added or deleted
+    message, those that gained a SENT message, and those that lost a message.
+    """
+    changed, sent, deleted = set(), set(), set()
+    page_token = None
+    while True:
+        try:
+            response = get_gmail_scheduler().execute(service.users().history().list(
+                userId='me',
+                startHistoryId=start_history_id,
+                historyTypes=HISTORY_TYPES,
+                fields=HISTORY_FIELDS,
+                pageToken=page_token
+            ))
+        except HttpError as e:
+            if getattr(e.resp, 'status', None) == 404:
+                raise HistoryExpiredError(f"historyId {start_history_id} is no longer available") from e
+            raise
+
+        for record in response.get('history', []):
+            for added in record.get('messagesAdded', []):
+                message = added['message']
+                changed.add(message['threadId'])
+                if 'SENT' in message.get('labelIds', []):
+                    sent.add(message['threadId'])
+            for removed in record.get('messagesDeleted', []):
+                changed.add(removed['message']['threadId'])
+                deleted.add(removed['message']['threadId'])
+
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return changed, sent, deleted
+
+
+def _apply_history(service, state: Dict, user_email: str) -> Tuple[Dict[str, Dict], bool]:
+    """
+    Re-fetch only the tracked or newly sent threads that changed since the stored historyId.
+
+    Returns the merged summaries and whether every changed thread was fetched
+    (or is gone); a thread the batch gave up on keeps its stale summary.
+    """
+    threads = dict(state.get('threads', {}))
+    changed, sent, deleted = list_history_changes(service, state['history_id'])
+    to_fetch = sorted(tid for tid in changed if tid in threads or tid in sent)
+    if not to_fetch:
+        return threads, True
+
+    fetched = fetch_threads_batched(service, to_fetch)
+    complete = True
+    for thread_id in to_fetch:
+        if thread_id in fetched:
+            summary = summarize_thread(thread_id, fetched[thread_id], user_email)
+            if summary:
+                threads[thread_id] = summary
+            else:
+                threads.pop(thread_id, None)
+        elif thread_id in deleted:
+            threads.pop(thread_id, None)
+        else:
+            complete = False
+    logger.info(f"Incremental sync re-fetched {len(fetched)} of {len(to_fetch)} changed threads")
+    return threads, complete
+
+
+def _full_scan(service, user_email: str, now: datetime.datetime,
+               fetch_mode: str | None, ordered: bool | None) -> Tuple[Dict[str, Dict], bool]:
+    """
+    Summarize every thread of the last MAX_DAYS days, including ones not yet in the window.
+
+    Returns the summaries and whether every listed thread was fetched.
+    """
+    query = compile_followup_query(now, bounded=False, list_method='messages').q
+    listed, processed = set(), set()
+
+    def pages():
+        for page in iter_thread_id_pages(service, query):
+            listed.update(page)
+            yield page
+
+    def summarize(thread_id, thread):
+        processed.add(thread_id)
+        return summarize_thread(thread_id, thread, user_email)
+
+    summaries = iter_processed_threads(service, pages(), summarize, fetch_mode, ordered)
+    threads = {summary['thread_id']: summary for summary in summaries if summary}
+    return threads, listed <= processed
+
+
+def sync_thread_summaries(service, profile: Dict, fetch_mode: str | None = None,
+                          ordered: bool | None = None) -> List[Dict]:
+    """
+    Bring the stored thread summaries up to date and return them, newest first.
+
+    profile is the getProfile response taken before syncing; its historyId becomes
+    the next starting point, so changes made while syncing are picked up next run.
+    Falls back to a full scan when there is no usable state or the history expired.
+    When a changed thread could not be fetched, the stored historyId is kept so
+    the next run replays its change; when a full scan missed a thread, no
+    historyId is stored and the next run scans in full again.
+    """
+    user_email = profile['emailAddress']
+    now = datetime.datetime.utcnow()
+    state = load_sync_state()
+    history_id = profile.get('historyId')
+
+    threads = None
+    if state.get('user_email') == user_email and state.get('history_id'):
+        try:
+            threads, complete = _apply_history(service, state, user_email)
+            if not complete:
+                logger.warning("Some changed threads could not be fetched; they are retried next run")
+                history_id = state['history_id']
+        except HistoryExpiredError as e:
+            logger.info(f"{e}; falling back to a full scan")
+    if threads is None:
+        threads, complete = _full_scan(service, user_email, now, fetch_mode, ordered)
+        if not complete:
+            logger.warning("Some threads could not be fetched; the next run scans in full again")
+            history_id = None
+
+    # Threads whose last message left the window can only come back with a new message
+    oldest_ts = (now - datetime.timedelta(days=MAX_DAYS + 1)).timestamp()
+    threads = {tid: s for tid, s in threads.items() if s['last_message_ts'] >= oldest_ts}
+
+    save_sync_state({'user_email': user_email, 'history_id': history_id, 'threads': threads})
+    return sorted(threads.values(), key=lambda s: (-s['last_message_ts'], s['thread_id']))
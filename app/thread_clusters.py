@@ -0,0 +1,135 @@
+"""
+Near-duplicate clustering of candidate threads, so one AI call can cover many.
+
+Outreach threads are mostly the same "Interest in ..." email sent to
+different people. Each thread's text (subject and snippet, with the
+recipient's name and address masked) becomes a set of word shingles, the
+set a MinHash signature computed with NumPy, and locality-sensitive hashing
+over signature bands finds candidate pairs without comparing every pair.
+Pairs whose estimated Jaccard similarity reaches the threshold are joined
+into clusters.
+"""
+from __future__ import annotations
+
+import re
+import zlib
+from email.utils import parseaddr
+from typing import Callable, Dict, Hashable, List, Sequence
+
+import numpy as np
+
+from app.config import AI_CLUSTER_THRESHOLD
+from app.thread_groups import normalize_subject
+
+SHINGLE_WORDS = 3
+NUM_PERM = 64
+BANDS = 16
+# Mersenne prime for the permutation hashes; a * x + b stays below 2**63 for 32-bit x
+_PRIME = np.uint64((1 << 31) - 1)
+_CHUNK = 2048
+_WORD = re.compile(r'\w+')
+_EMAIL = re.compile(r'\S+@\S+')
+
+_rng = np.random.default_rng(20240601)
+_A = _rng.integers(1, int(_PRIME), size=NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, int(_PRIME), size=NUM_PERM, dtype=np.uint64)
+
+
+def thread_text(thread: Dict) -> str:
+    """Normalized text of a thread with the recipient's name and addresses masked."""
+    text = normalize_subject(' '.join(
+        str(thread.get(field) or '') for field in ('subject', 'thread_content', 'snippet')
+    ))
+    text = _EMAIL.sub(' recipientaddress ', text)
+    name, address = parseaddr(thread.get('to') or '')
+    for part in normalize_subject(name).split() + [address.split('@')[0].casefold()]:
+        if len(part) > 1:
+            text = re.sub(rf'\b{re.escape(part)}\b', 'recipientname', text)
+    return text
+
+
+def shingles(text: str) -> np.ndarray:
+    """CRC32 hashes of the text's overlapping SHINGLE_WORDS-word shingles (one for shorter texts)."""
+    words = _WORD.findall(text)
+    if len(words) <= SHINGLE_WORDS:
+        grams = [' '.join(words)]
+    else:
+        grams = [' '.join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)]
+    return np.unique(np.fromiter((zlib.crc32(g.encode('utf-8')) for g in grams), dtype=np.uint64))
+
+
+def minhash_signatures(texts: Sequence[str]) -> np.ndarray:
+    """(len(texts), NUM_PERM) MinHash signatures; equal columns estimate Jaccard similarity."""
+    signatures = np.empty((len(texts), NUM_PERM), dtype=np.uint64)
+    for start in range(0, len(texts), _CHUNK):
+        sets = [shingles(text) for text in texts[start:start + _CHUNK]]
+        values = np.concatenate(sets)
+        offsets = np.cumsum([0] + [len(s) for s in sets[:-1]])
+        hashed = (_A[:, None] * values[None, :] + _B[:, None]) % _PRIME
+        signatures[start:start + len(sets)] = np.minimum.reduceat(hashed, offsets, axis=1).T
+    return signatures
+
+
+def _find(parent: List[int], i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def cluster_threads(threads: Sequence[Dict], threshold: float | None = None,
+                    partition: Callable[[Dict], Hashable] | None = None) -> List[List[int]]:
+    """
+    Group near-duplicate threads; returns clusters as lists of indexes into
+    threads, each in input order, so a cluster's first index is its
+    representative. Threads with no near-duplicate are singleton clusters.
+    With partition, threads are only clustered with threads of the same
+    partition value (whatever else must match for them to share an answer).
+    """
+    threshold = AI_CLUSTER_THRESHOLD if threshold is None else threshold
+    if not threads:
+        return []
+    signatures = minhash_signatures([thread_text(thread) for thread in threads])
+    # Each thread's partition as a small integer, prefixed to every band key so
+    # threads of different partitions never share a bucket
+    if partition is not None:
+        ids: Dict[Hashable, int] = {}
+        parts = np.array([ids.setdefault(partition(thread), len(ids)) for thread in threads], dtype=np.uint64)
+    else:
+        parts = np.zeros(len(threads), dtype=np.uint64)
+    parent = list(range(len(threads)))
+    rows = NUM_PERM // BANDS
+    for band in range(BANDS):
+        keys = np.column_stack((parts, signatures[:, band * rows:(band + 1) * rows]))
+        # Threads of one partition sharing a band's values land in the same bucket
+        _, bucket = np.unique(keys, axis=0, return_inverse=True)
+        order = np.argsort(bucket.ravel(), kind='stable')
+        sorted_buckets = bucket.ravel()[order]
+        starts = np.flatnonzero(np.diff(sorted_buckets, prepend=-1))
+        ends = np.append(starts[1:], len(order))
+        for start, end in zip(starts, ends):
+            if end - start < 2:
+                continue
+            members = order[start:end]
+            first = members[0]
+            similar = (signatures[members[1:]] == signatures[first]).mean(axis=1) >= threshold
+            for member in members[1:][similar]:
+                root_a, root_b = _find(parent, int(first)), _find(parent, int(member))
+                if root_a != root_b:
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    clusters: Dict[int, List[int]] = {}
+    for i in range(len(threads)):
+        clusters.setdefault(_find(parent, i), []).append(i)
+    return list(clusters.values())
+
+
+def personalize(text: str, source_name: str, target_name: str) -> str:
+    """Adapt a draft written for one recipient to another: the source's full and first name are swapped."""
+    if not text or not source_name or not target_name or source_name == target_name:
+        return text
+    text = re.sub(rf'\b{re.escape(source_name)}\b', target_name, text)
+    source_first, target_first = source_name.split()[0], target_name.split()[0]
+    if source_first != source_name:
+        text = re.sub(rf'\b{re.escape(source_first)}\b', target_first, text)
+    return text
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import html
+from typing import Dict, Iterable, List, Tuple
+
+# Fields the page shows as text; Gmail returns snippets HTML-escaped
+DISPLAY_FIELDS = ('to', 'date', 'snippet')
+
+
+def decode_text(value) -> str:
+    """Unescape HTML entities so clients can render the value as plain text."""
+    return html.unescape(value) if value else ''
+
+
+def normalize_subject(subject) -> str:
+    """Grouping key for a subject: entities decoded, whitespace collapsed, case folded."""
+    return ' '.join(decode_text(subject).split()).casefold()
+
+
+class SubjectGroups:
+    """
+    Assigns threads to groups by normalized subject, in first-seen order.
+
+    Group IDs are sequential from 0, so the same threads fed in the same
+    order always produce the same IDs; a resumed stream rebuilds its state
+    by replaying the threads the client already has.
+    """
+
+    def __init__(self):
+        self._groups: Dict[str, dict] = {}
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+    def add(self, thread: dict) -> Tuple[dict, bool]:
+        """Count thread into its group; return (group, whether the group is new)."""
+        key = normalize_subject(thread.get('subject'))
+        group = self._groups.get(key)
+        created = group is None
+        if created:
+            group = {'id': len(self._groups), 'subject': ' '.join(decode_text(thread.get('subject')).split()),
+                     'count': 0}
+            self._groups[key] = group
+        group['count'] += 1
+        return group, created
+
+    def event(self, threads: Iterable[dict]) -> dict:
+        """
+        Build a 'threads' event for a batch: groups first seen in it, the
+        threads with decoded display text and their group ID, and the new
+        counts of every group the batch touched.
+        """
+        groups: List[dict] = []
+        rows: List[dict] = []
+        counts: Dict[int, int] = {}
+        for thread in threads:
+            group, created = self.add(thread)
+            if created:
+                groups.append({'id': group['id'], 'subject': group['subject']})
+            row = dict(thread, group_id=group['id'])
+            for field in DISPLAY_FIELDS:
+                row[field] = decode_text(thread.get(field))
+            rows.append(row)
+            counts[group['id']] = group['count']
+        return {'type': 'threads', 'groups': groups, 'threads': rows, 'counts': counts}
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from operator import itemgetter
+from typing import Dict, Iterable, Tuple
+
+# Headers the scan and send paths read; only these are indexed per message.
+INDEXED_HEADERS = ('from', 'to', 'subject', 'message-id')
+
+_name = itemgetter('name')
+
+
+def index_headers(headers, names: Iterable[str] = INDEXED_HEADERS) -> Dict[str, str]:
+    """
+    Map each of the lowercase names to its header value, first occurrence winning.
+
+    All header names are lowercased in a single join/lower/split and located
+    with list.index, so indexing a message with dozens of headers stays in C
+    instead of looping over them in Python.
+    """
+    if not headers:
+        return {}
+    try:
+        # Header names cannot contain newlines, so the round-trip is lossless
+        keys = '\n'.join(map(_name, headers)).lower().split('\n')
+        index = {}
+        for name in names:
+            try:
+                index[name] = headers[keys.index(name)]['value']
+            except ValueError:
+                continue
+        return index
+    except (KeyError, TypeError):
+        return {}
+
+
+class ParsedMessage:
+    """
+    A Gmail message with the headers in INDEXED_HEADERS indexed once.
+
+    Lookups of those headers are a dict hit instead of a scan of the header
+    list that lowercases every name on every call; other names fall back to
+    the scan. Like get_header, the first header with a given name wins and
+    missing headers read as ''.
+    """
+
+    __slots__ = ('id', 'internal_date', 'snippet', 'payload', 'headers')
+
+    def __init__(self, message: Dict):
+        self.id = message.get('id')
+        self.internal_date = message.get('internalDate')
+        self.snippet = message.get('snippet', '')
+        payload = message.get('payload')
+        self.payload = payload if isinstance(payload, dict) else {}
+        self.headers = index_headers(self.payload.get('headers'))
+
+    def header(self, name: str) -> str:
+        """Value of the named header; name must already be lowercase."""
+        if name in INDEXED_HEADERS:
+            return self.headers.get(name, '')
+        return index_headers(self.payload.get('headers'), (name,)).get(name, '')
+
+    def is_from(self, user_email: str) -> bool:
+        return user_email in self.headers.get('from', '')
+
+    @property
+    def subject(self) -> str:
+        return self.headers.get('subject', '')
+
+    @property
+    def timestamp(self) -> int:
+        """internalDate in whole seconds."""
+        return int(self.internal_date) // 1000
+
+
+class ParsedThread:
+    """A Gmail thread whose messages have been parsed into ParsedMessage objects."""
+
+    __slots__ = ('id', 'history_id', 'messages')
+
+    def __init__(self, thread: Dict, thread_id: str | None = None):
+        self.id = thread_id or thread.get('id')
+        self.history_id = thread.get('historyId')
+        self.messages: Tuple[ParsedMessage, ...] = tuple(ParsedMessage(m) for m in thread.get('messages') or ())
+
+    @property
+    def first(self) -> ParsedMessage | None:
+        return self.messages[0] if self.messages else None
+
+    @property
+    def last(self) -> ParsedMessage | None:
+        return self.messages[-1] if self.messages else None
+
+
+def parse_messages(messages: Iterable) -> Tuple[ParsedMessage, ...]:
+    """Parse raw message dicts, passing already parsed messages through."""
+    return tuple(m if isinstance(m, ParsedMessage) else ParsedMessage(m) for m in messages)
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from typing import Dict
+
+from app.config import THREAD_STORE_MAX_AGE_SECONDS, THREAD_STORE_MAX_ENTRIES, THREAD_STORE_PATH
+from app.sqlite_store import EVICT_EVERY_PUTS, TOUCH_INTERVAL_SECONDS, LRUStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    history_id TEXT,
+    summary TEXT,
+    message_id TEXT,
+    receiver_name TEXT,
+    has_details INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_threads_accessed_at ON threads (accessed_at);
+CREATE INDEX IF NOT EXISTS idx_threads_updated_at ON threads (updated_at);
+"""
+
+
+class ThreadStore(LRUStore):
+    """
+    SQLite cache of parsed thread state shared by the scan and send paths.
+
+    Each row holds a thread summary (see email_service.summarize_thread) tied to
+    the thread's historyId, plus the first message's Message-ID and receiver name,
+    which never change once the thread exists. Rows older than max_age_seconds
+    are ignored and purged; beyond max_entries the least recently used go first,
+    with the amortized bookkeeping of sqlite_store.LRUStore (a read-through scan
+    also evicts once when it finishes).
+    """
+
+    table = 'threads'
+    key_column = 'thread_id'
+    age_column = 'updated_at'
+
+    def __init__(self, path: str, max_entries: int = THREAD_STORE_MAX_ENTRIES,
+                 max_age_seconds: int = THREAD_STORE_MAX_AGE_SECONDS, touch_interval: float = TOUCH_INTERVAL_SECONDS,
+                 evict_every: int = EVICT_EVERY_PUTS):
+        super().__init__(path, max_entries, max_age_seconds, touch_interval, evict_every)
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def get(self, thread_id: str) -> Dict | None:
+        """Return the stored record for a thread, or None when missing or expired."""
+        now = time.time()
+        conn = self._connection()
+        row = conn.execute(
+            'SELECT * FROM threads WHERE thread_id = ? AND updated_at >= ?',
+            (thread_id, now - self.max_age_seconds)
+        ).fetchone()
+        if row is None:
+            return None
+        self._touch(conn, thread_id, row['accessed_at'], now)
+        record = dict(row)
+        record['summary'] = json.loads(record['summary']) if record['summary'] else None
+        record['has_details'] = bool(record['has_details'])
+        return record
+
+    def get_summary(self, thread_id: str, history_id: str | None) -> Dict | None:
+        """Return the stored summary only if it was taken at the given historyId."""
+        record = self.get(thread_id)
+        if record is None or history_id is None or record['history_id'] != str(history_id):
+            return None
+        return record['summary']
+
+    def put_summary(self, thread_id: str, history_id: str | None, summary: Dict) -> None:
+        """Store a thread summary taken at history_id, keeping any stored details."""
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                """
+                INSERT INTO threads (thread_id, history_id, summary, message_id, updated_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (thread_id) DO UPDATE SET
+                    history_id = excluded.history_id,
+                    summary = excluded.summary,
+                    message_id = COALESCE(threads.message_id, excluded.message_id),
+                    updated_at = excluded.updated_at,
+                    accessed_at = excluded.accessed_at
+                """,
+                (thread_id, None if history_id is None else str(history_id), json.dumps(summary),
+                 summary.get('message_id'), now, now)
+            )
+        self._put_done()
+
+    def put_details(self, thread_id: str, message_id: str | None, receiver_name: str | None) -> None:
+        """Store the first message's Message-ID and salutation name for a stored thread."""
+        with self._connection() as conn:
+            conn.execute(
+                'UPDATE threads SET message_id = ?, receiver_name = ?, has_details = 1 WHERE thread_id = ?',
+                (message_id, receiver_name, thread_id)
+            )
+
+    def record_followup_sent(self, thread_id: str) -> None:
+        """
+        Account for a follow-up just sent on a thread.
+
+        The thread's historyId is now unknown, so neither get_summary nor the
+        send path serves the record again until the thread is re-fetched; the
+        follow-up count is bumped so the record stays consistent meanwhile.
+        """
+        record = self.get(thread_id)
+        if record is None or record['summary'] is None:
+            return
+        summary = dict(record['summary'], followup_count=record['summary']['followup_count'] + 1)
+        with self._connection() as conn:
+            conn.execute(
+                'UPDATE threads SET history_id = NULL, summary = ? WHERE thread_id = ?',
+                (json.dumps(summary), thread_id)
+            )
+
+    def invalidate(self, thread_id: str) -> None:
+        with self._connection() as conn:
+            conn.execute('DELETE FROM threads WHERE thread_id = ?', (thread_id,))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_thread_store() -> ThreadStore | None:
+    """Return the process-wide thread store, or None when THREAD_STORE_PATH is empty."""
+    global _store
+    if not THREAD_STORE_PATH:
+        return None
+    with _store_lock:
+        if _store is None or _store.path != THREAD_STORE_PATH:
+            _store = ThreadStore(THREAD_STORE_PATH)
+        return _store
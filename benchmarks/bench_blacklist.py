@@ -0,0 +1,119 @@
+"""
+Compare blacklist lookups against a linear scan of the rules, at 50k rules.
+
+Builds a synthetic blacklist (mostly exact subjects, plus prefix, contains
+and glob rules) and times checking scan-like subjects with:
+
+- "linear": every rule tested in turn (startswith / in / fnmatch), which
+  is what supporting patterns without an index would cost;
+- "index": BlacklistIndex, where a lookup walks the subject through a set,
+  a prefix trie and an Aho-Corasick automaton.
+
+Also times loading the file, a cached load (stat only), and adding a
+subject, which used to re-read and re-parse the whole file.
+
+Usage: python benchmarks/bench_blacklist.py [rules] [subjects] [repeats]
+"""
+import fnmatch
+import os
+import random
+import sys
+import tempfile
+import timeit
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import blacklist_service  # noqa: E402
+from app.blacklist_service import RULE_KINDS, BlacklistIndex, parse_rule  # noqa: E402
+from app.thread_groups import normalize_subject  # noqa: E402
+
+WORDS = ['backend', 'frontend', 'data', 'platform', 'infra', 'ml', 'security', 'mobile', 'qa', 'sre',
+         'engineer', 'lead', 'staff', 'senior', 'manager', 'role', 'team', 'remote', 'onsite', 'contract']
+
+
+def _phrase(rng: random.Random, words: int) -> str:
+    return ' '.join(rng.choice(WORDS) + str(rng.randint(0, 999)) for _ in range(words))
+
+
+def _rules(rng: random.Random, count: int) -> list:
+    rules = []
+    for i in range(count):
+        kind = i % 10
+        if kind < 7:
+            rules.append(f'Interest in {_phrase(rng, 3)}')
+        elif kind == 7:
+            rules.append(f'prefix:Interest in {_phrase(rng, 2)}')
+        elif kind == 8:
+            rules.append(f'contains:{_phrase(rng, 2)}')
+        else:
+            rules.append(f'glob:interest in {_phrase(rng, 1)} * {_phrase(rng, 1)}')
+    return rules
+
+
+def linear_match(rules: list, subject: str) -> bool:
+    subject = normalize_subject(subject)
+    for kind, pattern in rules:
+        if kind == 'exact' and subject == pattern:
+            return True
+        if kind == 'prefix' and subject.startswith(pattern):
+            return True
+        if kind == 'contains' and pattern in subject:
+            return True
+        if kind == 'glob' and fnmatch.fnmatchcase(subject, pattern):
+            return True
+    return False
+
+
+def main(rule_count: int = 50_000, subject_count: int = 2_000, repeats: int = 3):
+    rng = random.Random(42)
+    lines = _rules(rng, rule_count)
+    exact = [line for line in lines if line.partition(':')[0] not in RULE_KINDS]
+    rules = [line for line in lines if line.partition(':')[0] in RULE_KINDS]
+    parsed = [('exact', normalize_subject(line)) for line in exact] + [parse_rule(line) for line in rules]
+    # Half the subjects hit a rule, as a scan over a long-lived blacklist would
+    subjects = [f'Interest in {_phrase(rng, 3)}' for _ in range(subject_count // 2)]
+    subjects += [line.partition(':')[2].replace('*', 'x') if ':' in line else line
+                 for line in rng.sample(lines, subject_count - len(subjects))]
+
+    index = BlacklistIndex(exact, rules)
+    assert [index.matches(s) for s in subjects[:200]] == [linear_match(parsed, s) for s in subjects[:200]]
+
+    linear_sample = subjects[:200]
+    linear = min(timeit.repeat(lambda: [linear_match(parsed, s) for s in linear_sample], number=1, repeat=repeats))
+    indexed = min(timeit.repeat(lambda: [index.matches(s) for s in subjects], number=1, repeat=repeats))
+    build = min(timeit.repeat(lambda: BlacklistIndex(exact, rules), number=1, repeat=repeats))
+
+    print(f"Synthetic blacklist: {rule_count} rules (70% exact, 10% each prefix/contains/glob)")
+    print(f"{'lookup':<10}{'per subject (us)':>18}")
+    print(f"{'linear':<10}{linear / len(linear_sample) * 1e6:>18.1f}")
+    print(f"{'index':<10}{indexed / len(subjects) * 1e6:>18.1f}")
+    print(f"speedup: {(linear / len(linear_sample)) / (indexed / len(subjects)):.0f}x")
+    print(f"index build: {build * 1000:.1f} ms")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'blacklist.txt')
+        rules_path = os.path.join(temp_dir, 'blacklist_rules.txt')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(exact) + '\n')
+        with open(rules_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(rules) + '\n')
+        with patch('app.blacklist_service.BLACKLIST_FILE', path), \
+                patch('app.blacklist_service.BLACKLIST_RULES_FILE', rules_path), \
+                patch('app.blacklist_service.get_scan_cache'):
+            blacklist_service.load_blacklisted_subjects()
+            cached = min(timeit.repeat(blacklist_service.load_blacklisted_subjects, number=100, repeat=repeats)) / 100
+            counter = iter(range(10**9))
+            add = min(timeit.repeat(lambda: blacklist_service.add_subject_to_blacklist(f'Bench subject {next(counter)}'),
+                                    number=20, repeat=repeats)) / 20
+
+        def reread():
+            with open(path, encoding='utf-8') as f:
+                return {line.strip().casefold() for line in f.read().splitlines() if line.strip()}
+        old_add = min(timeit.repeat(reread, number=5, repeat=repeats)) / 5
+    print(f"cached load: {cached * 1e6:.1f} us (stat only)")
+    print(f"add subject: {add * 1000:.2f} ms (previously re-read the file into a set first: {old_add * 1000:.1f} ms)")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:4]))
@@ -0,0 +1,119 @@
+"""
+Compare bytes transferred by the scan for full vs metadata-only thread fetches.
+
+Builds a synthetic mailbox of sent "Interest in" threads with realistic
+multipart bodies, then measures the JSON size of each threads().get and
+messages().list response as Gmail would return it with and without the
+scan's format=metadata / fields= profile.
+
+Usage: python benchmarks/bench_fetch_profile.py [threads] [messages_per_thread]
+"""
+import base64
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.email_service import SCAN_LIST_FIELDS, SCAN_THREAD_PARAMS  # noqa: E402
+
+EXTRA_HEADERS = [
+    'Received', 'DKIM-Signature', 'X-Google-DKIM-Signature', 'X-Gm-Message-State',
+    'X-Received', 'MIME-Version', 'Date', 'Message-ID', 'References', 'In-Reply-To',
+    'Content-Type', 'X-Mailer',
+]
+
+
+def _b64(text: str) -> str:
+    return base64.urlsafe_b64encode(text.encode('utf-8')).decode('ascii')
+
+
+def _message(rng: random.Random, thread_id: str, index: int) -> dict:
+    subject = 'Interest in Backend Engineer role' if index == 0 else 'Re: Interest in Backend Engineer role'
+    body = ' '.join(rng.choice(['hello', 'role', 'team', 'experience', 'python', 'follow', 'up'])
+                    for _ in range(rng.randint(150, 400)))
+    quoted = '\n'.join(f'> {body[:80]}' for _ in range(index * 10))
+    headers = [{'name': h, 'value': 'x' * rng.randint(20, 400)} for h in EXTRA_HEADERS]
+    headers += [
+        {'name': 'From', 'value': 'Me <me@example.com>'},
+        {'name': 'To', 'value': 'recruiter@example.com'},
+        {'name': 'Subject', 'value': subject},
+    ]
+    return {
+        'id': f'{thread_id}-{index}',
+        'threadId': thread_id,
+        'labelIds': ['SENT'],
+        'snippet': body[:120],
+        'historyId': '1234',
+        'internalDate': str(1_700_000_000_000 + index * 86_400_000),
+        'sizeEstimate': len(body) * 2,
+        'payload': {
+            'partId': '',
+            'mimeType': 'multipart/alternative',
+            'filename': '',
+            'headers': headers,
+            'body': {'size': 0},
+            'parts': [
+                {'partId': '0', 'mimeType': 'text/plain', 'filename': '', 'headers': headers[:2],
+                 'body': {'size': len(body), 'data': _b64(body + quoted)}},
+                {'partId': '1', 'mimeType': 'text/html', 'filename': '', 'headers': headers[:2],
+                 'body': {'size': len(body) * 2, 'data': _b64(f'<div>{body}</div><blockquote>{quoted}</blockquote>')}},
+            ],
+        },
+    }
+
+
+def _metadata_view(thread: dict) -> dict:
+    """Apply the scan profile the way Gmail does: requested headers only, masked fields."""
+    wanted = {h.lower() for h in SCAN_THREAD_PARAMS['metadataHeaders']}
+    return {
+        'id': thread['id'],
+        'historyId': thread['historyId'],
+        'messages': [
+            {
+                'id': m['id'],
+                'threadId': m['threadId'],
+                'internalDate': m['internalDate'],
+                'snippet': m['snippet'],
+                'payload': {'headers': [h for h in m['payload']['headers'] if h['name'].lower() in wanted]},
+            }
+            for m in thread['messages']
+        ],
+    }
+
+
+def _size(payload: dict) -> int:
+    return len(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+
+
+def main(thread_count: int = 500, messages_per_thread: int = 3):
+    rng = random.Random(42)
+    threads = []
+    for t in range(thread_count):
+        thread_id = f't{t:05d}'
+        count = rng.randint(1, messages_per_thread)
+        threads.append({'id': thread_id, 'historyId': '1234',
+                        'messages': [_message(rng, thread_id, i) for i in range(count)]})
+
+    listing = {'messages': [{'id': m['id'], 'threadId': m['threadId']} for t in threads for m in t['messages']],
+               'nextPageToken': 'abc', 'resultSizeEstimate': 201}
+    full_listing = _size(listing)
+    # SCAN_LIST_FIELDS keeps only messages(id,threadId) and nextPageToken
+    assert SCAN_LIST_FIELDS == 'messages(id,threadId),nextPageToken'
+    lean_listing = _size({k: v for k, v in listing.items() if k != 'resultSizeEstimate'})
+
+    full_threads = sum(_size(t) for t in threads)
+    lean_threads = sum(_size(_metadata_view(t)) for t in threads)
+
+    print(f"Synthetic mailbox: {thread_count} threads, "
+          f"{sum(len(t['messages']) for t in threads)} messages")
+    print(f"{'response':<22}{'full (bytes)':>14}{'metadata (bytes)':>18}{'saved':>8}")
+    for label, full, lean in (('threads().get', full_threads, lean_threads),
+                              ('messages().list', full_listing, lean_listing),
+                              ('total', full_threads + full_listing, lean_threads + lean_listing)):
+        print(f"{label:<22}{full:>14,}{lean:>18,}{1 - lean / full:>8.1%}")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
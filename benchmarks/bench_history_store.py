@@ -0,0 +1,79 @@
+"""
+Time history queries over a year of synthetic follow-up history.
+
+Fills a temporary HistoryStore with a year of report rows (scan rows plus
+send outcomes across a few hundred recipient domains) and times the
+aggregates and a filtered page, the questions that used to mean parsing
+every daily CSV report. Also times parsing the equivalent CSV files, for
+comparison.
+
+Usage: python benchmarks/bench_history_store.py [rows_per_day] [days] [repeats]
+"""
+import csv
+import datetime
+import os
+import random
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.history_store import HistoryStore  # noqa: E402
+from app.report_service import REPORT_COLUMNS  # noqa: E402
+
+
+def main(rows_per_day: int = 200, days: int = 365, repeats: int = 5):
+    rng = random.Random(42)
+    start = datetime.date(2025, 10, 1)
+    domains = [f'company{i}.example' for i in range(300)]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store = HistoryStore(os.path.join(temp_dir, 'history.sqlite3'))
+        csv_paths = []
+        for d in range(days):
+            day = (start + datetime.timedelta(days=d)).isoformat()
+            entries = [{
+                'reported_on': day, 'thread_id': f't{d}-{i}',
+                'recipient': f'r{rng.randint(0, 5000)}@{rng.choice(domains)}', 'subject': f'Interest in role {i}',
+                'prev_message_at': f'{day} {i // 60 % 24:02d}:{i % 60:02d}:00',
+                'followup_number': rng.randint(1, 3), 'status': rng.choice(['', 'success', 'success', 'fail']),
+            } for i in range(rows_per_day)]
+            store.record(entries)
+            path = os.path.join(temp_dir, f'followup_report_{day}.csv')
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(REPORT_COLUMNS)
+                writer.writerows([e['reported_on'], e['recipient'], e['subject'], e['prev_message_at'], '',
+                                  e['followup_number'], e['status']] for e in entries)
+            csv_paths.append(path)
+
+        month_start = (start + datetime.timedelta(days=days - 30)).isoformat()
+        queries = {
+            'per domain, last month': lambda: store.aggregate('domain', start=month_start),
+            'per month, whole year': lambda: store.aggregate('month'),
+            'per follow-up #, sent': lambda: store.aggregate('followup_number', status='success'),
+            'page, one domain': lambda: store.query(50, domain='company7.example'),
+        }
+
+        def parse_csvs():
+            counts = {}
+            for path in csv_paths:
+                with open(path, newline='', encoding='utf-8') as f:
+                    for row in csv.DictReader(f):
+                        if row['Day'] >= month_start:
+                            domain = row['Sent To'].rpartition('@')[2]
+                            counts[domain] = counts.get(domain, 0) + 1
+            return counts
+
+        print(f"History: {len(store)} rows over {days} days")
+        print(f"{'query':<26}{'ms':>10}")
+        for label, run in queries.items():
+            seconds = min(timeit.repeat(run, number=1, repeat=repeats))
+            print(f"{label:<26}{seconds * 1000:>10.2f}")
+        seconds = min(timeit.repeat(parse_csvs, number=1, repeat=min(repeats, 3)))
+        print(f"{'CSV files, per domain':<26}{seconds * 1000:>10.2f}")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:4]))
@@ -0,0 +1,79 @@
+"""
+Measure per-request overhead of obtaining a Gmail service object.
+
+"before" is what each /send-followup and /api/threads-stream request used to
+do: get_gmail_credentials() (read and parse token.json) followed by
+build('gmail', 'v1') with a fresh transport. "after" leases a pooled service
+from GmailServiceProvider. No network is used: the token in the temporary
+token.json is valid, so neither path refreshes it. The new-transport count
+stands for new TCP+TLS connections to gmail.googleapis.com in production,
+which cost far more than the CPU time measured here.
+
+Usage: python benchmarks/bench_service_provider.py [requests]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httplib2  # noqa: E402
+from googleapiclient.discovery import build  # noqa: E402
+
+from app.gmail_service import GmailServiceProvider, get_gmail_credentials  # noqa: E402
+
+TOKEN = {'token': 'access-token', 'refresh_token': 'refresh-token', 'client_id': 'client-id',
+         'client_secret': 'client-secret', 'token_uri': 'https://oauth2.googleapis.com/token',
+         'expiry': '2099-01-01T00:00:00Z'}
+
+
+class CountingHttp(httplib2.Http):
+    created = 0
+
+    def __init__(self, *args, **kwargs):
+        CountingHttp.created += 1
+        super().__init__(*args, **kwargs)
+
+
+def _request(service):
+    """The per-request work after obtaining a service: build one API request."""
+    return service.users().threads().get(userId='me', id='t1', format='metadata')
+
+
+def before():
+    service = build('gmail', 'v1', credentials=get_gmail_credentials())
+    return _request(service)
+
+
+def after(provider):
+    with provider.lease() as service:
+        return _request(service)
+
+
+def measure(label, fn, requests):
+    CountingHttp.created = 0
+    start = time.perf_counter()
+    for _ in range(requests):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<8}{elapsed * 1000 / requests:>16.3f}{CountingHttp.created:>18}")
+
+
+def main(requests: int = 200):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.chdir(tmpdir)
+        with open('token.json', 'w') as f:
+            json.dump(TOKEN, f)
+        httplib2.Http = CountingHttp
+        provider = GmailServiceProvider()
+
+        print(f"{requests} requests")
+        print(f"{'variant':<8}{'ms per request':>16}{'new transports':>18}")
+        measure('before', before, requests)
+        measure('after', lambda: after(provider), requests)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
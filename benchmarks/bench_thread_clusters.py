@@ -0,0 +1,87 @@
+"""
+Measure near-duplicate clustering of follow-up candidates, at 10k threads.
+
+Builds synthetic scan candidates the way outreach is usually sent: a few
+hundred templates, each sent to many recipients with their name, company
+and role filled in, plus one-off threads. Reports:
+
+- how long cluster_threads takes (MinHash signatures and LSH banding);
+- model calls for the urgency analysis of the threads the preclassifier
+  leaves undecided, one per thread vs one per cluster;
+- cluster purity: the share of clustered threads whose cluster holds only
+  threads from their own template.
+
+Usage: python benchmarks/bench_thread_clusters.py [threads] [templates] [repeats]
+"""
+import os
+import random
+import sys
+import timeit
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.preclassifier import preclassify  # noqa: E402
+from app.thread_clusters import cluster_threads  # noqa: E402
+
+FIRST = ['Alice', 'Bruno', 'Chen', 'Dana', 'Elif', 'Farid', 'Grace', 'Hiro', 'Ines', 'Jonas', 'Kofi', 'Lena']
+LAST = ['Smith', 'Garcia', 'Wang', 'Okafor', 'Novak', 'Haddad', 'Kim', 'Rossi', 'Silva', 'Berg', 'Mensah', 'Ito']
+COMPANIES = ['Acme', 'Globex', 'Initech', 'Umbrella', 'Hooli', 'Stark', 'Wayne', 'Wonka', 'Cyberdyne', 'Soylent']
+WORDS = ['backend', 'platform', 'data', 'pipeline', 'latency', 'scale', 'team', 'product', 'infrastructure',
+         'reliability', 'growth', 'mentoring', 'observability', 'migration', 'search', 'payments', 'mobile']
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def _threads(rng: random.Random, count: int, templates: int) -> list:
+    bodies = [f"I recently applied and wanted to share that my work on {_sentence(rng, 6)} and "
+              f"{_sentence(rng, 6)} lines up with what your team is building. {_sentence(rng, 8)}."
+              for _ in range(templates)]
+    threads = []
+    for i in range(count):
+        first, last = rng.choice(FIRST), rng.choice(LAST)
+        company = rng.choice(COMPANIES)
+        # A fifth of the threads are one-off emails with no template
+        template = rng.randrange(templates) if i % 5 else None
+        body = bodies[template] if template is not None else f"{_sentence(rng, 12)} {_sentence(rng, 12)}."
+        threads.append({
+            'thread_id': f't{i}', 'template': template,
+            'subject': f'Interest in the role at {company}',
+            'to': f'{first} {last} <{first.lower()}.{last.lower()}@{company.lower()}.com>',
+            'snippet': f'Hi {first}, {body} Best regards',
+            'followup_count': 0, 'days_since_last': rng.randint(1, 5),
+        })
+    return threads
+
+
+def main(count: int = 10_000, templates: int = 300, repeats: int = 3):
+    rng = random.Random(42)
+    threads = _threads(rng, count, templates)
+    undecided = [thread for thread in threads if preclassify(thread) is None]
+
+    seconds = min(timeit.repeat(lambda: cluster_threads(undecided), number=1, repeat=repeats))
+    clusters = cluster_threads(undecided)
+
+    clustered = pure = 0
+    for cluster in clusters:
+        if len(cluster) < 2:
+            continue
+        clustered += len(cluster)
+        origins = Counter(undecided[i]['template'] for i in cluster)
+        if len(origins) == 1 and None not in origins:
+            pure += len(cluster)
+
+    print(f"Synthetic candidates: {count} threads from {templates} templates (20% one-off)")
+    print(f"undecided by the preclassifier: {len(undecided)}")
+    print(f"cluster_threads: {seconds * 1000:.0f} ms ({seconds / max(1, len(undecided)) * 1e6:.1f} us per thread)")
+    print(f"{'model calls':<22}{'count':>8}")
+    print(f"{'one per thread':<22}{len(undecided):>8}")
+    print(f"{'one per cluster':<22}{len(clusters):>8}")
+    print(f"calls avoided: {1 - len(clusters) / max(1, len(undecided)):.0%}")
+    print(f"cluster purity: {pure / max(1, clustered):.1%} of {clustered} clustered threads")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:4]))
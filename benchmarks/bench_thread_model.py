@@ -0,0 +1,94 @@
+"""
+Compare summarising threads by scanning raw header lists vs the parsed thread model.
+
+Builds long synthetic threads (50+ messages, ~30 headers each, as a full
+fetch returns them) and times the per-thread work of the scan: the sender
+check on every message, first/last subject, To, Message-ID and
+count_followups. The "raw" variant calls get_header/is_from_user on the
+message dicts, which lowercases and scans every header on every lookup; the
+"parsed" variant is summarize_thread, which indexes each message's headers
+once into a ParsedMessage.
+
+Usage: python benchmarks/bench_thread_model.py [threads] [messages_per_thread] [repeats]
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.email_service import get_header, is_from_user, summarize_thread  # noqa: E402
+
+USER_EMAIL = 'me@example.com'
+NOISE_HEADERS = [
+    'Received', 'DKIM-Signature', 'X-Google-DKIM-Signature', 'X-Gm-Message-State', 'X-Received',
+    'ARC-Seal', 'ARC-Message-Signature', 'ARC-Authentication-Results', 'Return-Path',
+    'Received-SPF', 'Authentication-Results', 'MIME-Version', 'Date', 'References', 'In-Reply-To',
+    'Content-Type', 'X-Mailer', 'List-Unsubscribe', 'X-Spam-Status', 'Thread-Topic', 'Thread-Index',
+    'Accept-Language', 'Content-Language',
+]
+
+
+def _thread(rng: random.Random, thread_id: str, count: int) -> dict:
+    messages = []
+    for i in range(count):
+        headers = [{'name': h, 'value': 'x' * rng.randint(20, 120)} for h in NOISE_HEADERS]
+        headers += [{'name': 'Received', 'value': 'by mx.example.com'} for _ in range(rng.randint(2, 6))]
+        headers += [
+            {'name': 'From', 'value': f'Me <{USER_EMAIL}>'},
+            {'name': 'To', 'value': 'recruiter@example.com'},
+            {'name': 'Subject', 'value': 'Interest in Backend role' if i == 0 else 'Re: Interest in Backend role'},
+            {'name': 'Message-ID', 'value': f'<{thread_id}.{i}@example.com>'},
+        ]
+        rng.shuffle(headers)
+        messages.append({'id': f'{thread_id}-{i}', 'threadId': thread_id, 'snippet': 'hello',
+                         'internalDate': str(1_700_000_000_000 + i * 60_000), 'payload': {'headers': headers}})
+    return {'id': thread_id, 'historyId': '1', 'messages': messages}
+
+
+def raw_summary(thread_id: str, thread: dict, user_email: str) -> dict:
+    """The scan's per-thread work before the parsed model, on raw message dicts."""
+    thread_messages = thread['messages']
+    last_msg = thread_messages[-1]
+    followups = 0
+    for m in thread_messages:
+        subject = get_header(m, 'subject').lower()
+        if subject.startswith('re:') or 'follow up' in subject:
+            followups += 1
+    return {
+        'thread_id': thread_id,
+        'history_id': thread.get('historyId'),
+        'all_from_user': all(is_from_user(m, user_email) for m in thread_messages),
+        'first_subject': get_header(thread_messages[0], 'subject'),
+        'message_id': get_header(thread_messages[0], 'message-id') or None,
+        'last_message_id': last_msg['id'],
+        'subject': get_header(last_msg, 'subject'),
+        'to': get_header(last_msg, 'to'),
+        'snippet': last_msg.get('snippet', ''),
+        'last_message_ts': int(last_msg['internalDate']) // 1000,
+        'followup_count': followups,
+    }
+
+
+def main(thread_count: int = 200, messages_per_thread: int = 60, repeats: int = 5):
+    rng = random.Random(42)
+    threads = [_thread(rng, f't{t:04d}', messages_per_thread) for t in range(thread_count)]
+    for thread in threads:
+        assert raw_summary(thread['id'], thread, USER_EMAIL) == summarize_thread(thread['id'], thread, USER_EMAIL)
+
+    def run(summarize):
+        return min(timeit.repeat(lambda: [summarize(t['id'], t, USER_EMAIL) for t in threads],
+                                 number=1, repeat=repeats))
+
+    raw, parsed = run(raw_summary), run(summarize_thread)
+    headers = sum(len(m['payload']['headers']) for m in threads[0]['messages']) // messages_per_thread
+    print(f"Synthetic threads: {thread_count} x {messages_per_thread} messages, ~{headers} headers each")
+    print(f"{'variant':<10}{'total (ms)':>12}{'per thread (us)':>18}")
+    for label, seconds in (('raw', raw), ('parsed', parsed)):
+        print(f"{label:<10}{seconds * 1000:>12.1f}{seconds / thread_count * 1e6:>18.1f}")
+    print(f"speedup: {raw / parsed:.2f}x")
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:4]))
@@ -2,6 +2,7 @@ import os
 from app import app
 from app.logger import setup_logger
 from app.followup_service import run_followup_and_report
+from app.send_queue import get_send_queue
 
 # Configurable flag to enable/disable Flask UI
 ENABLE_FLASK_UI = bool(int(os.getenv('ENABLE_FLASK_UI', '1')))
@@ -12,6 +13,9 @@ if __name__ == '__main__':
     if ENABLE_FLASK_UI:
         # Run Flask UI only (no background job)
         print("Starting Flask UI on http://localhost:5000")
+        # Resume any follow-ups queued before the last shutdown (in the reloader's child only)
+        if not debug_mode or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            get_send_queue()
         app.run(debug=debug_mode, port=5000)
     else:
         print("Flask UI is disabled. Running background follow-up job.")
@@ -0,0 +1,183 @@
+import json
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from app import followup_service
+from app.ai_batch import AIBatchJob, BatchBackend, LocalBatchBackend, OpenAIBatchBackend, run_ai_batch
+from app.ai_cache import AIResponseCache
+from app.ai_service import AIService
+
+ANALYSIS = {'needs_followup': True, 'reason': 'No reply', 'urgency': 'medium', 'context': 'job_application',
+            'original_role': 'SRE'}
+
+
+def responder(body):
+    prompt = body['messages'][0]['content']
+    if 'explode' in prompt:
+        raise RuntimeError('model unavailable')
+    if 'Analyze this email thread' in prompt:
+        return json.dumps(ANALYSIS)
+    return 'Hi ' + prompt.split('Recipient Name: ')[1].split('\n')[0] + ', any update?'
+
+
+def candidate(i, **fields):
+    return dict({'thread_id': f't{i}', 'subject': f'Interest in SRE role {i}', 'to': f'Person {i} <p{i}@example.com>',
+                 'snippet': 'Following up', 'followup_count': 0, 'days_since_last': 4}, **fields)
+
+
+class TestAIBatch(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.cache = AIResponseCache(os.path.join(self.temp_dir.name, 'ai.sqlite3'))
+        self.service = AIService(client=MagicMock(), cache=self.cache)
+        self.jobs_dir = os.path.join(self.temp_dir.name, 'jobs')
+
+    def backend(self, respond=responder):
+        backend = LocalBatchBackend(os.path.join(self.temp_dir.name, 'local'), respond)
+        backend.submit = MagicMock(side_effect=backend.submit)
+        return backend
+
+    def test_results_map_back_to_threads(self):
+        threads = [candidate(0), candidate(1), candidate(2, followup_count=10),
+                   candidate(3, subject='Interest in explode role')]
+        backend = self.backend()
+        job = run_ai_batch(threads, self.service, backend, name='nightly', directory=self.jobs_dir)
+
+        results = job.results
+        self.assertEqual(results['t0']['analysis'], ANALYSIS)
+        self.assertEqual(results['t0']['source'], 'batch')
+        self.assertEqual(results['t1']['draft'], 'Hi Person 1, any update?')
+        # Decided locally: not scored by the model, and not drafted since it needs no follow-up
+        self.assertEqual((results['t2']['source'], results['t2']['draft']), ('local', None))
+        self.assertIsNone(results['t3']['analysis'])
+        self.assertEqual(len(results['t3']['errors']), 2)
+        self.assertIn('model unavailable', results['t3']['errors'][0])
+
+        with open(os.path.join(self.jobs_dir, 'nightly.jsonl')) as f:
+            requests = [json.loads(line) for line in f]
+        self.assertEqual(len(requests), 6)
+        self.assertEqual(requests[0]['custom_id'], 't0:urgency')
+        self.assertEqual(requests[0]['url'], '/v1/chat/completions')
+        with open(os.path.join(self.jobs_dir, 'nightly.results.jsonl')) as f:
+            self.assertEqual(len(f.readlines()), 4)
+        self.assertFalse(os.path.exists(os.path.join(self.jobs_dir, 'nightly.state.json')))
+
+        # Answers were cached, so a second run needs no batch at all
+        again = run_ai_batch(threads[:2], self.service, backend, name='rerun', directory=self.jobs_dir)
+        self.assertEqual(backend.submit.call_count, 1)
+        self.assertEqual(again.results['t0']['source'], 'cache')
+        self.assertEqual(again.results['t1']['draft'], 'Hi Person 1, any update?')
+
+    def test_interrupted_run_resumes_the_submitted_batch(self):
+        backend = self.backend()
+        pending = MagicMock(return_value='in_progress')
+        with patch.object(backend, 'status', pending):
+            with self.assertRaises(TimeoutError):
+                AIBatchJob(self.service, backend, name='nightly', directory=self.jobs_dir).run(
+                    [candidate(0)], poll_seconds=0, timeout_seconds=0)
+
+        sleeps = []
+        results = AIBatchJob(self.service, backend, name='nightly', directory=self.jobs_dir).run(
+            [candidate(0)], poll_seconds=5, sleep=sleeps.append)
+        self.assertEqual(backend.submit.call_count, 1)
+        self.assertEqual(results['t0']['analysis'], ANALYSIS)
+        self.assertEqual(sleeps, [])
+
+    def test_batch_for_different_requests_is_not_resumed(self):
+        backend = self.backend()
+        with patch.object(backend, 'status', MagicMock(return_value='in_progress')):
+            with self.assertRaises(TimeoutError):
+                AIBatchJob(self.service, backend, name='nightly', directory=self.jobs_dir).run(
+                    [candidate(0)], poll_seconds=0, timeout_seconds=0)
+
+        # Same name and request count, but other threads: the old batch's custom_ids would not match
+        results = AIBatchJob(self.service, backend, name='nightly', directory=self.jobs_dir).run([candidate(1)])
+        self.assertEqual(backend.submit.call_count, 2)
+        self.assertEqual(results['t1']['analysis'], ANALYSIS)
+        self.assertNotIn('t0', results)
+
+    def test_backends_must_implement_the_interface(self):
+        class Incomplete(BatchBackend):
+            def submit(self, job_path):
+                return 'batch_1'
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+    def test_near_duplicates_share_requests_and_personalized_drafts(self):
+        outreach = ('I applied last week and wanted to share how my years of on-call, capacity planning and '
+                    'incident review work line up with what your infrastructure team is building this year. '
+                    'Happy to walk through any of it whenever suits you.')
+        names = ['Alice Smith', 'Bruno Garcia', 'Chen Wang']
+        threads = [candidate(i, subject='Interest in SRE role', days_since_last=2,
+                             to=f'{name} <{name.split()[0].lower()}@example.com>',
+                             snippet=f'Hi {name.split()[0]}, {outreach}') for i, name in enumerate(names)]
+        # Same outreach for another role: the analysis is shared but the draft is not
+        threads.append(dict(threads[0], thread_id='t3', subject='Interest in Platform role',
+                            to='Dana Okafor <dana@example.com>', snippet=f'Hi Dana, {outreach}'))
+
+        def respond(body):
+            if 'Analyze this email thread' in body['messages'][0]['content']:
+                return json.dumps(ANALYSIS)
+            return 'Hi Alice Smith, any update, Alice?'
+
+        job = run_ai_batch(threads, self.service, self.backend(respond), name='nightly', directory=self.jobs_dir,
+                           cluster=True)
+
+        with open(os.path.join(self.jobs_dir, 'nightly.jsonl')) as f:
+            custom_ids = [json.loads(line)['custom_id'] for line in f]
+        self.assertEqual(custom_ids, ['t0:urgency', 't0:followup', 't3:followup'])
+        results = job.results
+        self.assertEqual(list(results), ['t0', 't1', 't2', 't3'])
+        self.assertEqual((results['t2']['source'], results['t2']['cluster_of']), ('cluster', 't0'))
+        self.assertEqual(results['t3']['analysis'], ANALYSIS)
+        self.assertEqual(results['t1']['draft'], 'Hi Bruno Garcia, any update, Bruno?')
+        self.assertEqual(results['t2']['draft'], 'Hi Chen Wang, any update, Chen?')
+        self.assertEqual(results['t3']['draft'], 'Hi Alice Smith, any update, Alice?')
+
+    def test_openai_backend(self):
+        client = MagicMock()
+        client.files.create.return_value = SimpleNamespace(id='file-in')
+        client.batches.create.return_value = SimpleNamespace(id='batch_1')
+        client.batches.retrieve.return_value = SimpleNamespace(status='completed', output_file_id='file-out',
+                                                               error_file_id=None)
+        line = {'custom_id': 't0:followup', 'response': {'status_code': 200, 'body': {
+            'choices': [{'message': {'content': 'Hi'}}]}}, 'error': None}
+        client.files.content.return_value = SimpleNamespace(text=json.dumps(line) + '\n')
+
+        job_path = os.path.join(self.temp_dir.name, 'job.jsonl')
+        with open(job_path, 'w') as f:
+            f.write('{}\n')
+        backend = OpenAIBatchBackend(client)
+        self.assertEqual(backend.submit(job_path), 'batch_1')
+        client.batches.create.assert_called_once_with(input_file_id='file-in', endpoint='/v1/chat/completions',
+                                                      completion_window='24h')
+        self.assertEqual(backend.status('batch_1'), 'completed')
+        self.assertEqual(list(backend.results('batch_1')), [line])
+
+    def test_nightly_job_sends_before_the_batch_and_survives_its_failure(self):
+        threads = [candidate(0)]
+        calls = MagicMock()
+        with patch('app.followup_service.AI_BATCH_NIGHTLY', True), \
+             patch('app.followup_service.get_gmail_service'), \
+             patch('app.followup_service.get_threads_to_follow_up', return_value=threads), \
+             patch('app.ai_batch.run_ai_batch', side_effect=RuntimeError('no key')) as batch, \
+             patch('app.followup_service.send_followup_email', return_value=True) as send, \
+             patch('app.followup_service.open_followup_report'), \
+             patch.dict(os.environ, {'DISABLE_SEND_FOLLOWUP': '0'}):
+            calls.attach_mock(send, 'send')
+            calls.attach_mock(batch, 'batch')
+            followup_service.run_followup_and_report()
+
+        batch.assert_called_once_with(threads)
+        send.assert_called_once()
+        # The sends never wait on the batch
+        self.assertEqual([name for name, _, _ in calls.mock_calls], ['send', 'batch'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,362 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import httpx
+from openai import AsyncOpenAI
+
+from app.ai_cache import AIResponseCache, cache_key
+from app.ai_service import AIService, days_bucket, parse_urgency_analysis
+from app.preclassifier import preclassify
+
+
+def fake_client(*contents):
+    client = MagicMock()
+    client.chat.completions.create.side_effect = [
+        SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))]) for content in contents
+    ]
+    return client
+
+
+class FakeStream:
+    """Iterable of chat completion chunks, like the SDK's Stream, recording whether it was closed."""
+
+    def __init__(self, deltas):
+        self.deltas = deltas
+        self.closed = False
+        self.consumed = 0
+
+    def __iter__(self):
+        for delta in self.deltas:
+            self.consumed += 1
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))])
+
+    def close(self):
+        self.closed = True
+
+
+def streaming_client(*deltas):
+    client = MagicMock()
+    client.stream = FakeStream(list(deltas))
+    client.chat.completions.create.return_value = client.stream
+    return client
+
+
+class TestAIResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.path = os.path.join(self.temp_dir.name, 'ai.sqlite3')
+
+    def test_hits_misses_and_ttl(self):
+        cache = AIResponseCache(self.path, ttl_seconds=60)
+        self.assertIsNone(cache.get('k'))
+        cache.put('k', 'answer')
+        self.assertEqual(cache.get('k'), 'answer')
+        self.assertEqual(cache.stats, {'hits': 1, 'misses': 1})
+
+        with patch('app.ai_cache.time.time', return_value=10**10):
+            self.assertIsNone(cache.get('k'))
+
+    def test_lru_eviction(self):
+        cache = AIResponseCache(self.path, max_entries=2, touch_interval=0, evict_every=3)
+        with patch('app.ai_cache.time.time', side_effect=[1.0, 2.0, 3.0, 4.0, 4.0]):
+            cache.put('a', '1')
+            cache.put('b', '2')
+            cache.get('a')
+            cache.put('c', '3')
+        self.assertEqual(len(cache), 2)
+        with patch('app.ai_cache.time.time', return_value=5.0):
+            self.assertIsNone(cache.get('b'))
+            self.assertEqual(cache.get('a'), '1')
+
+    def test_eviction_and_recency_writes_are_amortized(self):
+        cache = AIResponseCache(self.path, max_entries=1, touch_interval=60, evict_every=3)
+        with patch('app.ai_cache.time.time', return_value=100.0):
+            cache.put('a', '1')
+            cache.put('b', '2')
+            self.assertEqual(len(cache), 2)
+        accessed = 'SELECT accessed_at FROM responses WHERE key = ?'
+        with patch('app.ai_cache.time.time', return_value=130.0):
+            cache.get('a')
+            self.assertEqual(cache._connection().execute(accessed, ('a',)).fetchone()[0], 100.0)
+        with patch('app.ai_cache.time.time', return_value=200.0):
+            cache.get('a')
+            self.assertEqual(cache._connection().execute(accessed, ('a',)).fetchone()[0], 200.0)
+            cache.put('c', '3')
+        self.assertEqual(len(cache), 1)
+
+    def test_key_covers_model_version_and_inputs(self):
+        base = cache_key('m', 'urgency', 1, {'thread_content': 'x', 'days': '3-5'})
+        self.assertEqual(base, cache_key('m', 'urgency', 1, {'days': '3-5', 'thread_content': 'x'}))
+        self.assertNotEqual(base, cache_key('m2', 'urgency', 1, {'thread_content': 'x', 'days': '3-5'}))
+        self.assertNotEqual(base, cache_key('m', 'urgency', 2, {'thread_content': 'x', 'days': '3-5'}))
+        self.assertNotEqual(base, cache_key('m', 'urgency', 1, {'thread_content': 'y', 'days': '3-5'}))
+
+
+class TestAIServiceCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.cache = AIResponseCache(os.path.join(self.temp_dir.name, 'ai.sqlite3'))
+
+    def test_days_bucket(self):
+        self.assertEqual([days_bucket(d) for d in (0, 3, 5, 6, 7, 10, 11, 14, 40)],
+                         ['0-2', '3-5', '3-5', '6-6', '7-10', '7-10', '11-13', '14+', '14+'])
+
+    def test_repeat_analysis_is_served_from_cache(self):
+        client = fake_client('{"needs_followup": true}', '{"needs_followup": false}')
+        service = AIService(client=client, cache=self.cache, model='test-model')
+
+        first = service.analyze_thread_urgency('Applied for  the role', 3)
+        # Same content up to whitespace, same days bucket
+        second = service.analyze_thread_urgency('Applied for the role\n', 5)
+
+        self.assertEqual(first, second)
+        self.assertEqual(client.chat.completions.create.call_count, 1)
+        self.assertEqual(client.chat.completions.create.call_args.kwargs['model'], 'test-model')
+        self.assertEqual(self.cache.stats, {'hits': 1, 'misses': 1})
+
+        # Another bucket, or bypassing the cache, calls the model again and stores the fresh answer
+        self.assertEqual(service.analyze_thread_urgency('Applied for the role', 5, use_cache=False),
+                         '{"needs_followup": false}')
+        self.assertEqual(service.analyze_thread_urgency('Applied for the role', 4), '{"needs_followup": false}')
+        self.assertEqual(client.chat.completions.create.call_count, 2)
+
+    def test_followup_email_cache_and_disabled_cache(self):
+        client = fake_client('Hi Ada, ...', 'Hi Ada, again')
+        service = AIService(client=client, cache=self.cache)
+        for _ in range(2):
+            self.assertEqual(service.generate_followup_email('thread', 'Ada', 'last', 8), 'Hi Ada, ...')
+        self.assertEqual(client.chat.completions.create.call_count, 1)
+
+        uncached = AIService(client=fake_client('a', 'b'), cache=False)
+        self.assertEqual([uncached.generate_followup_email('thread', 'Ada', 'last', 8) for _ in range(2)], ['a', 'b'])
+
+    def test_prompt_keeps_exact_inputs(self):
+        client = fake_client('{}')
+        AIService(client=client, cache=False).analyze_thread_urgency('Role {x}', 4)
+        prompt = client.chat.completions.create.call_args.kwargs['messages'][0]['content']
+        self.assertIn('Thread Content: Role {x}', prompt)
+        self.assertIn('Days Since Sent: 4', prompt)
+        self.assertIn('"needs_followup": true/false', prompt)
+
+    def test_quoted_history_is_trimmed_from_prompt(self):
+        client = fake_client('{}', '{}')
+        service = AIService(client=client, cache=self.cache)
+        content = 'Any update on the SRE role?\n\nOn Mon, Ada wrote:\n' + '> earlier text\n' * 200
+        service.analyze_thread_urgency(content, 4)
+        prompt = client.chat.completions.create.call_args.kwargs['messages'][0]['content']
+        self.assertIn('Any update on the SRE role?', prompt)
+        self.assertNotIn('earlier text', prompt)
+        self.assertEqual(service.token_stats['calls'], 1)
+        self.assertGreater(service.token_stats['tokens_saved'], 500)
+
+        # The cache key covers the trimmed text, so a longer quoted history is still a hit
+        service.analyze_thread_urgency(content + '> more\n', 4)
+        self.assertEqual(client.chat.completions.create.call_count, 1)
+
+
+class TestAIServiceStreaming(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.cache = AIResponseCache(os.path.join(self.temp_dir.name, 'ai.sqlite3'))
+
+    def test_stream_yields_deltas_and_caches_completed_drafts(self):
+        client = streaming_client('Hi ', None, 'Ada,', ' following up.')
+        service = AIService(client=client, cache=self.cache)
+
+        self.assertEqual(list(service.stream_followup_email('thread', 'Ada', 'last', 4)),
+                         ['Hi ', 'Ada,', ' following up.'])
+        self.assertTrue(client.stream.closed)
+        self.assertTrue(client.chat.completions.create.call_args.kwargs['stream'])
+        # The finished draft is cached whole, for streaming and blocking callers alike
+        self.assertEqual(list(service.stream_followup_email('thread', 'Ada', 'last', 4)), ['Hi Ada, following up.'])
+        self.assertEqual(service.generate_followup_email('thread', 'Ada', 'last', 4), 'Hi Ada, following up.')
+        self.assertEqual(client.chat.completions.create.call_count, 1)
+
+        metrics = service.metrics()['streams']
+        self.assertEqual((metrics['streams'], metrics['completed'], metrics['cached']), (1, 1, 1))
+        self.assertEqual(metrics['first_tokens'], 1)
+        self.assertIsNotNone(metrics['ttft_seconds_avg'])
+
+    def test_closing_the_generator_cancels_the_model_stream(self):
+        client = streaming_client(*(f'token{i} ' for i in range(100)))
+        service = AIService(client=client, cache=self.cache)
+        drafts = service.stream_followup_email('thread', 'Ada', 'last', 4)
+        self.assertEqual(next(drafts), 'token0 ')
+        drafts.close()
+
+        self.assertTrue(client.stream.closed)
+        self.assertEqual(client.stream.consumed, 1)
+        self.assertEqual(service.stream_stats['cancelled'], 1)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_failed_requests_are_counted(self):
+        client = MagicMock()
+        client.chat.completions.create.side_effect = RuntimeError('connection refused')
+        service = AIService(client=client, cache=self.cache)
+
+        with self.assertRaises(RuntimeError):
+            list(service.stream_followup_email('thread', 'Ada', 'last', 4))
+        self.assertEqual((service.stream_stats['streams'], service.stream_stats['failed']), (1, 1))
+
+
+class ChatCompletionsStub:
+    """Local stand-in for the chat completions endpoint; the thread content picks the answer."""
+
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        assert request.url.path.endswith('/chat/completions')
+        prompt = json.loads(request.content)['messages'][0]['content']
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        if 'server-error' in prompt:
+            return httpx.Response(500, json={'error': {'message': 'boom'}})
+        if 'garbled' in prompt:
+            content = 'I think so?'
+        else:
+            content = ('```json\n{"needs_followup": true, "reason": "No reply", "urgency": "High", '
+                       '"context": "job_application", "original_role": "Engineer"}\n```')
+        return httpx.Response(200, json={
+            'id': 'chatcmpl-stub', 'object': 'chat.completion', 'created': 0, 'model': 'stub',
+            'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': content}}],
+        })
+
+    def client(self) -> AsyncOpenAI:
+        return AsyncOpenAI(api_key='test', base_url='http://stub.local/v1', max_retries=0,
+                           http_client=httpx.AsyncClient(transport=httpx.MockTransport(self.handler)))
+
+
+class TestAIServiceBatch(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.cache = AIResponseCache(os.path.join(self.temp_dir.name, 'ai.sqlite3'))
+        self.stub = ChatCompletionsStub()
+
+    def service(self, cache=None):
+        return AIService(client=MagicMock(), cache=self.cache if cache is None else cache,
+                         async_client=self.stub.client())
+
+    def candidates(self, count, **overrides):
+        return [dict({'thread_id': f't{i}', 'subject': f'Interest in role {i}', 'to': f'r{i}@example.com',
+                      'snippet': 'Following up', 'days_since_last': 4}, **overrides) for i in range(count)]
+
+    def test_parse_urgency_analysis(self):
+        self.assertEqual(parse_urgency_analysis('{"needs_followup": false, "urgency": "low"}'),
+                         {'needs_followup': False, 'reason': '', 'urgency': 'low', 'context': 'other',
+                          'original_role': ''})
+        for bad in ('nope', '{"needs_followup": "yes", "urgency": "low"}', '{"needs_followup": true}',
+                    '{"needs_followup": true, "urgency": "low", "context": "dating"}', '{"needs_followup": tru}'):
+            with self.assertRaises(ValueError):
+                parse_urgency_analysis(bad)
+
+    def test_bounded_concurrency_and_cache(self):
+        service = self.service()
+        with self.assertLogs('app.ai_service', 'INFO') as logs:
+            results = service.analyze_threads_urgency_batch(self.candidates(20), concurrency=3,
+                                                            requests_per_minute=60_000)
+        # Trimming is summed into one line for the batch, not logged per prompt
+        self.assertEqual([record.getMessage().split(':')[0] for record in logs.records], ['Urgency batch'])
+
+        self.assertEqual([r['thread_id'] for r in results], [f't{i}' for i in range(20)])
+        self.assertTrue(all(r['analysis']['urgency'] == 'high' and r['error'] is None for r in results))
+        self.assertEqual(self.stub.requests, 20)
+        self.assertLessEqual(self.stub.max_in_flight, 3)
+
+        again = service.analyze_threads_urgency_batch(self.candidates(20))
+        self.assertEqual(self.stub.requests, 20)
+        self.assertTrue(all(r['cached'] for r in again))
+        self.assertEqual([r['analysis'] for r in again], [r['analysis'] for r in results])
+
+    def test_obvious_threads_skip_the_model(self):
+        service = self.service()
+        threads = self.candidates(3) + [
+            dict(self.candidates(1)[0], thread_id='done', followup_count=10),
+            dict(self.candidates(1)[0], thread_id='shop', subject='Your order receipt', snippet='Paid'),
+        ]
+        with patch('app.ai_service.preclassify_thread', wraps=preclassify) as local:
+            results = {r['thread_id']: r for r in service.analyze_threads_urgency_batch(threads, preclassify=True,
+                                                                                        cluster=True)}
+
+        self.assertEqual(local.call_count, len(threads))
+        self.assertEqual(self.stub.requests, 3)
+        self.assertEqual(results['done']['source'], 'local')
+        self.assertFalse(results['shop']['analysis']['needs_followup'])
+        self.assertEqual(results['t0']['source'], 'model')
+        self.assertEqual(service.source_stats, {'local': 2, 'cache': 0, 'model': 3, 'cluster': 0})
+
+    def test_near_duplicates_share_one_analysis(self):
+        outreach = ('I applied last week and wanted to share how my work on payments infrastructure and '
+                    'observability lines up with what your platform team is building.')
+        threads = [{'thread_id': f'd{i}', 'subject': 'Interest in Platform Engineer role', 'days_since_last': 2,
+                    'to': f'{name} <{name.lower()}@example.com>', 'snippet': f'Hi {name}, {outreach}'}
+                   for i, name in enumerate(['Alice', 'Bruno', 'Chen'])] + self.candidates(1)
+        service = self.service()
+        results = service.analyze_threads_urgency_batch(threads, cluster=True)
+
+        self.assertEqual(self.stub.requests, 2)
+        self.assertEqual([r['thread_id'] for r in results], ['d0', 'd1', 'd2', 't0'])
+        self.assertEqual((results[0]['source'], results[1]['source']), ('model', 'cluster'))
+        self.assertEqual(results[2]['cluster_of'], 'd0')
+        self.assertEqual(results[2]['analysis'], results[0]['analysis'])
+        self.assertIsNot(results[2]['analysis'], results[0]['analysis'])
+        self.assertEqual(service.source_stats['cluster'], 2)
+
+        self.service(cache=False).analyze_threads_urgency_batch(threads, cluster=False)
+        self.assertEqual(self.stub.requests, 6)
+
+    def test_near_duplicates_of_different_ages_are_analyzed_separately(self):
+        outreach = ('I applied last week and wanted to share how my work on payments infrastructure and '
+                    'observability lines up with what your platform team is building.')
+        threads = [{'thread_id': f'd{i}', 'subject': 'Interest in Platform Engineer role', 'days_since_last': days,
+                    'to': f'{name} <{name.lower()}@example.com>', 'snippet': f'Hi {name}, {outreach}'}
+                   for i, (name, days) in enumerate([('Alice', 2), ('Bruno', 25)])]
+        results = self.service().analyze_threads_urgency_batch(threads, cluster=True, preclassify=False)
+
+        self.assertEqual(self.stub.requests, 2)
+        self.assertEqual([r['source'] for r in results], ['model', 'model'])
+
+    def test_partial_results(self):
+        threads = self.candidates(2) + [
+            {'thread_id': 'bad', 'thread_content': 'server-error', 'days_since_sent': 3},
+            {'thread_id': 'odd', 'thread_content': 'garbled', 'days_since_sent': 3},
+        ]
+        results = {r['thread_id']: r for r in self.service().analyze_threads_urgency_batch(threads)}
+
+        self.assertIsNotNone(results['t0']['analysis'])
+        self.assertIsNone(results['bad']['analysis'])
+        self.assertIn('500', results['bad']['error'])
+        self.assertIsNone(results['odd']['analysis'])
+        self.assertIn('JSON', results['odd']['error'])
+        # The unparseable answer was not cached
+        self.assertEqual(len(self.cache), 2)
+
+    def test_requests_per_minute_budget(self):
+        self.stub.delay = 0
+        started = time.monotonic()
+        self.service(cache=False).analyze_threads_urgency_batch(self.candidates(6), concurrency=6,
+                                                                requests_per_minute=120)
+        # 2 requests/s: two start at once, the other four wait half a second each
+        self.assertGreaterEqual(time.monotonic() - started, 1.8)
+
+
+if __name__ == '__main__':
+    unittest.main()
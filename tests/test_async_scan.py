@@ -0,0 +1,166 @@
+import asyncio
+import datetime
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+
+import httpx
+
+from app import asgi, email_service
+from app.async_gmail import AsyncGmailClient, iterate_async
+from app.scan_cache import ScanCache
+
+
+class FakeMailbox:
+    """Serves the Gmail REST endpoints the scan uses from canned threads."""
+
+    def __init__(self, user_email, threads):
+        self.user_email = user_email
+        self.threads = threads
+        self.requests = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        path = request.url.path.rsplit('/users/me/', 1)[1]
+        if path == 'profile':
+            return httpx.Response(200, json={'emailAddress': self.user_email})
+        if path == 'messages':
+            return httpx.Response(200, json={'messages': [{'id': f'{tid}_0', 'threadId': tid} for tid in self.threads]})
+        if path.startswith('threads/'):
+            return httpx.Response(200, json=self.threads[path.split('/', 1)[1]])
+        return httpx.Response(404)
+
+
+class TestAsyncScan(unittest.TestCase):
+    def setUp(self):
+        self.user_email = 'me@example.com'
+        sent = (datetime.datetime.utcnow() - datetime.timedelta(days=3)).timestamp() * 1000
+        self.threads = {}
+        for i, subject in enumerate(['Interest in Product', 'Interest in Backend', 'Quick question']):
+            self.threads[f't{i}'] = {'id': f't{i}', 'messages': [{
+                'id': f't{i}_0',
+                'threadId': f't{i}',
+                'payload': {'headers': [
+                    {'name': 'Subject', 'value': subject},
+                    {'name': 'To', 'value': 'recipient@example.com'},
+                    {'name': 'From', 'value': self.user_email},
+                ]},
+                'internalDate': str(int(sent)),
+                'snippet': subject,
+            }]}
+        self.mailbox = FakeMailbox(self.user_email, self.threads)
+        self.credentials = MagicMock(valid=True, token='token')
+        report_patch = patch('app.report_service.open_followup_report')
+        self.mock_report = report_patch.start()
+        self.addCleanup(report_patch.stop)
+
+    def client(self):
+        return AsyncGmailClient(self.credentials, transport=httpx.MockTransport(self.mailbox.handler))
+
+    def test_async_scan_matches_sync_filtering(self):
+        async def scan():
+            async with self.client() as client:
+                return [t async for t in email_service.aget_threads_to_follow_up(client)]
+
+        threads = asyncio.run(scan())
+
+        self.assertEqual([t['thread_id'] for t in threads], ['t0', 't1'])
+        sink = self.mock_report.return_value
+        self.assertEqual([c.args[0] for c in sink.write.call_args_list], threads)
+        sink.close.assert_called_once_with()
+        thread_request = next(r for r in self.mailbox.requests if '/threads/' in r.url.path)
+        self.assertEqual(thread_request.headers['authorization'], 'Bearer token')
+        self.assertEqual(thread_request.url.params['format'], 'metadata')
+        self.assertEqual(thread_request.url.params.get_list('metadataHeaders'),
+                         email_service.SCAN_METADATA_HEADERS)
+
+    def test_sync_adapter(self):
+        async def scan():
+            async with self.client() as client:
+                async for thread in email_service.aget_threads_to_follow_up(client):
+                    yield thread
+
+        threads = list(iterate_async(scan))
+
+        self.assertEqual([t['thread_id'] for t in threads], ['t0', 't1'])
+
+    def serve_stream(self, cache, headers=()):
+        sent = []
+
+        async def receive():
+            await asyncio.sleep(3600)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'path': asgi.STREAM_PATH, 'headers': list(headers), 'query_string': b''}
+        provider = MagicMock()
+        provider.credentials.return_value = self.credentials
+        with patch('app.asgi.get_scan_cache', return_value=cache), \
+                patch('app.asgi.get_service_provider', return_value=provider), \
+                patch('app.asgi.AsyncGmailClient', side_effect=lambda credentials: self.client()):
+            asyncio.run(asgi.asgi_app(scope, receive, send))
+        return sent
+
+    @staticmethod
+    def frames(sent):
+        body = b''.join(m['body'] for m in sent[1:]).decode()
+        return [dict(line.split(': ', 1) for line in frame.splitlines() if not line.startswith(':'))
+                for frame in body.split('\n\n') if frame and not frame.startswith(':')]
+
+    def test_asgi_stream_route(self):
+        cache = ScanCache()
+        sent = self.serve_stream(cache)
+
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn((b'cache-control', b'no-cache'), sent[0]['headers'])
+        frames = self.frames(sent)
+        self.assertIn('retry', frames[0])
+        events = [json.loads(f['data']) for f in frames[1:]]
+        self.assertEqual([e['type'] for e in events], ['threads', 'threads', 'complete'])
+        self.assertEqual([e['threads'][0]['thread_id'] for e in events[:2]], ['t0', 't1'])
+        self.assertEqual(frames[1]['id'], f"{cache.get('me', list).id}:1")
+        self.assertFalse(sent[-1]['more_body'])
+
+    def test_asgi_stream_resumes_from_the_cached_scan(self):
+        cache = ScanCache()
+        first = self.frames(self.serve_stream(cache))
+        scanned = len(self.mailbox.requests)
+
+        resumed = self.frames(self.serve_stream(cache, [(b'last-event-id', first[1]['id'].encode())]))
+
+        self.assertEqual(len(self.mailbox.requests), scanned)
+        events = [json.loads(f['data']) for f in resumed[1:]]
+        self.assertEqual([e['type'] for e in events], ['threads', 'complete'])
+        self.assertEqual(events[0]['threads'][0]['thread_id'], 't1')
+
+    def test_asgi_draft_stream_closes_the_draft_on_disconnect(self):
+        sent = []
+        disconnected = asyncio.Event()
+        drafts = MagicMock()
+        drafts.__next__.side_effect = ['Hi ', 'Ada', StopIteration]
+        ai = MagicMock()
+        ai.stream_followup_email.return_value = drafts
+
+        async def receive():
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+            if len(sent) == 2:
+                disconnected.set()
+                await asyncio.sleep(3600)
+
+        scope = {'type': 'http', 'path': asgi.DRAFT_STREAM_PATH, 'headers': [],
+                 'query_string': b'to=ada%40example.com&days=4'}
+        with patch('app.asgi.get_ai_service', return_value=ai):
+            asyncio.run(asgi.asgi_app(scope, receive, send))
+
+        self.assertEqual(json.loads(sent[1]['body'].decode()[len('data: '):]), {'type': 'token', 'text': 'Hi '})
+        self.assertEqual(len(sent), 2)
+        drafts.close.assert_called_once_with()
+        self.assertEqual(ai.stream_followup_email.call_args.args[3], 4)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from app import blacklist_service
+from app.blacklist_service import BlacklistIndex
+
+
+class TestBlacklistIndex(unittest.TestCase):
+    def test_rule_kinds(self):
+        index = BlacklistIndex(['Interest in Ops'], [
+            'prefix:Interest in Data',
+            'contains:  RECRUITING ',
+            'glob:interest in * lead',
+            'glob:quick ?uestion',
+        ])
+
+        self.assertTrue(index.matches('interest in  ops'))
+        self.assertFalse(index.matches('Interest in Ops Lead role'))
+        self.assertTrue(index.matches('Interest in Data Engineering'))
+        self.assertTrue(index.matches('Re: Recruiting pipeline'))
+        self.assertTrue(index.matches('Interest in Platform Lead'))
+        self.assertFalse(index.matches('Interest in Platform Lead role'))
+        self.assertTrue(index.matches('Quick question'))
+        self.assertFalse(index.matches('Interest in Backend Role'))
+        self.assertFalse(index.matches(''))
+        self.assertIn('interest in ops', index)
+        self.assertEqual(index.exact, {'interest in ops'})
+
+    def test_subject_that_looks_like_a_rule_stays_exact(self):
+        index = BlacklistIndex(['Contains: offer', 'prefix: Interest'], ['exact:Interest in Ops'])
+
+        self.assertTrue(index.matches('contains: offer'))
+        self.assertFalse(index.matches('Job offer from Corp'))
+        self.assertFalse(index.matches('Interest in Ops'))
+        self.assertEqual(index.exact, {'contains: offer', 'prefix: interest'})
+
+    def test_add_updates_matchers_in_place(self):
+        index = BlacklistIndex(rules=['contains:hiring'])
+        self.assertTrue(index.add_rule('contains:platform'))
+        self.assertFalse(index.add_rule('CONTAINS:Platform'))
+        self.assertFalse(index.add_rule('prefix:'))
+        self.assertTrue(index.add_rule('prefix:re: interest'))
+        with self.assertRaises(ValueError):
+            index.add_rule('Interest in QA')
+
+        self.assertTrue(index.matches('Interest in Platform Role'))
+        self.assertTrue(index.matches('Re: Interest in QA'))
+        self.assertTrue(index.matches('we are hiring'))
+        self.assertEqual(len(index), 3)
+
+
+class TestBlacklistFile(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.path = os.path.join(temp_dir.name, 'blacklist.txt')
+        self.rules_path = os.path.join(temp_dir.name, 'blacklist_rules.txt')
+        for patcher in (patch('app.blacklist_service.BLACKLIST_FILE', self.path),
+                        patch('app.blacklist_service.BLACKLIST_RULES_FILE', self.rules_path),
+                        patch('app.blacklist_service.get_scan_cache')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_index_is_cached_until_the_file_changes(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('Interest in Ops\n')
+        first = blacklist_service.load_blacklisted_subjects()
+        self.assertIs(blacklist_service.load_blacklisted_subjects(), first)
+
+        with open(self.rules_path, 'w', encoding='utf-8') as f:
+            f.write('prefix:Interest in QA\n')
+        reloaded = blacklist_service.load_blacklisted_subjects()
+        self.assertIsNot(reloaded, first)
+        self.assertTrue(blacklist_service.is_subject_blacklisted('Interest in QA Lead'))
+
+    def test_added_subject_that_looks_like_a_rule_stays_exact(self):
+        self.assertTrue(blacklist_service.add_subject_to_blacklist('contains: offer'))
+
+        self.assertTrue(blacklist_service.is_subject_blacklisted('Contains: Offer'))
+        self.assertFalse(blacklist_service.is_subject_blacklisted('Your offer letter'))
+        self.assertFalse(os.path.exists(self.rules_path))
+
+    def test_concurrent_appends_write_each_rule_once(self):
+        subjects = [f'Interest in Role {i % 20}' for i in range(200)]
+        results = []
+        threads = [threading.Thread(target=lambda s=s: results.append(blacklist_service.add_subject_to_blacklist(s)))
+                   for s in subjects]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        with open(self.path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        self.assertEqual(sorted(lines), sorted(set(subjects)))
+        self.assertEqual(results.count(True), 20)
+        index = blacklist_service.load_blacklisted_subjects()
+        self.assertIs(index, blacklist_service.load_blacklisted_subjects())
+        self.assertEqual(len(index), 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
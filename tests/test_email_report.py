@@ -1,10 +1,15 @@
 import unittest
 from unittest.mock import MagicMock, patch
+from googleapiclient.errors import HttpError
 from app import email_service
 from app import blacklist_service
+from app.rate_limiter import GmailScheduler
+from app.thread_model import ParsedMessage
 import os
 import datetime
 import tempfile
+import threading
+import time
 
 class TestEmailService(unittest.TestCase):
     def setUp(self):
@@ -34,7 +39,7 @@ class TestEmailService(unittest.TestCase):
             })
         return {'messages': messages}
 
-    @patch('app.report_service.generate_followup_report')
+    @patch('app.report_service.open_followup_report')
     def test_get_threads_multiple_batches(self, mock_report):
         # Patch datetime inside email_service
         with patch('app.email_service.datetime') as mock_datetime:
@@ -57,7 +62,7 @@ class TestEmailService(unittest.TestCase):
                     msg['payload']['headers'].append({'name': 'From', 'value': self.test_email})
                 thread['messages'][0]['payload']['headers'][0]['value'] = 'Interest in Product'
                 thread_responses[f't{i}'] = thread
-            def mock_get_thread(userId, id):
+            def mock_get_thread(userId, id, **kwargs):
                 mock = MagicMock()
                 mock.execute.return_value = thread_responses[id]
                 return mock
@@ -67,7 +72,7 @@ class TestEmailService(unittest.TestCase):
             self.assertEqual(self.mock_service.users().messages().list().execute.call_count, 3)
             mock_report.assert_called_once()
 
-    @patch('app.report_service.generate_followup_report')
+    @patch('app.report_service.open_followup_report')
     def test_get_threads_with_varying_lengths(self, mock_report):
         with patch('app.email_service.datetime') as mock_datetime:
             mock_datetime.datetime.utcnow.return_value = self.current_time
@@ -88,7 +93,7 @@ class TestEmailService(unittest.TestCase):
                     msg['payload']['headers'].append({'name': 'From', 'value': self.test_email})
                 thread['messages'][0]['payload']['headers'][0]['value'] = 'Interest in Product'
                 thread_responses[f't{i}'] = thread
-            def mock_get_thread(userId, id):
+            def mock_get_thread(userId, id, **kwargs):
                 mock = MagicMock()
                 mock.execute.return_value = thread_responses[id]
                 return mock
@@ -98,7 +103,7 @@ class TestEmailService(unittest.TestCase):
             for i, thread in enumerate(threads):
                 self.assertEqual(thread['followup_count'], thread_lengths[i] - 1)
 
-    @patch('app.report_service.generate_followup_report')
+    @patch('app.report_service.open_followup_report')
     def test_excludes_threads_older_than_max_days(self, mock_report):
         with patch('app.email_service.datetime') as mock_datetime:
             mock_datetime.datetime.utcnow.return_value = self.current_time
@@ -129,7 +134,7 @@ class TestEmailService(unittest.TestCase):
                 'too-old': old_thread,
             }
 
-            def mock_get_thread(userId, id):
+            def mock_get_thread(userId, id, **kwargs):
                 mock = MagicMock()
                 mock.execute.return_value = thread_responses[id]
                 return mock
@@ -142,7 +147,7 @@ class TestEmailService(unittest.TestCase):
             self.assertEqual(threads[0]['thread_id'], 'within-window')
             mock_report.assert_called_once()
 
-    @patch('app.report_service.generate_followup_report')
+    @patch('app.report_service.open_followup_report')
     def test_excludes_blacklisted_subjects(self, mock_report):
         with patch('app.email_service.datetime') as mock_datetime, \
              patch('app.email_service.load_blacklisted_subjects', return_value={'interest in product'}):
@@ -160,7 +165,7 @@ class TestEmailService(unittest.TestCase):
                 msg['payload']['headers'].append({'name': 'From', 'value': self.test_email})
             thread['messages'][0]['payload']['headers'][0]['value'] = 'Interest in Product'
 
-            def mock_get_thread(userId, id):
+            def mock_get_thread(userId, id, **kwargs):
                 mock = MagicMock()
                 mock.execute.return_value = thread
                 return mock
@@ -170,7 +175,186 @@ class TestEmailService(unittest.TestCase):
             threads = email_service.get_threads_to_follow_up(self.mock_service)
 
             self.assertEqual(threads, [])
-            mock_report.assert_called_once_with([])
+            mock_report.assert_called_once_with()
+            mock_report.return_value.write.assert_not_called()
+            mock_report.return_value.close.assert_called_once_with()
+
+    def _mock_batch_service(self, thread_responses, failures=None):
+        """Wire new_batch_http_request to a fake batch that replays canned responses."""
+        failures = failures or {}
+        batch_sizes = []
+
+        def new_batch(callback):
+            requests = []
+            batch = MagicMock()
+            batch.add.side_effect = lambda req, request_id: requests.append(request_id)
+
+            def execute():
+                batch_sizes.append(len(requests))
+                for request_id in requests:
+                    pending = failures.get(request_id)
+                    if pending:
+                        status = pending.pop(0)
+                        callback(request_id, None, HttpError(MagicMock(status=status), b'error'))
+                    else:
+                        callback(request_id, thread_responses[request_id], None)
+            batch.execute.side_effect = execute
+            return batch
+
+        self.mock_service.new_batch_http_request.side_effect = new_batch
+        return batch_sizes
+
+    @patch('app.report_service.open_followup_report')
+    def test_batch_mode_matches_sequential_order(self, mock_report):
+        with patch('app.email_service.datetime') as mock_datetime:
+            mock_datetime.datetime.utcnow.return_value = self.current_time
+            mock_datetime.datetime.utcfromtimestamp = datetime.datetime.utcfromtimestamp
+            mock_datetime.timedelta = datetime.timedelta
+            self.mock_service.users().getProfile().execute.return_value = {'emailAddress': self.test_email}
+            page = {'messages': [{'threadId': f't{i}'} for i in (3, 1, 3, 2, 5, 4)]}
+            self.mock_service.users().messages().list().execute.return_value = page
+            base_date = self.current_time - datetime.timedelta(days=5)
+            thread_responses = {f't{i}': self.create_mock_thread(i, 1, base_date) for i in range(1, 6)}
+
+            def mock_get_thread(userId, id, **kwargs):
+                mock = MagicMock()
+                mock.execute.return_value = thread_responses[id]
+                return mock
+            self.mock_service.users().threads().get.side_effect = mock_get_thread
+
+            sequential = email_service.get_threads_to_follow_up(self.mock_service, 'sequential')
+            with patch('app.email_service.THREAD_BATCH_SIZE', 2):
+                batch_sizes = self._mock_batch_service(thread_responses)
+                batched = email_service.get_threads_to_follow_up(self.mock_service, 'batch')
+
+            self.assertEqual([t['thread_id'] for t in sequential], ['t3', 't1', 't2', 't5', 't4'])
+            self.assertEqual(batched, sequential)
+            self.assertEqual(batch_sizes, [2, 2, 1])
+
+    @patch('app.email_service.time.sleep')
+    def test_fetch_threads_batched_retries_transient_failures(self, mock_sleep):
+        base_date = self.current_time - datetime.timedelta(days=5)
+        thread_responses = {f't{i}': self.create_mock_thread(i, 1, base_date) for i in range(1, 4)}
+        batch_sizes = self._mock_batch_service(thread_responses, failures={'t2': [429, 503], 't3': [404]})
+
+        with patch('app.email_service.get_gmail_scheduler', return_value=GmailScheduler()):
+            fetched = email_service.fetch_threads_batched(self.mock_service, ['t1', 't2', 't3'], batch_size=10)
+
+        self.assertEqual(sorted(fetched), ['t1', 't2'])
+        self.assertEqual(batch_sizes, [3, 1, 1])
+        self.assertEqual(mock_sleep.call_count, 2)
+
+    def test_send_followups_bulk_fetches_profile_and_threads_once(self):
+        base_date = self.current_time - datetime.timedelta(days=5)
+        thread_responses = {f't{i}': self.create_mock_thread(i, 2, base_date) for i in range(1, 4)}
+        batch_sizes = self._mock_batch_service(thread_responses, failures={'t3': [404]})
+        self.mock_service.users().getProfile().execute.return_value = {'emailAddress': self.test_email}
+        items = [{'thread_id': 't1', 'to': 'scan@example.com', 'subject': 'Interest in Product'}, 't2', 't3']
+
+        with patch('app.email_service.DISABLE_SEND_FOLLOWUP', False), \
+             patch('app.email_service.get_gmail_scheduler', return_value=GmailScheduler()), \
+             patch('app.email_service.get_scan_cache') as mock_cache:
+            results = {r['thread_id']: r for r in email_service.send_followups_bulk(self.mock_service, items)}
+
+        self.assertEqual(batch_sizes, [3])
+        self.assertEqual(self.mock_service.users().getProfile().execute.call_count, 1)
+        self.assertTrue(results['t1']['success'])
+        self.assertEqual(results['t1']['to'], 'scan@example.com')
+        self.assertTrue(results['t2']['success'])
+        self.assertEqual(results['t2']['to'], 'recipient@example.com')
+        self.assertFalse(results['t3']['success'])
+        self.assertIn('error', results['t3'])
+        sent = [c.kwargs['body'] for c in self.mock_service.users().messages().send.call_args_list]
+        self.assertEqual(sorted(body['threadId'] for body in sent), ['t1', 't2'])
+        raw = email_service.base64.urlsafe_b64decode(next(b for b in sent if b['threadId'] == 't1')['raw']).decode()
+        self.assertIn('to: scan@example.com', raw)
+        self.assertIn(email_service.FOLLOWUP_TEMPLATES[1].splitlines()[0], raw)
+        # Cached scans are dropped once for the whole bulk send
+        mock_cache.return_value.invalidate.assert_called_once_with()
+
+    @patch('app.report_service.open_followup_report')
+    def test_parallel_mode_ordering(self, mock_report):
+        with patch('app.email_service.datetime') as mock_datetime, \
+             patch('app.email_service.SCAN_WORKERS', 3):
+            mock_datetime.datetime.utcnow.return_value = self.current_time
+            mock_datetime.datetime.utcfromtimestamp = datetime.datetime.utcfromtimestamp
+            mock_datetime.timedelta = datetime.timedelta
+            self.mock_service.users().getProfile().execute.return_value = {'emailAddress': self.test_email}
+            self.mock_service.users().messages().list().execute.side_effect = [
+                {'messages': [{'threadId': f't{i}'} for i in range(1, 6)], 'nextPageToken': 'token1'},
+                {'messages': [{'threadId': f't{i}'} for i in range(6, 11)]},
+            ] * 2
+            base_date = self.current_time - datetime.timedelta(days=5)
+            thread_responses = {f't{i}': self.create_mock_thread(i, 1, base_date) for i in range(1, 11)}
+            transports = []
+
+            def mock_get_thread(userId, id, **kwargs):
+                mock = MagicMock()
+
+                def execute(http=None):
+                    transports.append(http)
+                    # Finish early threads last so arrival order differs from page order
+                    time.sleep(0.001 * (10 - int(id[1:])))
+                    return thread_responses[id]
+                mock.execute.side_effect = execute
+                return mock
+            self.mock_service.users().threads().get.side_effect = mock_get_thread
+
+            ordered = email_service.get_threads_to_follow_up(self.mock_service, 'parallel', ordered=True)
+            arrival = email_service.get_threads_to_follow_up(self.mock_service, 'parallel', ordered=False)
+
+            self.assertEqual([t['thread_id'] for t in ordered], [f't{i}' for i in range(1, 11)])
+            self.assertEqual(sorted(t['thread_id'] for t in arrival), sorted(t['thread_id'] for t in ordered))
+            self.assertEqual(len(transports), 20)
+
+    def test_parallel_arrival_order_yields_finished_threads_first(self):
+        release = threading.Event()
+
+        def evaluate(thread_id, thread):
+            # The first listed thread cannot finish until the second one has been yielded
+            if thread_id == 'slow':
+                self.assertTrue(release.wait(5))
+            return thread_id
+
+        self.mock_service.users().threads().get().execute.return_value = {'messages': []}
+        arrival = email_service._iter_parallel(self.mock_service, ['slow', 'fast'], evaluate, 2, ordered=False)
+        first = next(arrival)
+        release.set()
+        self.assertEqual([first] + list(arrival), ['fast', 'slow'])
+
+        listing = list(email_service._iter_parallel(self.mock_service, ['slow', 'fast'], evaluate, 2, ordered=True))
+        self.assertEqual(listing, ['slow', 'fast'])
+
+    def test_parallel_workers_get_their_own_transport(self):
+        credentials = MagicMock()
+        self.mock_service._http = email_service.AuthorizedHttp(credentials, http=MagicMock())
+        factory = email_service._worker_http_factory(self.mock_service)
+
+        first, second = factory(), factory()
+
+        self.assertIsNot(first.http, second.http)
+        self.assertIsNot(first.http, self.mock_service._http.http)
+        self.assertIs(first.credentials, credentials)
+        self.assertIsNone(email_service._worker_http_factory(MagicMock()))
+
+    @patch('app.report_service.open_followup_report')
+    def test_scan_uses_metadata_profile(self, mock_report):
+        self.mock_service.users().getProfile().execute.return_value = {'emailAddress': self.test_email}
+        self.mock_service.users().messages().list().execute.return_value = {'messages': [{'threadId': 't1'}]}
+        self.mock_service.users().threads().get().execute.return_value = {'messages': []}
+
+        email_service.get_threads_to_follow_up(self.mock_service, 'sequential')
+
+        _, get_kwargs = self.mock_service.users().threads().get.call_args
+        self.assertEqual(get_kwargs['format'], 'metadata')
+        self.assertEqual(set(get_kwargs['metadataHeaders']), {'From', 'Subject', 'To', 'Message-ID'})
+        self.assertNotIn('parts', get_kwargs['fields'])
+        _, list_kwargs = self.mock_service.users().messages().list.call_args
+        self.assertEqual(list_kwargs['fields'], 'messages(id,threadId),nextPageToken')
+
+    def test_unknown_fetch_mode_rejected(self):
+        with self.assertRaises(ValueError):
+            next(email_service.get_threads_to_follow_up_generator(self.mock_service, 'bogus'))
 
     def test_blacklist_service_persists_subjects(self):
         with tempfile.TemporaryDirectory() as temp_dir:
@@ -206,5 +390,24 @@ class TestEmailService(unittest.TestCase):
         self.assertFalse(email_service.is_from_user(malformed_msg, self.test_email))
         self.assertFalse(email_service.is_from_user(completely_malformed_msg, self.test_email))
 
+    def test_parsed_message_matches_header_scan(self):
+        msg = {'id': 'm1', 'internalDate': '1700000000000', 'payload': {'headers': [
+            {'name': 'Received', 'value': 'by mx'},
+            {'name': 'SUBJECT', 'value': 'Interest in Product'},
+            {'name': 'Subject', 'value': 'Duplicate'},
+            {'name': 'from', 'value': f'Me <{self.test_email}>'},
+            {'name': 'Message-Id', 'value': '<abc@example.com>'},
+            {'name': 'X-Mailer', 'value': 'Gmail'},
+        ]}}
+        parsed = ParsedMessage(msg)
+
+        for name in ('Subject', 'From', 'To', 'Message-ID', 'X-Mailer', 'Received', 'Missing'):
+            self.assertEqual(email_service.get_header(parsed, name), email_service.get_header(msg, name), name)
+        self.assertTrue(email_service.is_from_user(parsed, self.test_email))
+        self.assertEqual(parsed.timestamp, 1700000000)
+        self.assertEqual(email_service.count_followups([parsed, msg]), 0)
+        self.assertEqual(ParsedMessage({}).header('subject'), '')
+        self.assertEqual(ParsedMessage({'payload': {'headers': [{'name': 'Subject'}]}}).header('subject'), '')
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,170 @@
+import datetime
+import re
+import unittest
+from unittest.mock import MagicMock, patch
+
+from app import email_service
+from app.gmail_query import compile_followup_query
+
+TERM_RE = re.compile(r'(-?)(\w+):("[^"]*"|\'[^\']*\'|\S+)')
+
+
+def _words(text):
+    return re.findall(r'\w+', text.lower())
+
+
+def _has_phrase(text, phrase):
+    words, target = _words(text), _words(phrase)
+    return any(words[i:i + len(target)] == target for i in range(len(words) - len(target) + 1))
+
+
+class FakeGmailSearch:
+    """Evaluates the operators the scan emits, per message, like Gmail search does."""
+
+    def __init__(self, user_email, threads):
+        self.user_email = user_email
+        self.threads = threads
+
+    def matches(self, message, query):
+        headers = {h['name'].lower(): h['value'] for h in message['payload']['headers']}
+        sent_ts = int(message['internalDate']) // 1000
+        for negate, op, value in TERM_RE.findall(query):
+            value = value.strip('"\'')
+            if op == 'label':
+                hit = value in message['labelIds']
+            elif op == 'from':
+                hit = self.user_email in headers['from'] if value == 'me' else value in headers['from']
+            elif op == 'after':
+                hit = sent_ts > int(value)
+            elif op == 'before':
+                hit = sent_ts < int(value)
+            elif op == 'subject':
+                hit = _has_phrase(headers['subject'], value)
+            else:
+                raise AssertionError(f'unexpected operator {op}')
+            if hit == bool(negate):
+                return False
+        return True
+
+    def list_messages(self, userId, q, **kwargs):
+        mock = MagicMock()
+        mock.execute.return_value = {'messages': [
+            {'id': m['id'], 'threadId': t['id']}
+            for t in self.threads.values() for m in t['messages'] if self.matches(m, q)
+        ]}
+        return mock
+
+    def list_threads(self, userId, q, **kwargs):
+        mock = MagicMock()
+        mock.execute.return_value = {'threads': [
+            {'id': t['id'], 'historyId': '1'}
+            for t in self.threads.values() if any(self.matches(m, q) for m in t['messages'])
+        ]}
+        return mock
+
+    def get_thread(self, userId, id, **kwargs):
+        mock = MagicMock()
+        mock.execute.return_value = self.threads[id]
+        return mock
+
+
+class TestGmailQuery(unittest.TestCase):
+    def setUp(self):
+        self.now = datetime.datetime.utcnow()
+        self.user_email = 'me@example.com'
+
+    def test_compiles_base_terms(self):
+        compiled = compile_followup_query(self.now, list_method='messages')
+
+        self.assertTrue(compiled.q.startswith('label:SENT after:'))
+        self.assertIn('before:', compiled.q)
+        self.assertTrue(compiled.q.endswith("subject:'Interest in'"))
+        self.assertNotIn('-subject:', compiled.q)
+        unbounded = compile_followup_query(self.now, bounded=False, list_method='messages')
+        self.assertNotIn('before:', unbounded.q)
+
+    def test_unknown_list_method_rejected(self):
+        with self.assertRaises(ValueError):
+            compile_followup_query(self.now, list_method='drafts')
+
+    def thread(self, thread_id, subjects, days_ago=3, reply_from=None):
+        sent = self.now - datetime.timedelta(days=days_ago)
+        messages = []
+        for i, subject in enumerate(subjects):
+            sender = reply_from if reply_from and i == len(subjects) - 1 else self.user_email
+            messages.append({
+                'id': f'{thread_id}_{i}',
+                'threadId': thread_id,
+                'labelIds': ['INBOX'] if sender != self.user_email else ['SENT'],
+                'payload': {'headers': [
+                    {'name': 'Subject', 'value': subject},
+                    {'name': 'To', 'value': 'recipient@example.com'},
+                    {'name': 'From', 'value': sender},
+                ]},
+                'internalDate': str(int((sent + datetime.timedelta(minutes=i)).timestamp() * 1000)),
+                'snippet': subject,
+            })
+        return {'id': thread_id, 'messages': messages}
+
+    def select(self, threads, blacklist, **compile_kwargs):
+        search = FakeGmailSearch(self.user_email, threads)
+        service = MagicMock()
+        service.users().getProfile().execute.return_value = {'emailAddress': self.user_email}
+        service.users().messages().list.side_effect = search.list_messages
+        service.users().threads().list.side_effect = search.list_threads
+        service.users().threads().get.side_effect = search.get_thread
+
+        def compile_with(now):
+            return compile_followup_query(now, **compile_kwargs)
+
+        with patch('app.email_service.load_blacklisted_subjects', return_value=blacklist), \
+             patch('app.email_service.compile_followup_query', side_effect=compile_with), \
+             patch('app.report_service.open_followup_report'):
+            selected = email_service.get_threads_to_follow_up(service, 'sequential', incremental=False)
+        return {t['thread_id'] for t in selected}, service.users().threads().get.call_count
+
+    def baseline(self, threads, blacklist):
+        """Apply the listing query and the local checks to every thread."""
+        query = compile_followup_query(self.now, list_method='messages').q
+        search = FakeGmailSearch(self.user_email, threads)
+        listed = {t['id'] for t in threads.values() if any(search.matches(m, query) for m in t['messages'])}
+        return {tid for tid in listed
+                if email_service._evaluate_thread(tid, threads[tid], self.user_email, self.now, blacklist)}
+
+    def test_selected_threads_unchanged(self):
+        threads = {t['id']: t for t in [
+            self.thread('plain', ['Interest in Backend Role']),
+            self.thread('followed-up', ['Interest in Data Role', 'Re: Interest in Data Role']),
+            self.thread('blacklisted', ['Interest in Ops']),
+            self.thread('blacklisted-reply', ['Interest in QA Role', 'Re: Interest in QA Role']),
+            self.thread('replied', ['Interest in Infra Role', 'Re: Interest in Infra Role'],
+                        reply_from='Recruiter <r@corp.example>'),
+            self.thread('other-subject', ['Quick question']),
+            self.thread('too-recent', ['Interest in ML Role'], days_ago=0),
+            self.thread('too-old', ['Interest in Web Role'], days_ago=60),
+        ]}
+        blacklist = {'interest in ops', 're: interest in qa role'}
+        expected = self.baseline(threads, blacklist)
+        self.assertEqual(expected, {'plain', 'followed-up'})
+
+        for list_method in ('messages', 'threads'):
+            selected, _ = self.select(threads, blacklist, list_method=list_method)
+            self.assertEqual(selected, expected, list_method)
+
+    def test_default_compile_keeps_superstring_subjects(self):
+        threads = {t['id']: t for t in [
+            self.thread('ops', ['Interest in Ops']),
+            self.thread('ops-lead', ['Interest in Ops Lead']),
+            self.thread('ops-followed-up', ['Interest in Ops', 'Re: Interest in Ops']),
+        ]}
+        blacklist = {'interest in ops'}
+        expected = self.baseline(threads, blacklist)
+
+        selected, _ = self.select(threads, blacklist, list_method='messages')
+
+        self.assertEqual(expected, {'ops-lead', 'ops-followed-up'})
+        self.assertEqual(selected, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
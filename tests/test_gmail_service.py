@@ -0,0 +1,76 @@
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from google.oauth2.credentials import Credentials
+
+from app.gmail_service import GmailServiceProvider
+
+
+class TestGmailServiceProvider(unittest.TestCase):
+    def setUp(self):
+        self.credentials = Credentials(token='token')
+        self.loader = MagicMock(return_value=self.credentials)
+        self.provider = GmailServiceProvider(self.loader, pool_size=1)
+        save_patch = patch('app.gmail_service._save_token')
+        self.mock_save = save_patch.start()
+        self.addCleanup(save_patch.stop)
+
+    def test_leases_reuse_pooled_services_and_credentials(self):
+        with self.provider.lease() as first:
+            request = first.users().threads().get(userId='me', id='t1', format='metadata')
+        with self.provider.lease() as second:
+            pass
+
+        self.assertIs(first, second)
+        self.assertIn('gmail.googleapis.com/gmail/v1/users/me/threads/t1', request.uri)
+        self.assertIs(first._http.credentials, self.credentials)
+        self.loader.assert_called_once()
+        self.assertEqual(self.provider.stats['services_built'], 1)
+
+    def test_concurrent_leases_get_distinct_transports_and_pool_is_bounded(self):
+        with self.provider.lease() as first, self.provider.lease() as second:
+            self.assertIsNot(first, second)
+            self.assertIsNot(first._http.http, second._http.http)
+
+        self.assertEqual(len(self.provider._idle), 1)
+        self.assertEqual(self.provider.stats['services_built'], 2)
+
+    def test_expired_credentials_refreshed_once_under_lock(self):
+        credentials = MagicMock(valid=False, refresh_token='refresh')
+        refreshed = threading.Event()
+
+        def refresh(request):
+            refreshed.wait(0.05)
+            credentials.valid = True
+        credentials.refresh.side_effect = refresh
+        provider = GmailServiceProvider(MagicMock(return_value=credentials))
+        provider.credentials()
+        credentials.valid = False
+
+        results = []
+        workers = [threading.Thread(target=lambda: results.append(provider.credentials())) for _ in range(8)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(results, [credentials] * 8)
+        credentials.refresh.assert_called_once()
+        self.mock_save.assert_called_once_with(credentials)
+        self.assertEqual(provider.stats['credential_loads'], 1)
+
+    def test_failed_refresh_falls_back_to_loader(self):
+        stale = MagicMock(valid=False, refresh_token='refresh')
+        stale.refresh.side_effect = Exception('invalid_grant')
+        loader = MagicMock(side_effect=[stale, self.credentials])
+        provider = GmailServiceProvider(loader)
+
+        provider.credentials()
+
+        self.assertIs(provider.credentials(), self.credentials)
+        self.assertEqual(loader.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
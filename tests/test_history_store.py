@@ -0,0 +1,93 @@
+import csv
+import json
+import os
+import tempfile
+import unittest
+
+from app.history_store import HistoryStore, import_reports, recipient_domain
+from app.report_service import REPORT_COLUMNS
+
+
+def entry(day, recipient, status='success', number=1, subject='Interest in Role'):
+    return {'reported_on': day, 'thread_id': f'{recipient}-{number}', 'recipient': recipient, 'subject': subject,
+            'prev_message_at': f'{day} 09:00:00', 'followup_number': number, 'status': status}
+
+
+class TestHistoryStore(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.dir = temp_dir.name
+        self.store = HistoryStore(os.path.join(self.dir, 'history.sqlite3'))
+
+    def test_recipient_domain(self):
+        self.assertEqual(recipient_domain('Jane <Jane@Corp.Example>, bob@other.example'), 'corp.example')
+        self.assertEqual(recipient_domain('undisclosed'), '')
+
+    def test_record_is_idempotent_and_pages_newest_first(self):
+        entries = [entry(f'2026-09-{d:02d}', f'r{d}@corp.example') for d in range(1, 6)]
+        self.assertEqual(self.store.record(entries), 5)
+        self.assertEqual(self.store.record(entries[:2]), 0)
+
+        first = self.store.query(limit=2)
+        second = self.store.query(limit=2, before_id=first['next_before_id'])
+        last = self.store.query(limit=2, before_id=second['next_before_id'])
+        days = [item['reported_on'] for page in (first, second, last) for item in page['items']]
+        self.assertEqual(days, [f'2026-09-{d:02d}' for d in range(5, 0, -1)])
+        self.assertIsNone(last['next_before_id'])
+        self.assertEqual([i['recipient'] for i in self.store.query(start='2026-09-02', end='2026-09-03')['items']],
+                         ['r3@corp.example', 'r2@corp.example'])
+
+    def test_same_outcome_reported_on_another_day_is_kept(self):
+        self.assertEqual(self.store.record([entry('2026-09-01', 'r@corp.example')]), 1)
+        repeat = dict(entry('2026-09-01', 'r@corp.example'), reported_on='2026-09-02')
+        self.assertEqual(self.store.record([repeat]), 1)
+        self.assertEqual(self.store.record([repeat]), 0)
+
+    def test_aggregates(self):
+        self.store.record([
+            entry('2026-08-30', 'a@corp.example'),
+            entry('2026-09-01', 'b@corp.example', 'fail'),
+            entry('2026-09-02', 'c@other.example', '', number=2),
+            entry('2026-09-03', 'c@other.example', number=2),
+        ])
+
+        by_domain = self.store.aggregate('domain', start='2026-09-01')
+        self.assertEqual(by_domain, [
+            {'key': 'corp.example', 'total': 1, 'sent': 0, 'failed': 1, 'pending': 0},
+            {'key': 'other.example', 'total': 2, 'sent': 1, 'failed': 0, 'pending': 1},
+        ])
+        self.assertEqual([(g['key'], g['sent']) for g in self.store.aggregate('month')], [('2026-08', 1), ('2026-09', 1)])
+        self.assertEqual([g['key'] for g in self.store.aggregate('followup_number', status='success')], [1, 2])
+        with self.assertRaises(ValueError):
+            self.store.aggregate('subject')
+
+    def test_import_reports(self):
+        path = os.path.join(self.dir, 'followup_report_2026-09-10.csv')
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(REPORT_COLUMNS)
+            writer.writerow(['2026-09-07', 'Jane <jane@corp.example>', 'Interest in Role', '2026-09-07 10:00:00',
+                             'text', 2, 'success'])
+            writer.writerow(['2026-09-07', 'bob@corp.example', 'Interest in Role', '2026-09-07 11:00:00',
+                             'text', 1, ''])
+
+        self.assertEqual(import_reports(self.store, [path]), 2)
+        self.assertEqual(import_reports(self.store, [path]), 0)
+        items = self.store.query(domain='CORP.example', status='success')['items']
+        self.assertEqual([(i['reported_on'], i['followup_number']) for i in items], [('2026-09-10', 2)])
+
+    def test_import_jsonl_reports_and_reject_other_files(self):
+        path = os.path.join(self.dir, 'followup_report_2026-09-11.jsonl')
+        row = ['2026-09-08', 'amy@corp.example', 'Interest in Role', '2026-09-08 10:00:00', 'text', 1, 'success']
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(dict(zip(REPORT_COLUMNS, row))) + "\n")
+
+        self.assertEqual(import_reports(self.store, [path]), 1)
+        self.assertEqual(self.store.query(recipient='amy@corp.example')['items'][0]['reported_on'], '2026-09-11')
+        with self.assertRaises(ValueError):
+            import_reports(self.store, [os.path.join(self.dir, 'followup_report_2026-09-11.txt')])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+from unittest.mock import patch
+
+from app.preclassifier import agreement, preclassify, score_thread
+
+
+def candidate(**fields):
+    return dict({'thread_id': 't1', 'subject': 'Interest in Backend Engineer role', 'to': 'r@example.com',
+                 'snippet': 'Following up on my application', 'followup_count': 0, 'days_since_last': 4},
+                **fields)
+
+
+class TestPreclassifier(unittest.TestCase):
+    def test_hard_rules(self):
+        with patch('app.preclassifier.MAX_FOLLOW_UPS', 3):
+            self.assertFalse(preclassify(candidate(followup_count=3))['needs_followup'])
+        self.assertEqual(preclassify(candidate(all_from_user=False))['reason'], 'The recipient has replied')
+        self.assertFalse(preclassify(candidate(snippet='Unfortunately we are not moving forward'))['needs_followup'])
+
+    def test_not_job_related(self):
+        decision = preclassify(candidate(subject='Your order #1234 receipt', snippet='Thanks for shopping'))
+        self.assertEqual(decision['reason'], 'Not job-related')
+        self.assertFalse(decision['needs_followup'])
+
+    def test_overdue_job_threads_are_decided(self):
+        decision = preclassify(candidate(subject='Interview follow-up: Data Engineer', days_since_last=6))
+        self.assertEqual((decision['needs_followup'], decision['context'], decision['urgency']),
+                         (True, 'interview', 'high'))
+        decision = preclassify(candidate(days_since_last=8))
+        self.assertEqual((decision['context'], decision['urgency']), ('job_application', 'medium'))
+
+    def test_ambiguous_threads_go_to_the_model(self):
+        # Job-related but not yet due, and subjects with no signal either way
+        self.assertIsNone(preclassify(candidate(days_since_last=4)))
+        self.assertIsNone(preclassify(candidate(subject='Quick question', snippet='Hi there')))
+        self.assertEqual(score_thread(candidate(subject='Quick question', snippet='Hi there')), (0, 'other'))
+
+    def test_agreement_on_labeled_sample(self):
+        threads = [candidate(followup_count=5), candidate(days_since_last=8), candidate(days_since_last=4),
+                   candidate(subject='Newsletter: weekly digest', snippet='unsubscribe')]
+        result = agreement(threads, [False, False, True, False])
+
+        self.assertEqual((result['sample'], result['decided'], result['agreed']), (4, 3, 2))
+        self.assertEqual(result['coverage'], 0.75)
+        self.assertAlmostEqual(result['agreement'], 2 / 3)
+        self.assertEqual(result['disagreements'][0]['local'], True)
+
+
+if __name__ == '__main__':
+    unittest.main()
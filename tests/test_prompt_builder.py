@@ -0,0 +1,61 @@
+import unittest
+
+from app.prompt_builder import build_thread_content, count_tokens, strip_quoted, truncate_tokens
+
+REPLY = """Hi Ada,
+
+Just checking in on the Staff Engineer role.
+
+Thanks,
+Grace
+
+On Mon, Mar 3, 2025 at 9:14 AM Ada Lovelace <ada@example.com>
+wrote:
+> Thanks for applying, we will be in touch.
+> Best,
+> Ada
+"""
+
+
+class TestPromptBuilder(unittest.TestCase):
+    def test_strip_quoted_replies_and_signatures(self):
+        self.assertEqual(strip_quoted(REPLY), "Hi Ada,\n\nJust checking in on the Staff Engineer role.\n\nThanks,\nGrace")
+        self.assertEqual(strip_quoted("See below.\n> quoted\nMore.\n-- \nGrace Hopper\n555-0100"),
+                         "See below.\nMore.")
+        self.assertEqual(strip_quoted("Hello\n\nSent from my iPhone"), "Hello")
+        self.assertEqual(strip_quoted("Reply\n-----Original Message-----\nFrom: Ada"), "Reply")
+
+    def test_repeated_paragraphs_kept_in_newest_message(self):
+        pasted = "I am writing to express my interest in the Staff Engineer opening on your team."
+        built = build_thread_content([pasted + "\n\nRegards", "Following up.\n\n" + pasted + "\n\nRegards"], 1000)
+        self.assertEqual(built.text.count(pasted), 1)
+        self.assertEqual(built.text.count("Regards"), 2)
+        self.assertTrue(built.text.endswith(pasted + "\n\nRegards"))
+
+    def test_budget_keeps_newest_and_first_messages(self):
+        messages = [f"Message {i}: " + "word " * 50 for i in range(6)]
+        per_message = count_tokens(messages[0])
+        built = build_thread_content(messages, per_message * 3)
+
+        self.assertLessEqual(built.tokens, per_message * 3 + 10)
+        self.assertEqual(built.messages_kept, 3)
+        self.assertIn("Message 0", built.text)
+        self.assertIn("Message 4", built.text)
+        self.assertIn("Message 5", built.text)
+        self.assertIn("[3 earlier messages omitted]", built.text)
+        self.assertGreater(built.tokens_saved, 0)
+
+    def test_oversized_message_is_truncated(self):
+        built = build_thread_content("lorem " * 1000, 50)
+        self.assertLessEqual(built.tokens, 50)
+        self.assertTrue(built.text.endswith(' …'))
+        self.assertEqual(truncate_tokens("short", 50), "short")
+
+    def test_small_threads_pass_through(self):
+        built = build_thread_content("Subject: Interest in SRE\nTo: a@example.com\n\nFollowing up", 1000)
+        self.assertEqual(built.text, "Subject: Interest in SRE\nTo: a@example.com\n\nFollowing up")
+        self.assertEqual(built.tokens_saved, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
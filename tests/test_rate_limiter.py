@@ -0,0 +1,138 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, patch
+
+import httpx
+from googleapiclient.errors import HttpError
+
+from app.rate_limiter import GmailScheduler, TokenBucket, quota_units, retry_after_seconds
+
+
+def http_error(status, content=b'error', headers=None):
+    resp = MagicMock(status=status, reason='error')
+    resp.get.side_effect = (headers or {}).get
+    resp.headers = headers or {}
+    return HttpError(resp, content)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_reserve_queues_callers_behind_refill(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10, clock=clock)
+
+        self.assertEqual(bucket.reserve(10), 0.0)
+        self.assertAlmostEqual(bucket.reserve(5), 0.5)
+        self.assertAlmostEqual(bucket.reserve(5), 1.0)
+        clock.now = 1.0
+        self.assertEqual(bucket.reserve(0), 0.0)
+
+    def test_set_rate_keeps_accrued_tokens(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10, clock=clock)
+        bucket.reserve(10)
+        clock.now = 0.5
+        bucket.set_rate(2)
+
+        self.assertAlmostEqual(bucket.reserve(6), 0.5)
+
+
+class TestGmailScheduler(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = GmailScheduler(units_per_second=100, max_retries=3, backoff_base=1, backoff_max=8)
+        sleep_patch = patch('app.rate_limiter.time.sleep')
+        self.mock_sleep = sleep_patch.start()
+        self.addCleanup(sleep_patch.stop)
+
+    def request(self, *outcomes, method='gmail.users.threads.get'):
+        request = MagicMock(methodId=method)
+        request.execute.side_effect = outcomes
+        return request
+
+    def test_quota_units_by_method(self):
+        self.assertEqual(quota_units('gmail.users.threads.get'), 10)
+        self.assertEqual(quota_units('users.messages.send'), 100)
+        self.assertEqual(quota_units(None), 5)
+
+    def test_retries_rate_limit_honoring_retry_after(self):
+        request = self.request(http_error(429, headers={'retry-after': '7'}), {'id': 't1'})
+
+        self.assertEqual(self.scheduler.execute(request), {'id': 't1'})
+        self.mock_sleep.assert_called_once_with(7.0)
+        stats = self.scheduler.stats()
+        self.assertEqual((stats['calls'], stats['units'], stats['retries'], stats['throttled']), (1, 10, 1, 1))
+
+    def test_throttle_halves_rate_and_success_recovers(self):
+        self.scheduler.record_throttle()
+        self.assertEqual(self.scheduler.bucket.rate, 50)
+
+        for _ in range(3):
+            self.scheduler.execute(self.request({}))
+        self.assertEqual(self.scheduler.bucket.rate, 56)
+
+    def test_transient_errors_use_jittered_backoff(self):
+        request = self.request(http_error(503), http_error(500), {'ok': True})
+        with patch('app.rate_limiter.random.uniform', side_effect=lambda low, high: high) as uniform:
+            self.scheduler.execute(request)
+
+        self.assertEqual([c.args for c in uniform.call_args_list], [(0, 1), (0, 2)])
+        self.assertEqual(self.scheduler.bucket.rate, 100)
+
+    def test_permanent_and_exhausted_errors_raise(self):
+        with self.assertRaises(HttpError):
+            self.scheduler.execute(self.request(http_error(404)))
+        self.mock_sleep.assert_not_called()
+
+        with self.assertRaises(HttpError):
+            self.scheduler.execute(self.request(*[http_error(503)] * 4))
+        self.assertEqual(self.mock_sleep.call_count, 3)
+        self.assertEqual(self.scheduler.stats()['failures'], 2)
+
+    def test_403_only_retried_for_rate_limit_reasons(self):
+        with self.assertRaises(HttpError):
+            self.scheduler.execute(self.request(http_error(403, b'{"reason": "insufficientPermissions"}')))
+
+        request = self.request(http_error(403, b'{"reason": "userRateLimitExceeded"}'), {})
+        self.scheduler.execute(request)
+        self.assertEqual(request.execute.call_count, 2)
+
+    def test_sends_retried_only_after_rate_limits(self):
+        # The message may already be sent when a 5xx comes back, so it must not go out twice
+        request = self.request(http_error(503), {'id': 'm1'}, method='gmail.users.messages.send')
+        with self.assertRaises(HttpError):
+            self.scheduler.execute(request)
+        self.assertEqual(request.execute.call_count, 1)
+
+        request = self.request(http_error(429), {'id': 'm1'}, method='gmail.users.messages.send')
+        self.assertEqual(self.scheduler.execute(request), {'id': 'm1'})
+        self.assertEqual(request.execute.call_count, 2)
+
+    def test_execute_async_retries_httpx_errors(self):
+        responses = [httpx.Response(429, headers={'Retry-After': '0'}), httpx.Response(200, json={'id': 't1'})]
+
+        async def call():
+            response = responses.pop(0)
+            response.request = httpx.Request('GET', 'https://example.com')
+            response.raise_for_status()
+            return response.json()
+
+        result = asyncio.run(self.scheduler.execute_async(call, 'users.threads.get'))
+
+        self.assertEqual(result, {'id': 't1'})
+        self.assertEqual(self.scheduler.stats()['throttled'], 1)
+
+    def test_retry_after_http_date(self):
+        error = http_error(429, headers={'retry-after': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+        self.assertEqual(retry_after_seconds(error), 0.0)
+        self.assertIsNone(retry_after_seconds(http_error(429)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import csv
+import importlib.util
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from app import followup_service
+from app.history_store import HistoryStore
+from app.report_service import REPORT_COLUMNS, ReportSink, generate_followup_report
+
+
+def thread(i, status=None):
+    return {'thread_id': f't{i}', 'to': f'r{i}@example.com', 'subject': f'Interest in Role {i}',
+            'date': f'2026-10-1{i % 10} 09:00:00', 'followup_count': 0, 'status': status}
+
+
+class TestReportSink(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.dir = temp_dir.name
+        history_patch = patch('app.report_service.get_history_store', return_value=None)
+        history_patch.start()
+        self.addCleanup(history_patch.stop)
+
+    def read_csv(self, path):
+        with open(path, newline='', encoding='utf-8') as f:
+            return list(csv.reader(f))
+
+    def test_rows_stream_in_bounded_buffers_and_dedupe_across_runs(self):
+        path = os.path.join(self.dir, 'report.csv')
+        with ReportSink(path, 'csv', flush_rows=2, flush_seconds=60) as sink:
+            self.assertTrue(sink.write(thread(1)))
+            self.assertEqual(len(self.read_csv(path)), 1)  # header only, row still buffered
+            self.assertFalse(sink.write(thread(1)))
+            sink.write(thread(2))
+            self.assertEqual(len(self.read_csv(path)), 3)
+            sink.write(thread(3))
+
+        # A later scan the same day, then the send phase for one of the threads
+        generate_followup_report([thread(2), thread(3), thread(4)], path)
+        generate_followup_report([thread(2, 'sent'), thread(2, 'sent')], path)
+
+        rows = self.read_csv(path)
+        self.assertEqual(rows[0], REPORT_COLUMNS)
+        self.assertEqual([(r[1], r[6]) for r in rows[1:]],
+                         [('r1@example.com', ''), ('r2@example.com', ''), ('r3@example.com', ''),
+                          ('r4@example.com', ''), ('r2@example.com', 'success')])
+        self.assertEqual(rows[1][0], '2026-10-11')
+
+    def test_flushed_rows_are_recorded_in_history(self):
+        history = HistoryStore(os.path.join(self.dir, 'history.sqlite3'))
+        with ReportSink(os.path.join(self.dir, 'report.csv'), 'csv', history=history) as sink:
+            sink.write(thread(1))
+            sink.write(thread(1, 'sent'))
+
+        items = history.query()['items']
+        self.assertEqual([(i['thread_id'], i['status'], i['recipient_domain']) for i in items],
+                         [('t1', 'success', 'example.com'), ('t1', '', 'example.com')])
+        self.assertEqual(items[0]['reported_on'], sink.reported_on)
+
+    def test_jsonl_output(self):
+        path = os.path.join(self.dir, 'report.jsonl')
+        generate_followup_report([thread(1, 'dry_run')], path, 'jsonl')
+        generate_followup_report([thread(1, 'dry_run'), thread(2)], path, 'jsonl')
+
+        with open(path, encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual([(r['Sent To'], r['Status'], r['Number of follow up']) for r in records],
+                         [('r1@example.com', 'fail', 1), ('r2@example.com', '', 1)])
+
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow not installed')
+    def test_parquet_output_writes_parts(self):
+        import pyarrow.parquet as pq
+        path = os.path.join(self.dir, 'report.parquet')
+        generate_followup_report([thread(1), thread(2)], path, 'parquet')
+        generate_followup_report([thread(2), thread(3)], path, 'parquet')
+
+        self.assertEqual(pq.read_table(path).column('Sent To').to_pylist(), ['r1@example.com', 'r2@example.com'])
+        self.assertEqual(pq.read_table(os.path.join(self.dir, 'report.1.parquet')).column('Sent To').to_pylist(),
+                         ['r3@example.com'])
+        # A sink that writes nothing new (or nothing at all) leaves no empty part behind
+        generate_followup_report([thread(3)], path, 'parquet')
+        generate_followup_report([], path, 'parquet')
+        self.assertFalse(os.path.exists(os.path.join(self.dir, 'report.2.parquet')))
+
+    def test_unknown_format_rejected(self):
+        with self.assertRaises(ValueError):
+            ReportSink(os.path.join(self.dir, 'report.xml'), 'xml')
+
+    def test_followup_run_reports_each_send_once(self):
+        path = os.path.join(self.dir, 'report.csv')
+        with patch('app.followup_service.get_gmail_service'), \
+             patch('app.followup_service.get_threads_to_follow_up', return_value=[thread(1), thread(2)]) as scan, \
+             patch('app.followup_service.send_followup_email', side_effect=[True, False]), \
+             patch('app.followup_service.open_followup_report', side_effect=lambda: ReportSink(path, 'csv')), \
+             patch.dict(os.environ, {'DISABLE_SEND_FOLLOWUP': '0'}), patch('builtins.print', MagicMock()):
+            followup_service.run_followup_and_report()
+
+        self.assertFalse(scan.call_args.kwargs['report'])
+        self.assertEqual([(r[1], r[6]) for r in self.read_csv(path)[1:]],
+                         [('r1@example.com', 'success'), ('r2@example.com', 'fail')])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,192 @@
+import json
+import os
+import tempfile
+import zlib
+import unittest
+from contextlib import contextmanager
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from app import app
+from app.ai_service import AIService
+from app.history_store import HistoryStore
+from app.scan_cache import ScanCache
+from app.send_queue import SendQueue
+
+
+def sse_frames(body):
+    """Split an SSE body into (id, data) pairs, skipping comments and retry frames."""
+    frames = []
+    for block in body.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith((':', 'retry')))
+        if 'data' in fields:
+            frames.append((fields.get('id'), json.loads(fields['data'])))
+    return frames
+
+
+def streaming_client(*deltas):
+    """OpenAI client stub whose streamed completion yields deltas and records being closed."""
+    client = MagicMock()
+    stream = client.chat.completions.create.return_value
+    stream.consumed = 0
+
+    def chunks():
+        for delta in deltas:
+            stream.consumed += 1
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))])
+    stream.__iter__.side_effect = chunks
+    client.stream = stream
+    return client
+
+
+class TestRoutes(unittest.TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+        self.service = MagicMock()
+
+        @contextmanager
+        def lease():
+            yield self.service
+        provider = MagicMock()
+        provider.lease.side_effect = lease
+        provider_patch = patch('app.routes.get_service_provider', return_value=provider)
+        provider_patch.start()
+        self.addCleanup(provider_patch.stop)
+
+    def test_send_followups_streams_ndjson_results(self):
+        results = [
+            {'thread_id': 't2', 'to': 'b@example.com', 'subject': 'Interest in B', 'success': True},
+            {'thread_id': 't1', 'to': 'a@example.com', 'subject': 'Interest in A', 'success': False, 'error': 'boom'},
+        ]
+        threads = [{'thread_id': 't1', 'to': 'a@example.com', 'subject': 'Interest in A'}, 't2']
+        with patch('app.routes.send_followups_bulk', return_value=iter(results)) as mock_bulk:
+            response = self.client.post('/send-followups', json={'threads': threads})
+            lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        mock_bulk.assert_called_once_with(self.service, threads)
+        self.assertEqual([line['thread_id'] for line in lines[:-1]], ['t2', 't1'])
+        self.assertEqual(lines[-1], {'type': 'complete', 'sent': 1, 'failed': 1})
+
+    def test_send_followups_rejects_invalid_payload(self):
+        for payload in ({}, {'threads': []}, {'threads': 't1'}, {'threads': [{'to': 'a@example.com'}]}):
+            response = self.client.post('/send-followups', json=payload)
+            self.assertEqual(response.status_code, 400, payload)
+
+    def test_send_jobs_queue_and_stream_progress(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        queue = SendQueue(os.path.join(temp_dir.name, 'send_queue.sqlite3'), rate_per_second=1000,
+                          send=lambda service, job, profile_email: None)
+        with patch('app.routes.get_send_queue', return_value=queue):
+            created = self.client.post('/send-jobs', json={'threads': ['t1', 't2']})
+            batch_id = created.get_json()['batch_id']
+            self.assertEqual(created.status_code, 202)
+            self.assertEqual(self.client.get(f'/send-jobs/{batch_id}').get_json()['counts']['pending'], 2)
+            self.assertEqual(self.client.get('/send-jobs/unknown').status_code, 404)
+
+            while queue.process_next(MagicMock(), 'me@example.com'):
+                pass
+            response = self.client.get(f'/send-jobs/{batch_id}/events')
+            events = [json.loads(line[len('data: '):]) for line in response.get_data(as_text=True).splitlines()
+                      if line.startswith('data: ')]
+
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        self.assertEqual([e['job']['status'] for e in events if e['type'] == 'job'], ['sent', 'sent'])
+        self.assertEqual(events[-1], {'type': 'complete', 'counts': {'pending': 0, 'running': 0, 'sent': 2,
+                                                                     'dry_run': 0, 'failed': 0}})
+
+    def stream(self, threads, path='/api/threads-stream', **kwargs):
+        cache = ScanCache(ttl_seconds=60)
+        with patch('app.routes.get_scan_cache', return_value=cache):
+            snapshot = cache.get('me', lambda: iter(threads))
+            list(snapshot)
+            return snapshot, self.client.get(path, **kwargs)
+
+    def test_threads_stream_event_ids_resume_and_reset(self):
+        threads = [{'id': f't{i}', 'subject': subject} for i, subject in enumerate(['A', 'B', 'a'])]
+        snapshot, response = self.stream(threads, headers={'Accept-Encoding': 'identity'})
+        frames = sse_frames(response.get_data(as_text=True))
+        self.assertTrue(response.get_data(as_text=True).startswith('retry: '))
+        self.assertEqual([i for i, _ in frames], [f'{snapshot.id}:{n}' for n in (1, 2, 3, 3)])
+        self.assertEqual([d['threads'][0]['group_id'] for _, d in frames[:3]], [0, 1, 0])
+        self.assertEqual([len(d['groups']) for _, d in frames[:3]], [1, 1, 0])
+        self.assertEqual(frames[2][1]['counts'], {'0': 2})
+
+        cache = ScanCache(ttl_seconds=60)
+        with patch('app.routes.get_scan_cache', return_value=cache):
+            cache._snapshots['me'] = snapshot
+            resumed = sse_frames(self.client.get('/api/threads-stream', headers={
+                'Last-Event-ID': f'{snapshot.id}:2', 'Accept-Encoding': 'identity'}).get_data(as_text=True))
+            reset = sse_frames(self.client.get('/api/threads-stream', headers={
+                'Last-Event-ID': 'gone:2', 'Accept-Encoding': 'identity'}).get_data(as_text=True))
+
+        self.assertEqual([t['id'] for _, d in resumed if d['type'] == 'threads' for t in d['threads']], ['t2'])
+        self.assertEqual((resumed[0][1]['groups'], resumed[0][1]['counts']), ([], {'0': 2}))
+        self.assertEqual(reset[0][1], {'type': 'reset'})
+        self.assertEqual(len([d for _, d in reset if d['type'] == 'threads']), 3)
+
+    def test_threads_stream_coalesces_and_gzips(self):
+        threads = [{'id': 't0', 'subject': 'A'}, {'id': 't1', 'subject': 'B'}]
+        snapshot, response = self.stream(threads, path='/api/threads-stream?coalesce_ms=50',
+                                         headers={'Accept-Encoding': 'gzip'})
+
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        frames = sse_frames(zlib.decompress(response.get_data(), 31).decode('utf-8'))
+        self.assertEqual(frames[0][0], f'{snapshot.id}:2')
+        self.assertEqual([t['id'] for t in frames[0][1]['threads']], ['t0', 't1'])
+        self.assertEqual([g['subject'] for g in frames[0][1]['groups']], ['A', 'B'])
+        self.assertEqual(frames[-1][1], {'type': 'complete'})
+
+    def test_ai_draft_stream_forwards_tokens_and_cancels_on_disconnect(self):
+        client = streaming_client('Hi Ada,', ' any update?')
+        ai = AIService(client=client, cache=False)
+        with patch('app.routes.get_ai_service', return_value=ai):
+            response = self.client.get('/api/ai-draft-stream', query_string={
+                'thread_id': 't1', 'subject': 'Interest in SRE', 'to': 'Ada <ada@example.com>',
+                'snippet': 'Applied last week', 'days': 4})
+            frames = [data for _, data in sse_frames(response.get_data(as_text=True))]
+
+            self.assertEqual(frames, [{'type': 'token', 'text': 'Hi Ada,'}, {'type': 'token', 'text': ' any update?'},
+                                      {'type': 'complete'}])
+            self.assertIn('Recipient Name: Ada', client.chat.completions.create.call_args.kwargs['messages'][0]['content'])
+
+            client = streaming_client(*(f'word{i} ' for i in range(100)))
+            ai.client = client
+            response = self.client.get('/api/ai-draft-stream', query_string={'to': 'ada@example.com'},
+                                       buffered=False)
+            next(iter(response.response))
+            response.close()
+
+            client.stream.close.assert_called_once()
+            self.assertLess(client.stream.consumed, 100)
+            self.assertEqual(ai.stream_stats['cancelled'], 1)
+
+            metrics = self.client.get('/api/ai-metrics').get_json()
+            self.assertEqual(metrics['streams']['completed'], 1)
+
+        with patch('app.routes.get_ai_service', side_effect=ValueError('OPENAI_API_KEY environment variable not set')):
+            self.assertEqual(self.client.get('/api/ai-draft-stream').status_code, 503)
+
+    def test_reports_pages_and_aggregates_history(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        history = HistoryStore(os.path.join(temp_dir.name, 'history.sqlite3'))
+        history.record({'reported_on': f'2026-09-0{i}', 'recipient': f'r{i}@corp.example', 'subject': 'Interest',
+                        'prev_message_at': f'2026-09-0{i} 09:00:00', 'followup_number': 1, 'status': 'success'}
+                       for i in range(1, 4))
+        with patch('app.routes.get_history_store', return_value=history):
+            page = self.client.get('/api/reports?limit=2').get_json()
+            rest = self.client.get(f"/api/reports?limit=2&before_id={page['next_before_id']}").get_json()
+            by_domain = self.client.get('/api/reports?group_by=domain&start=2026-09-02').get_json()
+            invalid = self.client.get('/api/reports?group_by=subject')
+
+        self.assertEqual([i['reported_on'] for i in page['items'] + rest['items']],
+                         ['2026-09-03', '2026-09-02', '2026-09-01'])
+        self.assertEqual(by_domain['groups'], [{'key': 'corp.example', 'total': 2, 'sent': 2, 'failed': 0,
+                                                'pending': 0}])
+        self.assertEqual(invalid.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
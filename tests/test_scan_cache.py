@@ -0,0 +1,126 @@
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from app import blacklist_service
+from app.scan_cache import ScanCache, ScanSnapshot
+
+
+class GatedScan:
+    """A scan producer that emits items only when the test releases them."""
+
+    def __init__(self, items):
+        self.items = items
+        self.calls = 0
+        self.gates = [threading.Event() for _ in items]
+
+    def __call__(self):
+        self.calls += 1
+        for item, gate in zip(self.items, self.gates):
+            gate.wait(5)
+            yield item
+
+    def release(self, count=None):
+        for gate in self.gates[:count]:
+            gate.set()
+
+
+class TestScanCache(unittest.TestCase):
+    def test_concurrent_subscribers_share_one_scan_and_replay_earlier_items(self):
+        cache = ScanCache(ttl_seconds=60)
+        scan = GatedScan(['t1', 't2', 't3'])
+
+        first = cache.get('me', scan)
+        scan.release(1)
+        self.assertEqual(first.wait(0, timeout=5)[0], ['t1'])
+        joined = cache.get('me', scan)
+        scan.release()
+
+        self.assertIs(joined, first)
+        self.assertEqual(list(joined), ['t1', 't2', 't3'])
+        self.assertEqual(list(first), ['t1', 't2', 't3'])
+        self.assertEqual(list(cache.get('me', scan)), ['t1', 't2', 't3'])
+        self.assertEqual(scan.calls, 1)
+
+    def test_ttl_and_invalidation_start_new_scans(self):
+        scan = GatedScan(['t1'])
+        scan.release()
+
+        cache = ScanCache(ttl_seconds=0)
+        list(cache.get('me', scan))
+        list(cache.get('me', scan))
+        self.assertEqual(scan.calls, 2)
+
+        cache = ScanCache(ttl_seconds=60)
+        snapshot = cache.get('me', scan)
+        list(snapshot)
+        cache.invalidate()
+        self.assertTrue(snapshot.stale)
+        self.assertIsNot(cache.get('me', scan), snapshot)
+        self.assertEqual(scan.calls, 4)
+
+    def test_failed_scan_reaches_subscribers_and_is_not_cached(self):
+        cache = ScanCache(ttl_seconds=60)
+        calls = []
+
+        def failing_scan():
+            calls.append(1)
+            yield 't1'
+            raise RuntimeError('quota exhausted')
+
+        snapshot = cache.get('me', failing_scan)
+        received = []
+        with self.assertRaises(RuntimeError):
+            for item in snapshot:
+                received.append(item)
+
+        self.assertEqual(received, ['t1'])
+        list(cache.get('me', lambda: iter(['t2'])))
+        self.assertEqual(len(calls), 1)
+
+    def test_batches_coalesce_resume_and_heartbeat(self):
+        cache = ScanCache(ttl_seconds=60)
+        scan = GatedScan(['t1', 't2', 't3'])
+        snapshot = cache.get('me', scan)
+
+        batches = snapshot.batches(0, window=0.0, idle_timeout=0.01)
+        self.assertEqual(next(batches), [])
+        scan.release(2)
+        snapshot.wait(1, timeout=5)
+        self.assertEqual(next(batches), ['t1', 't2'])
+        scan.release()
+
+        self.assertEqual([item for batch in batches for item in batch], ['t3'])
+        self.assertEqual(list(snapshot.batches(1, window=1.0)), [['t2', 't3']])
+
+    def test_async_batches_follow_appends_from_other_threads(self):
+        snapshot = ScanSnapshot()
+
+        async def collect():
+            batches = snapshot.abatches(0, window=0.0, idle_timeout=0.01)
+            received = [await batches.__anext__()]
+            threading.Timer(0.02, lambda: (snapshot.append('t1'), snapshot.finish())).start()
+            async for batch in batches:
+                received.append(batch)
+            return received
+
+        received = asyncio.run(collect())
+
+        self.assertEqual(received[0], [])
+        self.assertEqual([item for batch in received for item in batch], ['t1'])
+
+    def test_blacklisting_invalidates_cached_scans(self):
+        with tempfile.TemporaryDirectory() as tmpdir, \
+             patch('app.blacklist_service.BLACKLIST_FILE', os.path.join(tmpdir, 'blacklist.txt')), \
+             patch('app.blacklist_service.get_scan_cache') as mock_cache:
+            self.assertTrue(blacklist_service.add_subject_to_blacklist('Interest in Ops'))
+            self.assertFalse(blacklist_service.add_subject_to_blacklist('interest in ops'))
+
+        mock_cache.return_value.invalidate.assert_called_once_with()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,211 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from googleapiclient.errors import HttpError
+
+from app.send_queue import PermanentSendError, SendQueue
+
+
+def http_error(status):
+    return HttpError(MagicMock(status=status, reason='error'), b'error')
+
+
+class TestSendQueue(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.path = os.path.join(self.temp_dir.name, 'send_queue.sqlite3')
+        self.sent = []
+        self.outcomes = {}
+        self.in_thread = set()  # threads whose earlier attempt actually went out
+        self.checked = []
+        self.dry_run = False
+        self.lock = threading.Lock()
+
+    def send(self, service, job, profile_email):
+        with self.lock:
+            outcome = self.outcomes.get(job['thread_id'], [])
+            error = outcome.pop(0) if outcome else None
+        if error is not None:
+            raise error
+        with self.lock:
+            self.sent.append((job['thread_id'], job['recipient'], profile_email))
+        return not self.dry_run
+
+    def was_sent(self, service, job, since):
+        with self.lock:
+            self.checked.append(job['thread_id'])
+            return job['thread_id'] in self.in_thread
+
+    def queue(self, **kwargs):
+        service = MagicMock()
+        service.users().getProfile().execute.return_value = {'emailAddress': 'me@example.com'}
+        kwargs.setdefault('rate_per_second', 1000)
+        return SendQueue(self.path, send=self.send, was_sent=self.was_sent, service_factory=lambda: service,
+                         **kwargs)
+
+    def test_enqueue_does_not_duplicate_active_jobs(self):
+        queue = self.queue()
+        first = queue.enqueue([{'thread_id': 't1', 'to': 'a@example.com', 'subject': 'Interest in A'}, 't2'])
+        second = queue.enqueue(['t2', 't3'])
+
+        self.assertEqual(second['job_ids'][0], first['job_ids'][1])
+        # The shared job stays in the first batch too, so both report its outcome
+        self.assertEqual([job['thread_id'] for job in queue.batch_status(first['batch_id'])['jobs']], ['t1', 't2'])
+        status = queue.batch_status(second['batch_id'])
+        self.assertEqual([job['thread_id'] for job in status['jobs']], ['t2', 't3'])
+        self.assertFalse(status['done'])
+
+        while queue.process_next(MagicMock(), 'me@example.com'):
+            pass
+        self.assertEqual(queue.batch_status(first['batch_id'])['counts']['sent'], 2)
+        self.assertEqual(queue.batch_status(second['batch_id'])['counts']['sent'], 2)
+        self.assertEqual(len(self.sent), 3)
+
+    def test_transient_failures_back_off_then_send(self):
+        queue = self.queue(retry_base=10)
+        self.outcomes['t1'] = [http_error(503)]
+        batch = queue.enqueue([{'thread_id': 't1', 'to': 'a@example.com', 'subject': 'Interest in A'}])
+
+        self.assertTrue(queue.process_next(MagicMock(), 'me@example.com'))
+        job = queue.batch_status(batch['batch_id'])['jobs'][0]
+        self.assertEqual((job['status'], job['attempts']), ('pending', 1))
+        self.assertIn('503', job['last_error'])
+        self.assertFalse(queue.process_next(MagicMock(), 'me@example.com'))
+
+        with patch('app.send_queue.time.time', return_value=time.time() + 11):
+            self.assertTrue(queue.process_next(MagicMock(), 'me@example.com'))
+        status = queue.batch_status(batch['batch_id'])
+        self.assertTrue(status['done'])
+        self.assertEqual(status['counts']['sent'], 1)
+        self.assertEqual(self.sent, [('t1', 'a@example.com', 'me@example.com')])
+
+    def test_permanent_and_exhausted_failures(self):
+        queue = self.queue(max_attempts=2, retry_base=0)
+        self.outcomes = {'t1': [http_error(404)], 't2': [PermanentSendError('no recipient')],
+                         't3': [http_error(500), http_error(500)]}
+        batch = queue.enqueue(['t1', 't2', 't3'])
+
+        while queue.process_next(MagicMock(), 'me@example.com'):
+            pass
+
+        jobs = {job['thread_id']: job for job in queue.batch_status(batch['batch_id'])['jobs']}
+        self.assertEqual([jobs[t]['status'] for t in ('t1', 't2', 't3')], ['failed'] * 3)
+        self.assertEqual([jobs[t]['attempts'] for t in ('t1', 't2', 't3')], [1, 1, 2])
+        self.assertEqual(self.sent, [])
+
+    def test_workers_drain_queue_at_bounded_rate_and_resume_after_restart(self):
+        queue = self.queue(workers=3)
+        batch = queue.enqueue([f't{i}' for i in range(6)])
+        crashed = self.queue(lease_seconds=0)
+        claimed = crashed.claim()  # left running by a process that died; its lease has expired
+        queue.bucket = MagicMock()
+
+        restarted = self.queue(workers=3)
+        restarted.bucket = queue.bucket
+        restarted.start()
+        self.addCleanup(restarted.stop, 5)
+        deadline = time.time() + 5
+        version = restarted.version
+        while not restarted.batch_status(batch['batch_id'])['done'] and time.time() < deadline:
+            version = restarted.wait_for_change(version, timeout=0.5)
+
+        status = restarted.batch_status(batch['batch_id'])
+        self.assertEqual(status['counts']['sent'], 6)
+        self.assertIn(claimed['thread_id'], [thread_id for thread_id, _, _ in self.sent])
+        self.assertEqual(sorted(t for t, _, _ in self.sent), sorted(f't{i}' for i in range(6)))
+        self.assertEqual(queue.bucket.acquire.call_count, 6)
+        # The abandoned job may have gone out before the crash, so its thread was checked first
+        self.assertEqual(self.checked, [claimed['thread_id']])
+
+    def test_live_leases_are_not_taken_over(self):
+        queue = self.queue()
+        batch = queue.enqueue(['t1', 't2'])
+        self.assertEqual(queue.claim()['thread_id'], 't1')
+
+        # Another process on the same file (a second worker process, or a restart) skips the leased job
+        other = self.queue()
+        other.start()
+        self.addCleanup(other.stop, 5)
+        deadline = time.time() + 5
+        version = other.version
+        while other.batch_status(batch['batch_id'])['counts']['sent'] < 1 and time.time() < deadline:
+            version = other.wait_for_change(version, timeout=0.5)
+
+        jobs = other.batch_status(batch['batch_id'])['jobs']
+        self.assertEqual([job['status'] for job in jobs], ['running', 'sent'])
+        self.assertEqual([t for t, _, _ in self.sent], ['t2'])
+
+    def test_lost_lease_skips_the_send_and_keeps_the_new_claim(self):
+        slow = self.queue(lease_seconds=0)
+        batch = slow.enqueue(['t1'])
+        other = self.queue()
+        taken = []
+        # The job's lease runs out while the slow worker waits for the bucket, and another worker claims it
+        slow.bucket = MagicMock()
+        slow.bucket.acquire.side_effect = lambda units: taken.append(other.claim())
+
+        self.assertTrue(slow.process_next(MagicMock(), 'me@example.com'))
+        self.assertEqual(self.sent, [])
+        self.assertFalse(slow.complete(dict(taken[0], attempts=1)))
+        self.assertFalse(slow.fail(dict(taken[0], attempts=1), http_error(503)))
+        job = other.batch_status(batch['batch_id'])['jobs'][0]
+        self.assertEqual((job['status'], job['attempts']), ('running', 2))
+
+        self.assertTrue(other.complete(taken[0]))
+        self.assertEqual(other.batch_status(batch['batch_id'])['counts']['sent'], 1)
+
+    def test_running_workers_renew_their_leases(self):
+        queue = self.queue(lease_seconds=0.3)
+        queue.enqueue(['t1'])
+        job = queue.claim()
+        queue.start()
+        self.addCleanup(queue.stop, 5)
+
+        time.sleep(0.5)
+        self.assertIsNone(self.queue().claim())
+        self.assertTrue(queue.renew(job))
+
+    def test_unknown_outcome_checks_the_thread_before_resending(self):
+        queue = self.queue(retry_base=0)
+        self.outcomes = {'t1': [http_error(503)], 't2': [TimeoutError('timed out')], 't3': [http_error(429)]}
+        self.in_thread = {'t1'}
+        batch = queue.enqueue(['t1', 't2', 't3'])
+
+        while queue.process_next(MagicMock(), 'me@example.com'):
+            pass
+
+        jobs = {job['thread_id']: job for job in queue.batch_status(batch['batch_id'])['jobs']}
+        self.assertEqual([jobs[t]['status'] for t in ('t1', 't2', 't3')], ['sent'] * 3)
+        # t1's first attempt had gone out, so it was not sent again; the 429 was a clear rejection
+        self.assertEqual(sorted(self.checked), ['t1', 't2'])
+        self.assertEqual(sorted(t for t, _, _ in self.sent), ['t2', 't3'])
+
+    def test_cached_scans_are_dropped_once_per_run_of_sends(self):
+        queue = self.queue()
+        queue.enqueue(['t1', 't2', 't3'])
+        with patch('app.send_queue.get_scan_cache') as scan_cache:
+            while queue.process_next(MagicMock(), 'me@example.com'):
+                pass
+            scan_cache.return_value.invalidate.assert_not_called()
+            queue.stop()
+            queue.stop()
+        scan_cache.return_value.invalidate.assert_called_once_with()
+
+    def test_dry_runs_are_recorded_separately(self):
+        queue = self.queue()
+        self.dry_run = True
+        batch = queue.enqueue(['t1'])
+
+        self.assertTrue(queue.process_next(MagicMock(), 'me@example.com'))
+        status = queue.batch_status(batch['batch_id'])
+        self.assertEqual((status['counts']['dry_run'], status['counts']['sent']), (1, 0))
+        self.assertTrue(status['done'])
+
+
+if __name__ == "__main__":
+    unittest.main()
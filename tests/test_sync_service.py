@@ -0,0 +1,154 @@
+import datetime
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from googleapiclient.errors import HttpError
+
+from app import email_service, sync_service
+
+
+class TestSyncService(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.state_path = os.path.join(self.temp_dir.name, 'sync_state.json')
+        state_patch = patch('app.sync_service.SYNC_STATE_FILE', self.state_path)
+        state_patch.start()
+        self.addCleanup(state_patch.stop)
+        self.addCleanup(self.temp_dir.cleanup)
+        self.test_email = 'me@example.com'
+        self.mock_service = MagicMock()
+        self.mock_service.users().getProfile().execute.return_value = {
+            'emailAddress': self.test_email, 'historyId': '100'
+        }
+        self.base_date = datetime.datetime.utcnow() - datetime.timedelta(days=3)
+
+    def create_thread(self, thread_id, message_count, from_header=None):
+        messages = []
+        for i in range(message_count):
+            subject = 'Interest in Product' if i == 0 else 'Re: Interest in Product'
+            date = (self.base_date + datetime.timedelta(hours=i)).timestamp() * 1000
+            messages.append({
+                'id': f'{thread_id}_{i}',
+                'threadId': thread_id,
+                'payload': {'headers': [
+                    {'name': 'Subject', 'value': subject},
+                    {'name': 'To', 'value': 'recipient@example.com'},
+                    {'name': 'From', 'value': from_header or self.test_email},
+                ]},
+                'internalDate': str(int(date)),
+                'snippet': f'Message {i}',
+            })
+        return {'id': thread_id, 'messages': messages}
+
+    def mock_threads(self, thread_responses):
+        def mock_get_thread(userId, id, **kwargs):
+            mock = MagicMock()
+            mock.execute.return_value = thread_responses[id]
+            return mock
+        self.mock_service.users().threads().get.side_effect = mock_get_thread
+
+    def scan(self):
+        with patch('app.report_service.open_followup_report'):
+            return email_service.get_threads_to_follow_up(self.mock_service, 'sequential', incremental=True)
+
+    def test_first_run_does_full_scan_and_stores_history_id(self):
+        self.mock_service.users().messages().list().execute.return_value = {
+            'messages': [{'threadId': 't1'}, {'threadId': 't2'}]
+        }
+        self.mock_threads({'t1': self.create_thread('t1', 1), 't2': self.create_thread('t2', 2)})
+
+        threads = self.scan()
+
+        self.assertEqual(sorted(t['thread_id'] for t in threads), ['t1', 't2'])
+        state = sync_service.load_sync_state()
+        self.assertEqual(state['history_id'], '100')
+        self.assertEqual(sorted(state['threads']), ['t1', 't2'])
+        self.mock_service.users().history().list.assert_not_called()
+
+    def test_unchanged_mailbox_costs_profile_and_history_calls_only(self):
+        self.mock_service.users().messages().list().execute.return_value = {'messages': [{'threadId': 't1'}]}
+        self.mock_threads({'t1': self.create_thread('t1', 1)})
+        first = self.scan()
+        self.mock_service.reset_mock()
+        self.mock_service.users().getProfile().execute.return_value = {
+            'emailAddress': self.test_email, 'historyId': '100'
+        }
+        self.mock_service.users().history().list().execute.return_value = {}
+
+        second = self.scan()
+
+        self.assertEqual(second, first)
+        self.mock_service.users().messages().list().execute.assert_not_called()
+        self.mock_service.users().threads().get.assert_not_called()
+        self.assertEqual(self.mock_service.users().history().list().execute.call_count, 1)
+
+    def test_changed_threads_are_refetched_and_merged(self):
+        self.mock_service.users().messages().list().execute.return_value = {
+            'messages': [{'threadId': 't1'}, {'threadId': 't2'}]
+        }
+        self.mock_threads({'t1': self.create_thread('t1', 1), 't2': self.create_thread('t2', 1)})
+        self.scan()
+        self.mock_service.users().history().list().execute.return_value = {'history': [
+            {'messagesAdded': [{'message': {'id': 'r1', 'threadId': 't1', 'labelIds': ['INBOX']}}]},
+            {'messagesAdded': [{'message': {'id': 'n1', 'threadId': 't3', 'labelIds': ['SENT']}}]},
+            {'messagesAdded': [{'message': {'id': 'x1', 'threadId': 'unrelated', 'labelIds': ['INBOX']}}]},
+        ]}
+        replied = self.create_thread('t1', 1)
+        replied['messages'].append(self.create_thread('t1', 1, 'Recruiter <r@example.com>')['messages'][0])
+        refetched = {'t1': replied, 't3': self.create_thread('t3', 1)}
+
+        with patch('app.sync_service.fetch_threads_batched', return_value=refetched) as mock_fetch:
+            threads = self.scan()
+
+        mock_fetch.assert_called_once_with(self.mock_service, ['t1', 't3'])
+        self.assertEqual(sorted(t['thread_id'] for t in threads), ['t2', 't3'])
+
+    def test_thread_the_batch_drops_is_replayed_next_run(self):
+        self.mock_service.users().messages().list().execute.return_value = {'messages': [{'threadId': 't1'}]}
+        self.mock_threads({'t1': self.create_thread('t1', 1)})
+        self.scan()
+        self.mock_service.users().getProfile().execute.return_value = {
+            'emailAddress': self.test_email, 'historyId': '200'
+        }
+        self.mock_service.users().history().list().execute.return_value = {'history': [
+            {'messagesAdded': [{'message': {'id': 'r1', 'threadId': 't1', 'labelIds': ['INBOX']}}]},
+        ]}
+
+        with patch('app.sync_service.fetch_threads_batched', return_value={}):
+            threads = self.scan()
+
+        # The stale summary is still offered this run, but its change is not skipped over
+        self.assertEqual([t['thread_id'] for t in threads], ['t1'])
+        self.assertEqual(sync_service.load_sync_state()['history_id'], '100')
+        self.mock_service.users().history().list.assert_called_with(
+            userId='me', startHistoryId='100', historyTypes=sync_service.HISTORY_TYPES,
+            fields=sync_service.HISTORY_FIELDS, pageToken=None)
+
+    def test_full_scan_missing_a_thread_stores_no_history_id(self):
+        self.mock_service.users().messages().list().execute.return_value = {
+            'messages': [{'threadId': 't1'}, {'threadId': 't2'}]
+        }
+        with patch('app.email_service.fetch_threads_batched', return_value={'t1': self.create_thread('t1', 1)}):
+            threads = sync_service.sync_thread_summaries(self.mock_service, {
+                'emailAddress': self.test_email, 'historyId': '100'
+            }, fetch_mode='batch')
+
+        self.assertEqual([t['thread_id'] for t in threads], ['t1'])
+        self.assertIsNone(sync_service.load_sync_state()['history_id'])
+
+    def test_expired_history_falls_back_to_full_scan(self):
+        sync_service.save_sync_state({'user_email': self.test_email, 'history_id': '1', 'threads': {}})
+        self.mock_service.users().history().list().execute.side_effect = HttpError(MagicMock(status=404), b'gone')
+        self.mock_service.users().messages().list().execute.return_value = {'messages': [{'threadId': 't1'}]}
+        self.mock_threads({'t1': self.create_thread('t1', 1)})
+
+        threads = self.scan()
+
+        self.assertEqual([t['thread_id'] for t in threads], ['t1'])
+        self.assertEqual(sync_service.load_sync_state()['history_id'], '100')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+from app.thread_clusters import cluster_threads, minhash_signatures, personalize, thread_text
+
+OUTREACH = ('I recently applied for the Backend Engineer position and wanted to share how my work on '
+            'payment pipelines and observability lines up with what your platform team is building.')
+
+
+def outreach(thread_id, name, **fields):
+    first = name.split()[0]
+    return dict({'thread_id': thread_id, 'subject': 'Interest in Backend Engineer role',
+                 'to': f'{name} <{first.lower()}@example.com>', 'snippet': f'Hi {first}, {OUTREACH}'}, **fields)
+
+
+class TestThreadClusters(unittest.TestCase):
+    def test_recipient_is_masked(self):
+        text = thread_text(outreach('t1', 'Alice Smith', snippet='Hi Alice, reach me at me@example.com'))
+        self.assertNotIn('alice', text)
+        self.assertNotIn('example.com', text)
+        self.assertEqual(text, thread_text(outreach('t2', 'Bruno Garcia', snippet='Hi Bruno, reach me at x@y.org')))
+
+    def test_signatures_estimate_similarity(self):
+        a, b, c = minhash_signatures([thread_text(outreach('t1', 'Alice Smith')),
+                                      thread_text(outreach('t2', 'Bruno Garcia')),
+                                      'quarterly invoice for your cloud storage subscription is attached'])
+        self.assertEqual((a == b).mean(), 1.0)
+        self.assertLess((a == c).mean(), 0.2)
+
+    def test_near_duplicates_cluster_in_input_order(self):
+        threads = [
+            {'thread_id': 'other', 'subject': 'Coffee chat next week?', 'to': 'Dana <dana@example.com>',
+             'snippet': 'Would love to hear about your move into data engineering'},
+            outreach('t1', 'Alice Smith'),
+            outreach('t2', 'Bruno Garcia'),
+            outreach('t3', 'Chen Wang', snippet=f'Hi Chen, {OUTREACH} Thanks!'),
+        ]
+        self.assertEqual(cluster_threads(threads), [[0], [1, 2, 3]])
+        self.assertEqual(cluster_threads(threads, threshold=1.01), [[0], [1], [2], [3]])
+        self.assertEqual(cluster_threads([]), [])
+
+    def test_partition_keeps_clusters_apart(self):
+        threads = [outreach('t1', 'Alice Smith', days_since_last=2), outreach('t2', 'Bruno Garcia', days_since_last=25),
+                   outreach('t3', 'Chen Wang', days_since_last=2)]
+        self.assertEqual(cluster_threads(threads), [[0, 1, 2]])
+        self.assertEqual(cluster_threads(threads, partition=lambda thread: thread['days_since_last'] > 7),
+                         [[0, 2], [1]])
+
+    def test_partition_does_not_hide_duplicates_sharing_a_bucket(self):
+        # The first thread of every shared bucket is in another partition
+        threads = [outreach('t1', 'Alice Smith', days_since_last=3), outreach('t2', 'Bruno Garcia', days_since_last=8),
+                   outreach('t3', 'Chen Wang', days_since_last=8)]
+        self.assertEqual(cluster_threads(threads, partition=lambda thread: thread['days_since_last'] > 7),
+                         [[0], [1, 2]])
+
+    def test_personalize(self):
+        draft = 'Hi Alice, following up on my note to Alice Smith.'
+        self.assertEqual(personalize(draft, 'Alice Smith', 'Bruno Garcia'),
+                         'Hi Bruno, following up on my note to Bruno Garcia.')
+        self.assertEqual(personalize(draft, '', 'Bruno Garcia'), draft)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+
+from app.thread_groups import SubjectGroups, normalize_subject
+
+
+class TestSubjectGroups(unittest.TestCase):
+    def test_normalize_subject(self):
+        self.assertEqual(normalize_subject('  Interest in  Ops &amp; SRE '), 'interest in ops & sre')
+        self.assertEqual(normalize_subject(None), '')
+
+    def test_event_groups_non_adjacent_subjects_and_decodes_text(self):
+        groups = SubjectGroups()
+        first = groups.event([
+            {'thread_id': 't1', 'subject': 'Interest in A', 'to': 'A &lt;a@example.com&gt;', 'snippet': 'It&#39;s'},
+            {'thread_id': 't2', 'subject': 'Interest in B', 'to': 'b@example.com', 'snippet': ''},
+        ])
+        second = groups.event([{'thread_id': 't3', 'subject': 'interest in  a', 'to': 'c@example.com'}])
+
+        self.assertEqual(first['groups'], [{'id': 0, 'subject': 'Interest in A'}, {'id': 1, 'subject': 'Interest in B'}])
+        self.assertEqual(first['threads'][0]['to'], 'A <a@example.com>')
+        self.assertEqual(first['threads'][0]['snippet'], "It's")
+        self.assertEqual(first['threads'][0]['subject'], 'Interest in A')
+        self.assertEqual(second['groups'], [])
+        self.assertEqual(second['threads'][0]['group_id'], 0)
+        self.assertEqual(second['counts'], {0: 2})
+        self.assertEqual(len(groups), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,187 @@
+import datetime
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from app import email_service
+from app.thread_store import ThreadStore
+
+
+class TestThreadStore(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.path = os.path.join(self.temp_dir.name, 'threads.sqlite3')
+
+    def summary(self, thread_id, followup_count=0):
+        return {'thread_id': thread_id, 'message_id': f'<{thread_id}@example.com>',
+                'followup_count': followup_count}
+
+    def test_summary_is_tied_to_history_id(self):
+        store = ThreadStore(self.path)
+        store.put_summary('t1', '10', self.summary('t1'))
+
+        self.assertEqual(store.get_summary('t1', '10'), self.summary('t1'))
+        self.assertIsNone(store.get_summary('t1', '11'))
+        self.assertIsNone(store.get_summary('t2', '10'))
+
+    def test_details_survive_summary_updates(self):
+        store = ThreadStore(self.path)
+        store.put_summary('t1', '10', self.summary('t1'))
+        store.put_details('t1', '<t1@example.com>', 'James')
+        store.put_summary('t1', '12', self.summary('t1', 1))
+        store.record_followup_sent('t1')
+
+        record = store.get('t1')
+        self.assertTrue(record['has_details'])
+        self.assertEqual(record['receiver_name'], 'James')
+        self.assertEqual(record['summary']['followup_count'], 2)
+        self.assertIsNone(store.get_summary('t1', '12'))
+
+    def test_size_and_age_eviction(self):
+        store = ThreadStore(self.path, max_entries=2, evict_every=3)
+        with patch('app.thread_store.time.time', side_effect=[1.0, 2.0, 3.0, 3.0]):
+            store.put_summary('t1', '1', self.summary('t1'))
+            store.put_summary('t2', '1', self.summary('t2'))
+            self.assertEqual(len(store), 2)
+            store.put_summary('t3', '1', self.summary('t3'))
+        self.assertEqual(len(store), 2)
+        self.assertIsNone(store.get('t1'))
+
+        aged = ThreadStore(self.path, max_age_seconds=0)
+        with patch('app.thread_store.time.time', return_value=10.0):
+            self.assertIsNone(aged.get('t3'))
+
+    def test_reads_touch_recency_at_most_once_per_interval(self):
+        store = ThreadStore(self.path, touch_interval=60)
+        with patch('app.thread_store.time.time', return_value=100.0):
+            store.put_summary('t1', '1', self.summary('t1'))
+        with patch('app.thread_store.time.time', return_value=130.0):
+            self.assertEqual(store.get('t1')['accessed_at'], 100.0)
+        with patch('app.thread_store.time.time', return_value=200.0):
+            store.get('t1')
+            self.assertEqual(store.get('t1')['accessed_at'], 200.0)
+
+    def test_concurrent_writers(self):
+        store = ThreadStore(self.path)
+
+        def write(worker):
+            for i in range(25):
+                store.put_summary(f'w{worker}-{i}', '1', self.summary(f'w{worker}-{i}'))
+
+        workers = [threading.Thread(target=write, args=(n,)) for n in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(len(store), 100)
+
+
+class TestThreadStoreReadThrough(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        path_patch = patch('app.thread_store.THREAD_STORE_PATH', os.path.join(self.temp_dir.name, 'threads.sqlite3'))
+        path_patch.start()
+        self.addCleanup(path_patch.stop)
+        report_patch = patch('app.report_service.open_followup_report')
+        report_patch.start()
+        self.addCleanup(report_patch.stop)
+        self.test_email = 'me@example.com'
+        self.mock_service = MagicMock()
+        self.mock_service.users().getProfile().execute.return_value = {'emailAddress': self.test_email}
+        sent = (datetime.datetime.utcnow() - datetime.timedelta(days=3)).timestamp() * 1000
+        body = email_service.base64.urlsafe_b64encode(b'Hi James,\n\nHello').decode()
+        self.thread = {'id': 't1', 'historyId': '10', 'messages': [{
+            'id': 'm1',
+            'threadId': 't1',
+            'payload': {'mimeType': 'text/plain', 'body': {'data': body}, 'headers': [
+                {'name': 'Subject', 'value': 'Interest in Product'},
+                {'name': 'To', 'value': 'recipient@example.com'},
+                {'name': 'From', 'value': self.test_email},
+                {'name': 'Message-ID', 'value': '<m1@example.com>'},
+            ]},
+            'internalDate': str(int(sent)),
+            'snippet': 'Hi James',
+        }]}
+        self.mock_service.users().threads().get().execute.return_value = self.thread
+        self.mock_service.users().threads().list().execute.return_value = {
+            'threads': [{'id': 't1', 'historyId': '10'}]
+        }
+        self.mock_service.users().threads().get.reset_mock()
+
+    def test_warm_scan_makes_no_thread_fetches(self):
+        cold = email_service.get_threads_to_follow_up(self.mock_service, 'sequential', incremental=False)
+        self.assertEqual(self.mock_service.users().threads().get.call_count, 1)
+
+        warm = email_service.get_threads_to_follow_up(self.mock_service, 'sequential', incremental=False)
+
+        self.assertEqual(warm, cold)
+        self.assertEqual([t['thread_id'] for t in warm], ['t1'])
+        self.assertEqual(self.mock_service.users().threads().get.call_count, 1)
+        self.mock_service.users().messages().list.assert_not_called()
+
+    def test_warm_send_checks_only_the_history_id(self):
+        get = self.mock_service.users().threads().get
+        cold = email_service.get_followup_details(self.mock_service, 't1', self.test_email)
+        self.assertEqual(get.call_count, 1)
+
+        warm = email_service.get_followup_details(self.mock_service, 't1', self.test_email)
+        self.assertEqual(warm, cold)
+        self.assertEqual(get.call_count, 2)
+        self.assertEqual(get.call_args.kwargs['fields'], 'historyId')
+
+        with patch('app.email_service.DISABLE_SEND_FOLLOWUP', False):
+            self.assertTrue(email_service.send_followup_email(
+                self.mock_service, 'recipient@example.com', 'Interest in Product', 't1'))
+        sent = [c.kwargs['body'] for c in self.mock_service.users().messages().send.call_args_list]
+        raw = email_service.base64.urlsafe_b64decode(sent[-1]['raw']).decode()
+        self.assertIn('Hi James,', raw)
+        self.assertIn('In-Reply-To: <m1@example.com>', raw)
+
+    def test_send_refetches_a_thread_that_changed_since_the_scan(self):
+        get = self.mock_service.users().threads().get
+        email_service.get_followup_details(self.mock_service, 't1', self.test_email)
+        reply = dict(self.thread['messages'][0], id='m2', payload={'headers': [
+            {'name': 'Subject', 'value': 'Re: Interest in Product'},
+            {'name': 'To', 'value': self.test_email},
+            {'name': 'From', 'value': 'recipient@example.com'},
+        ]})
+        get().execute.return_value = dict(self.thread, historyId='11', messages=self.thread['messages'] + [reply])
+        get.reset_mock()
+
+        details = email_service.get_followup_details(self.mock_service, 't1', self.test_email)
+
+        # The historyId check, then the full thread, whose last message is the reply
+        self.assertEqual(get.call_count, 2)
+        self.assertEqual(details['to'], self.test_email)
+        self.assertEqual(details['followup_count'], 1)
+
+    def test_read_through_streams_hits_and_shares_one_fetch_across_pages(self):
+        store = ThreadStore(os.path.join(self.temp_dir.name, 'direct.sqlite3'))
+        store.put_summary('t1', '10', email_service.summarize_thread('t1', self.thread, self.test_email))
+        listed = []
+
+        def pages():
+            for page in ([('t1', '10'), ('t2', '7')], [('t3', '8')]):
+                listed.append(page)
+                yield page
+
+        summaries = email_service._read_through_summaries(self.mock_service, store, pages(), self.test_email,
+                                                          'sequential', True)
+        self.assertEqual(next(summaries)['thread_id'], 't1')
+        self.assertEqual(len(listed), 1)
+        self.assertEqual([s['thread_id'] for s in summaries], ['t2', 't3'])
+        self.assertEqual(self.mock_service.users().threads().get.call_count, 2)
+
+        with patch('app.email_service.ThreadPoolExecutor', wraps=email_service.ThreadPoolExecutor) as pool:
+            summaries = email_service._read_through_summaries(
+                self.mock_service, store, ([(f'p{i}', '1')] for i in range(3)), self.test_email, 'parallel', False)
+            self.assertEqual(sorted(s['thread_id'] for s in summaries), ['p0', 'p1', 'p2'])
+        pool.assert_called_once()
+
+if __name__ == "__main__":
+    unittest.main()